@@ -28,6 +28,7 @@ load_dotenv()
 # Импортируем бота и диспетчер
 from telegram_bot.bot_instance import bot
 from telegram_bot.dispatcher import dp
+from telegram_bot.config import BOT_MODE, METRICS_ENABLED, METRICS_HOST, METRICS_PORT, METRICS_PATH
 
 # Роутеры уже зарегистрированы в dispatcher.py
 # Нам нужно только импортировать dp для запуска
@@ -37,9 +38,24 @@ async def main():
     Основная функция запуска бота
     """
     try:
-        logger.info("Запуск бота...")
-        # Запускаем бота
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        if BOT_MODE == "webhook":
+            logger.info("Запуск бота в режиме webhook...")
+            from telegram_bot.webhook import run_webhook
+            await run_webhook(bot, dp)
+        else:
+            logger.info("Запуск бота...")
+            # В режиме polling метрики отдает отдельный HTTP сервер
+            metrics_runner = None
+            if METRICS_ENABLED:
+                from telegram_bot.metrics import start_metrics_server
+                metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT, METRICS_PATH)
+            try:
+                # Запускаем бота; параллельную обработку и ожидание при перегрузке
+                # обеспечивает UpdateScheduler, поэтому обновления не выносятся в отдельные задачи
+                await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types(), handle_as_tasks=False)
+            finally:
+                if metrics_runner is not None:
+                    await metrics_runner.cleanup()
     except Exception as e:
         logger.error(f"Ошибка при работе бота: {e}")
 
@@ -169,11 +169,13 @@ CREATE TABLE IF NOT EXISTS vpn_servers (
 -- ИНДЕКСЫ (критично для производительности!)
 CREATE INDEX IF NOT EXISTS idx_profiles_telegram_id ON profiles(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_profiles_referral_code ON profiles(referral_code);
+CREATE INDEX IF NOT EXISTS idx_profiles_created_at ON profiles(created_at);
 CREATE INDEX IF NOT EXISTS idx_balances_user_id ON balances(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_stats_user_id ON user_stats(user_id);
 CREATE INDEX IF NOT EXISTS idx_referral_stats_user_id ON referral_stats(user_id);
 CREATE INDEX IF NOT EXISTS idx_referrals_referrer_id ON referrals(referrer_id);
 CREATE INDEX IF NOT EXISTS idx_referrals_referred_id ON referrals(referred_id);
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer_level ON referrals(referrer_id, level);
 CREATE INDEX IF NOT EXISTS idx_user_roles_user_id ON user_roles(user_id);
 CREATE INDEX IF NOT EXISTS idx_channels_user_id ON channels(user_id);
 CREATE INDEX IF NOT EXISTS idx_bots_user_id ON bots(user_id);
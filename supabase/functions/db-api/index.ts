@@ -0,0 +1,151 @@
+import { createClient } from 'https://esm.sh/@supabase/supabase-js@2'
+
+const corsHeaders = {
+  'Access-Control-Allow-Origin': '*',
+  'Access-Control-Allow-Headers': 'authorization, x-client-info, apikey, content-type, x-api-key',
+}
+
+type Where = Record<string, unknown>
+
+interface DbApiRequest {
+  action: 'select' | 'insert' | 'update' | 'delete' | 'increment' | 'provision_user'
+    | 'backfill_referral_edges' | 'rebuild_referral_stats'
+  table?: string
+  data?: Record<string, unknown>
+  where?: Where
+  // select only: column list, lower bounds (column >= value), ordering and paging
+  columns?: string
+  gte?: Where
+  order?: string
+  offset?: number
+  limit?: number
+}
+
+// Referral tree maintenance RPCs (python -m telegram_bot.database.rebuild_referral_stats)
+const MAINTENANCE_RPCS = ['backfill_referral_edges', 'rebuild_referral_stats']
+
+function jsonResponse(body: unknown, status = 200): Response {
+  return new Response(
+    JSON.stringify(body),
+    { status, headers: { ...corsHeaders, 'Content-Type': 'application/json' } }
+  )
+}
+
+// eslint-disable-next-line @typescript-eslint/no-explicit-any
+function applyWhere(query: any, where?: Where) {
+  if (!where) return query
+  for (const [column, value] of Object.entries(where)) {
+    query = query.eq(column, value)
+  }
+  return query
+}
+
+Deno.serve(async (req) => {
+  // Handle CORS preflight requests
+  if (req.method === 'OPTIONS') {
+    return new Response(null, { headers: corsHeaders })
+  }
+
+  try {
+    const apiKey = Deno.env.get('DB_API_KEY')
+    if (!apiKey || req.headers.get('x-api-key') !== apiKey) {
+      return jsonResponse({ error: 'Unauthorized' }, 401)
+    }
+
+    const { action, table, data, where, columns, gte, order, offset, limit } = await req.json() as DbApiRequest
+
+    const supabaseUrl = Deno.env.get('SUPABASE_URL')!
+    const supabaseServiceKey = Deno.env.get('SUPABASE_SERVICE_ROLE_KEY')!
+    const supabase = createClient(supabaseUrl, supabaseServiceKey)
+
+    // Provision a new user with all related records in one transaction
+    if (action === 'provision_user') {
+      if (!data) {
+        return jsonResponse({ error: 'data is required' }, 400)
+      }
+      const { data: profile, error } = await supabase.rpc('provision_user', { p_profile: data })
+      if (error) {
+        console.error('Error provisioning user:', error)
+        return jsonResponse({ error: error.message }, 400)
+      }
+      return jsonResponse([profile])
+    }
+
+    if (MAINTENANCE_RPCS.includes(action)) {
+      const { error } = await supabase.rpc(action, {})
+      if (error) {
+        console.error(`Error in ${action}:`, error)
+        return jsonResponse({ error: error.message }, 400)
+      }
+      return jsonResponse([])
+    }
+
+    if (!table) {
+      return jsonResponse({ error: 'table is required' }, 400)
+    }
+
+    // Atomic counter increments: data holds { column: delta }, where.user_id selects the row
+    if (action === 'increment') {
+      if (!data || !where?.user_id) {
+        return jsonResponse({ error: 'data and where.user_id are required for increment' }, 400)
+      }
+      const { error } = await supabase.rpc('increment_counters', {
+        p_table: table,
+        p_user_id: where.user_id,
+        p_increments: data,
+      })
+      if (error) {
+        console.error(`Error incrementing counters in ${table}:`, error)
+        return jsonResponse({ error: error.message }, 400)
+      }
+      return jsonResponse([])
+    }
+
+    let result
+    switch (action) {
+      case 'select': {
+        let query = applyWhere(supabase.from(table).select(columns ?? '*'), where)
+        for (const [column, value] of Object.entries(gte ?? {})) {
+          query = query.gte(column, value)
+        }
+        if (order) {
+          query = query.order(order)
+        }
+        if (limit !== undefined) {
+          const from = offset ?? 0
+          query = query.range(from, from + limit - 1)
+        }
+        result = await query
+        break
+      }
+      case 'insert':
+        result = await supabase.from(table).insert(data).select()
+        break
+      case 'update':
+        if (!where) {
+          return jsonResponse({ error: 'where is required for update' }, 400)
+        }
+        result = await applyWhere(supabase.from(table).update(data), where).select()
+        break
+      case 'delete':
+        if (!where) {
+          return jsonResponse({ error: 'where is required for delete' }, 400)
+        }
+        result = await applyWhere(supabase.from(table).delete(), where)
+        break
+      default:
+        return jsonResponse({ error: `Unknown action: ${action}` }, 400)
+    }
+
+    if (result.error) {
+      console.error(`Error in ${action} on ${table}:`, result.error)
+      return jsonResponse({ error: result.error.message }, 400)
+    }
+
+    return jsonResponse(result.data ?? [])
+  } catch (error: unknown) {
+    console.error('Error in db-api:', error)
+    const errorMessage = error instanceof Error ? error.message : 'Unknown error'
+    return jsonResponse({ error: errorMessage }, 500)
+  }
+})
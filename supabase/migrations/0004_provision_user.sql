@@ -0,0 +1,49 @@
+-- Пакетное создание нового пользователя и всех связанных записей одной транзакцией.
+-- Используется действием provision_user функции db-api вместо шести отдельных INSERT.
+CREATE OR REPLACE FUNCTION public.provision_user(p_profile JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_profile public.profiles;
+BEGIN
+  INSERT INTO public.profiles (
+    telegram_id, telegram_username, first_name, last_name,
+    avatar_url, referral_code, referred_by
+  ) VALUES (
+    (p_profile->>'telegram_id')::BIGINT,
+    p_profile->>'telegram_username',
+    p_profile->>'first_name',
+    p_profile->>'last_name',
+    p_profile->>'avatar_url',
+    COALESCE(p_profile->>'referral_code', gen_random_uuid()::text),
+    NULLIF(p_profile->>'referred_by', '')::UUID
+  )
+  RETURNING * INTO v_profile;
+
+  INSERT INTO public.balances (user_id, internal_balance, external_balance, total_earned, total_withdrawn)
+  VALUES (v_profile.id, 0, 0, 0, 0);
+
+  INSERT INTO public.user_stats (user_id, total_logins, last_login_at)
+  VALUES (v_profile.id, 1, now());
+
+  INSERT INTO public.referral_stats (user_id, total_referrals, total_earnings)
+  VALUES (v_profile.id, 0, 0);
+
+  INSERT INTO public.user_roles (user_id, role)
+  VALUES (v_profile.id, 'user');
+
+  IF v_profile.referred_by IS NOT NULL THEN
+    INSERT INTO public.referrals (referrer_id, referred_id, level, is_active)
+    VALUES (v_profile.referred_by, v_profile.id, 1, true)
+    ON CONFLICT (referrer_id, referred_id) DO UPDATE SET is_active = true;
+  END IF;
+
+  RETURN to_jsonb(v_profile);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.provision_user(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.provision_user(JSONB) TO service_role;
@@ -0,0 +1,56 @@
+-- Регистрация пользователя Telegram одним вызовом RPC.
+-- Поиск реферера, создание профиля со связанными записями, реферальная связь
+-- и обновление статистики пригласившего выполняются в одной транзакции.
+CREATE OR REPLACE FUNCTION public.register_telegram_user(
+  p_telegram_id BIGINT,
+  p_first_name TEXT,
+  p_last_name TEXT DEFAULT NULL,
+  p_username TEXT DEFAULT NULL,
+  p_avatar_url TEXT DEFAULT NULL,
+  p_referral_code TEXT DEFAULT NULL,
+  p_new_referral_code TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_existing public.profiles;
+  v_referrer_id UUID;
+  v_profile JSONB;
+BEGIN
+  -- Повторный /start уже зарегистрированного пользователя ничего не создает
+  SELECT * INTO v_existing FROM public.profiles WHERE telegram_id = p_telegram_id;
+  IF FOUND THEN
+    RETURN to_jsonb(v_existing);
+  END IF;
+
+  IF p_referral_code IS NOT NULL AND p_referral_code <> '' THEN
+    SELECT id INTO v_referrer_id FROM public.profiles WHERE referral_code = upper(p_referral_code);
+  END IF;
+
+  v_profile := public.provision_user(jsonb_build_object(
+    'telegram_id', p_telegram_id,
+    'telegram_username', p_username,
+    'first_name', p_first_name,
+    'last_name', p_last_name,
+    'avatar_url', p_avatar_url,
+    'referral_code', p_new_referral_code,
+    'referred_by', v_referrer_id
+  ));
+
+  IF v_referrer_id IS NOT NULL THEN
+    INSERT INTO public.referral_stats (user_id, total_referrals, level_1_count)
+    VALUES (v_referrer_id, 1, 1)
+    ON CONFLICT (user_id) DO UPDATE
+      SET total_referrals = public.referral_stats.total_referrals + 1,
+          level_1_count = public.referral_stats.level_1_count + 1;
+  END IF;
+
+  RETURN v_profile;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.register_telegram_user(BIGINT, TEXT, TEXT, TEXT, TEXT, TEXT, TEXT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.register_telegram_user(BIGINT, TEXT, TEXT, TEXT, TEXT, TEXT, TEXT) TO service_role;
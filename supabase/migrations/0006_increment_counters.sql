@@ -0,0 +1,50 @@
+-- Атомарное увеличение счетчиков статистики за один запрос (UPDATE ... SET x = x + n)
+-- вместо чтения текущего значения и записи нового, которое теряет инкременты при гонках.
+CREATE OR REPLACE FUNCTION public.increment_counters(
+  p_table TEXT,
+  p_user_id UUID,
+  p_increments JSONB
+)
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_allowed TEXT[];
+  v_set TEXT := '';
+  v_column TEXT;
+  v_value TEXT;
+BEGIN
+  -- Разрешены только счетчики таблиц статистики
+  IF p_table = 'user_stats' THEN
+    v_allowed := ARRAY['total_logins'];
+  ELSIF p_table = 'referral_stats' THEN
+    v_allowed := ARRAY['total_referrals', 'level_1_count', 'level_2_count',
+                       'level_3_count', 'level_4_count', 'level_5_count'];
+  ELSE
+    RAISE EXCEPTION 'increment_counters: table % is not allowed', p_table;
+  END IF;
+
+  FOR v_column, v_value IN SELECT * FROM jsonb_each_text(p_increments) LOOP
+    IF NOT v_column = ANY(v_allowed) THEN
+      RAISE EXCEPTION 'increment_counters: column %.% is not allowed', p_table, v_column;
+    END IF;
+    v_set := v_set || format('%I = COALESCE(%I, 0) + %s, ', v_column, v_column, v_value::INT);
+  END LOOP;
+
+  IF v_set = '' THEN
+    RETURN;
+  END IF;
+
+  IF p_table = 'user_stats' AND p_increments ? 'total_logins' THEN
+    v_set := v_set || 'last_login_at = now(), ';
+  END IF;
+
+  EXECUTE format('UPDATE public.%I SET %s updated_at = now() WHERE user_id = $1', p_table, v_set)
+  USING p_user_id;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.increment_counters(TEXT, UUID, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.increment_counters(TEXT, UUID, JSONB) TO service_role;
@@ -0,0 +1,175 @@
+-- Счетчики рефералов по уровням (1-5) поддерживаются при регистрации,
+-- чтобы статистика читалась одной строкой referral_stats без рекурсивного обхода дерева.
+
+-- Увеличивает счетчики пригласившего и его предков до 5 уровня
+CREATE OR REPLACE FUNCTION public.bump_referral_stats(p_referrer_id UUID)
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH RECURSIVE ancestors AS (
+    SELECT id, referred_by, 1 AS level FROM public.profiles WHERE id = p_referrer_id
+    UNION ALL
+    SELECT p.id, p.referred_by, a.level + 1
+    FROM public.profiles p
+    JOIN ancestors a ON p.id = a.referred_by
+    WHERE a.level < 5
+  )
+  INSERT INTO public.referral_stats (user_id, total_referrals, level_1_count, level_2_count,
+                                     level_3_count, level_4_count, level_5_count)
+  SELECT id, 1, (level = 1)::int, (level = 2)::int, (level = 3)::int, (level = 4)::int, (level = 5)::int
+  FROM ancestors
+  ON CONFLICT (user_id) DO UPDATE SET
+    total_referrals = COALESCE(public.referral_stats.total_referrals, 0) + 1,
+    level_1_count = COALESCE(public.referral_stats.level_1_count, 0) + EXCLUDED.level_1_count,
+    level_2_count = COALESCE(public.referral_stats.level_2_count, 0) + EXCLUDED.level_2_count,
+    level_3_count = COALESCE(public.referral_stats.level_3_count, 0) + EXCLUDED.level_3_count,
+    level_4_count = COALESCE(public.referral_stats.level_4_count, 0) + EXCLUDED.level_4_count,
+    level_5_count = COALESCE(public.referral_stats.level_5_count, 0) + EXCLUDED.level_5_count;
+$$;
+
+-- Полный пересчет счетчиков по дереву profiles.referred_by (первичное заполнение)
+CREATE OR REPLACE FUNCTION public.rebuild_referral_stats()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+  LOCK TABLE public.referral_stats IN SHARE ROW EXCLUSIVE MODE;
+
+  WITH RECURSIVE tree AS (
+    SELECT referred_by AS ancestor_id, id AS descendant_id, 1 AS level
+    FROM public.profiles
+    WHERE referred_by IS NOT NULL
+    UNION ALL
+    SELECT p.referred_by, t.descendant_id, t.level + 1
+    FROM tree t
+    JOIN public.profiles p ON p.id = t.ancestor_id
+    WHERE p.referred_by IS NOT NULL AND t.level < 5
+  ),
+  counts AS (
+    SELECT ancestor_id,
+           COUNT(*) FILTER (WHERE level = 1) AS level_1_count,
+           COUNT(*) FILTER (WHERE level = 2) AS level_2_count,
+           COUNT(*) FILTER (WHERE level = 3) AS level_3_count,
+           COUNT(*) FILTER (WHERE level = 4) AS level_4_count,
+           COUNT(*) FILTER (WHERE level = 5) AS level_5_count,
+           COUNT(*) AS total_referrals
+    FROM tree
+    GROUP BY ancestor_id
+  )
+  INSERT INTO public.referral_stats (user_id, total_referrals, level_1_count, level_2_count,
+                                     level_3_count, level_4_count, level_5_count)
+  SELECT p.id, COALESCE(c.total_referrals, 0), COALESCE(c.level_1_count, 0),
+         COALESCE(c.level_2_count, 0), COALESCE(c.level_3_count, 0),
+         COALESCE(c.level_4_count, 0), COALESCE(c.level_5_count, 0)
+  FROM public.profiles p
+  LEFT JOIN counts c ON c.ancestor_id = p.id
+  ON CONFLICT (user_id) DO UPDATE SET
+    total_referrals = EXCLUDED.total_referrals,
+    level_1_count = EXCLUDED.level_1_count,
+    level_2_count = EXCLUDED.level_2_count,
+    level_3_count = EXCLUDED.level_3_count,
+    level_4_count = EXCLUDED.level_4_count,
+    level_5_count = EXCLUDED.level_5_count;
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.bump_referral_stats(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.bump_referral_stats(UUID) TO service_role;
+REVOKE ALL ON FUNCTION public.rebuild_referral_stats() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.rebuild_referral_stats() TO service_role;
+
+-- Создание пользователя обновляет счетчики всех уровней его предков
+CREATE OR REPLACE FUNCTION public.provision_user(p_profile JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_profile public.profiles;
+BEGIN
+  INSERT INTO public.profiles (
+    telegram_id, telegram_username, first_name, last_name,
+    avatar_url, referral_code, referred_by
+  ) VALUES (
+    (p_profile->>'telegram_id')::BIGINT,
+    p_profile->>'telegram_username',
+    p_profile->>'first_name',
+    p_profile->>'last_name',
+    p_profile->>'avatar_url',
+    COALESCE(p_profile->>'referral_code', gen_random_uuid()::text),
+    NULLIF(p_profile->>'referred_by', '')::UUID
+  )
+  RETURNING * INTO v_profile;
+
+  INSERT INTO public.balances (user_id, internal_balance, external_balance, total_earned, total_withdrawn)
+  VALUES (v_profile.id, 0, 0, 0, 0);
+
+  INSERT INTO public.user_stats (user_id, total_logins, last_login_at)
+  VALUES (v_profile.id, 1, now());
+
+  INSERT INTO public.referral_stats (user_id, total_referrals, total_earnings)
+  VALUES (v_profile.id, 0, 0);
+
+  INSERT INTO public.user_roles (user_id, role)
+  VALUES (v_profile.id, 'user');
+
+  IF v_profile.referred_by IS NOT NULL THEN
+    INSERT INTO public.referrals (referrer_id, referred_id, level, is_active)
+    VALUES (v_profile.referred_by, v_profile.id, 1, true)
+    ON CONFLICT (referrer_id, referred_id) DO UPDATE SET is_active = true;
+
+    PERFORM public.bump_referral_stats(v_profile.referred_by);
+  END IF;
+
+  RETURN to_jsonb(v_profile);
+END;
+$$;
+
+-- Счетчики обновляет provision_user, поэтому register_telegram_user больше не трогает referral_stats
+CREATE OR REPLACE FUNCTION public.register_telegram_user(
+  p_telegram_id BIGINT,
+  p_first_name TEXT,
+  p_last_name TEXT DEFAULT NULL,
+  p_username TEXT DEFAULT NULL,
+  p_avatar_url TEXT DEFAULT NULL,
+  p_referral_code TEXT DEFAULT NULL,
+  p_new_referral_code TEXT DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_existing public.profiles;
+  v_referrer_id UUID;
+  v_profile JSONB;
+BEGIN
+  -- Повторный /start уже зарегистрированного пользователя ничего не создает
+  SELECT * INTO v_existing FROM public.profiles WHERE telegram_id = p_telegram_id;
+  IF FOUND THEN
+    RETURN to_jsonb(v_existing);
+  END IF;
+
+  IF p_referral_code IS NOT NULL AND p_referral_code <> '' THEN
+    SELECT id INTO v_referrer_id FROM public.profiles WHERE referral_code = upper(p_referral_code);
+  END IF;
+
+  v_profile := public.provision_user(jsonb_build_object(
+    'telegram_id', p_telegram_id,
+    'telegram_username', p_username,
+    'first_name', p_first_name,
+    'last_name', p_last_name,
+    'avatar_url', p_avatar_url,
+    'referral_code', p_new_referral_code,
+    'referred_by', v_referrer_id
+  ));
+
+  RETURN v_profile;
+END;
+$$;
@@ -0,0 +1,97 @@
+-- Реферальные связи хранятся для всех предков до 5 уровня (таблица замыкания),
+-- чтобы выборки по уровням, начисления и рейтинги шли по индексу referrals(referrer_id, level).
+
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer_level ON public.referrals(referrer_id, level);
+
+-- Связи нового пользователя со всеми предками одной вставкой и обновление их счетчиков
+CREATE OR REPLACE FUNCTION public.link_referral(p_referrer_id UUID, p_referred_id UUID)
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH RECURSIVE ancestors AS (
+    SELECT id, referred_by, 1 AS level FROM public.profiles WHERE id = p_referrer_id
+    UNION ALL
+    SELECT p.id, p.referred_by, a.level + 1
+    FROM public.profiles p
+    JOIN ancestors a ON p.id = a.referred_by
+    WHERE a.level < 5
+  )
+  INSERT INTO public.referrals (referrer_id, referred_id, level, is_active)
+  SELECT id, p_referred_id, level, true FROM ancestors
+  ON CONFLICT (referrer_id, referred_id) DO UPDATE SET level = EXCLUDED.level, is_active = true;
+
+  SELECT public.bump_referral_stats(p_referrer_id);
+$$;
+
+-- Заполнение связей уровней 2-5 для существующих пользователей
+CREATE OR REPLACE FUNCTION public.backfill_referral_edges()
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+  WITH RECURSIVE tree AS (
+    SELECT referred_by AS ancestor_id, id AS descendant_id, 1 AS level
+    FROM public.profiles
+    WHERE referred_by IS NOT NULL
+    UNION ALL
+    SELECT p.referred_by, t.descendant_id, t.level + 1
+    FROM tree t
+    JOIN public.profiles p ON p.id = t.ancestor_id
+    WHERE p.referred_by IS NOT NULL AND t.level < 5
+  )
+  INSERT INTO public.referrals (referrer_id, referred_id, level, is_active)
+  SELECT ancestor_id, descendant_id, level, true FROM tree
+  ON CONFLICT (referrer_id, referred_id) DO UPDATE SET level = EXCLUDED.level;
+$$;
+
+REVOKE ALL ON FUNCTION public.link_referral(UUID, UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.link_referral(UUID, UUID) TO service_role;
+REVOKE ALL ON FUNCTION public.backfill_referral_edges() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.backfill_referral_edges() TO service_role;
+
+-- Создание пользователя записывает связи со всеми предками через link_referral
+CREATE OR REPLACE FUNCTION public.provision_user(p_profile JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_profile public.profiles;
+BEGIN
+  INSERT INTO public.profiles (
+    telegram_id, telegram_username, first_name, last_name,
+    avatar_url, referral_code, referred_by
+  ) VALUES (
+    (p_profile->>'telegram_id')::BIGINT,
+    p_profile->>'telegram_username',
+    p_profile->>'first_name',
+    p_profile->>'last_name',
+    p_profile->>'avatar_url',
+    COALESCE(p_profile->>'referral_code', gen_random_uuid()::text),
+    NULLIF(p_profile->>'referred_by', '')::UUID
+  )
+  RETURNING * INTO v_profile;
+
+  INSERT INTO public.balances (user_id, internal_balance, external_balance, total_earned, total_withdrawn)
+  VALUES (v_profile.id, 0, 0, 0, 0);
+
+  INSERT INTO public.user_stats (user_id, total_logins, last_login_at)
+  VALUES (v_profile.id, 1, now());
+
+  INSERT INTO public.referral_stats (user_id, total_referrals, total_earnings)
+  VALUES (v_profile.id, 0, 0);
+
+  INSERT INTO public.user_roles (user_id, role)
+  VALUES (v_profile.id, 'user');
+
+  IF v_profile.referred_by IS NOT NULL THEN
+    PERFORM public.link_referral(v_profile.referred_by, v_profile.id);
+  END IF;
+
+  RETURN to_jsonb(v_profile);
+END;
+$$;
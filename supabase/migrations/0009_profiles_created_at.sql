@@ -0,0 +1,2 @@
+-- Периодическое обновление индекса реферальных кодов в боте выбирает новые профили по created_at
+CREATE INDEX IF NOT EXISTS idx_profiles_created_at ON public.profiles(created_at);
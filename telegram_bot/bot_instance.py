@@ -4,6 +4,8 @@ from aiogram.enums import ParseMode
 import os
 from dotenv import load_dotenv
 
+from telegram_bot.services.send_queue import send_scheduler
+
 # Загружаем переменные окружения
 load_dotenv()
 # Получаем токен бота из переменных окружения
@@ -11,4 +13,7 @@ BOT_TOKEN = os.getenv("BOT_TOKEN", os.getenv("TELEGRAM_BOT_TOKEN"))
 
 
 # Создаем экземпляр бота
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
\ No newline at end of file
+bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+# Все исходящие сообщения проходят через планировщик с учетом лимитов Telegram
+bot.session.middleware(send_scheduler)
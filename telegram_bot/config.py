@@ -11,10 +11,99 @@ BOT_USERNAME = os.getenv('BOT_USERNAME', 'your_bot_username')
 API_BASE_URL = os.getenv('API_BASE_URL', 'http://localhost:3000/api')
 API_TIMEOUT = 30
 
+# HTTP connection pool for backend API
+API_POOL_LIMIT = int(os.getenv('API_POOL_LIMIT', 100))
+API_POOL_LIMIT_PER_HOST = int(os.getenv('API_POOL_LIMIT_PER_HOST', 30))
+API_KEEPALIVE_TIMEOUT = int(os.getenv('API_KEEPALIVE_TIMEOUT', 30))
+API_DNS_CACHE_TTL = int(os.getenv('API_DNS_CACHE_TTL', 300))
+
+# Backend circuit breaker (per endpoint): opens when FAILURE_RATE of the last WINDOW calls
+# (at least MIN_CALLS) failed or were slower than SLOW_CALL seconds; probes after OPEN_SECONDS
+API_BREAKER_WINDOW = int(os.getenv('API_BREAKER_WINDOW', 20))
+API_BREAKER_MIN_CALLS = int(os.getenv('API_BREAKER_MIN_CALLS', 10))
+API_BREAKER_FAILURE_RATE = float(os.getenv('API_BREAKER_FAILURE_RATE', 0.5))
+API_BREAKER_SLOW_CALL = float(os.getenv('API_BREAKER_SLOW_CALL', 5))
+API_BREAKER_OPEN_SECONDS = float(os.getenv('API_BREAKER_OPEN_SECONDS', 30))
+API_BREAKER_HALF_OPEN_CALLS = int(os.getenv('API_BREAKER_HALF_OPEN_CALLS', 1))
+# Retries of idempotent backend calls on connection errors and 5xx (backoff with full jitter)
+API_RETRY_ATTEMPTS = int(os.getenv('API_RETRY_ATTEMPTS', 2))
+API_RETRY_BASE_DELAY = float(os.getenv('API_RETRY_BASE_DELAY', 0.2))
+API_RETRY_MAX_DELAY = float(os.getenv('API_RETRY_MAX_DELAY', 2))
+
+# Update delivery: polling | webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Webhook (BOT_MODE=webhook)
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL')  # public https URL that Telegram calls
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+# Only one worker needs to register the webhook with Telegram
+WEBHOOK_SET_ON_STARTUP = os.getenv('WEBHOOK_SET_ON_STARTUP', 'true').lower() == 'true'
+
+# Prometheus metrics endpoint: on the webhook server in webhook mode,
+# on a separate server at METRICS_HOST:METRICS_PORT in polling mode
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9100))
+
 # Admin
 ADMIN_ID = int(os.getenv('ADMIN_ID', 0))
 ADMIN_IDS = [int(id) for id in os.getenv('ADMIN_IDS', str(ADMIN_ID)).split(',') if id.strip()]
 
+# In-process profile cache (by telegram_id)
+PROFILE_CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 10000))
+PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', 300))
+
+# Referral code index: caches of valid/invalid codes and bloom filter of all codes
+REFERRAL_CODE_CACHE_SIZE = int(os.getenv('REFERRAL_CODE_CACHE_SIZE', 50000))
+REFERRAL_CODE_CACHE_TTL = int(os.getenv('REFERRAL_CODE_CACHE_TTL', 600))
+REFERRAL_CODE_NEGATIVE_TTL = int(os.getenv('REFERRAL_CODE_NEGATIVE_TTL', 60))
+REFERRAL_CODE_BLOOM_CAPACITY = int(os.getenv('REFERRAL_CODE_BLOOM_CAPACITY', 100000))
+REFERRAL_CODE_BLOOM_ERROR_RATE = float(os.getenv('REFERRAL_CODE_BLOOM_ERROR_RATE', 0.001))
+REFERRAL_CODE_REFRESH_INTERVAL = int(os.getenv('REFERRAL_CODE_REFRESH_INTERVAL', 60))
+
+# Per-user throttling: a user may burst N actions, refilled evenly over PERIOD seconds
+THROTTLE_DEFAULT_BURST = int(os.getenv('THROTTLE_DEFAULT_BURST', 10))
+THROTTLE_DEFAULT_PERIOD = int(os.getenv('THROTTLE_DEFAULT_PERIOD', 10))
+THROTTLE_START_BURST = int(os.getenv('THROTTLE_START_BURST', 3))
+THROTTLE_START_PERIOD = int(os.getenv('THROTTLE_START_PERIOD', 60))
+THROTTLE_OTP_BURST = int(os.getenv('THROTTLE_OTP_BURST', 2))
+THROTTLE_OTP_PERIOD = int(os.getenv('THROTTLE_OTP_PERIOD', 300))
+
+# Outbound send scheduler (Telegram flood limits)
+SEND_GLOBAL_RATE = float(os.getenv('SEND_GLOBAL_RATE', 30))  # messages per second for the whole bot
+SEND_PRIVATE_CHAT_INTERVAL = float(os.getenv('SEND_PRIVATE_CHAT_INTERVAL', 1))  # seconds between messages to one user
+SEND_GROUP_CHAT_INTERVAL = float(os.getenv('SEND_GROUP_CHAT_INTERVAL', 3))  # groups/channels: 20 messages per minute
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', 3))
+
+# Admin broadcast
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', 8))
+BROADCAST_QUEUE_SIZE = int(os.getenv('BROADCAST_QUEUE_SIZE', 100))
+BROADCAST_CURSOR_PREFETCH = int(os.getenv('BROADCAST_CURSOR_PREFETCH', 500))
+BROADCAST_CURSOR_CHUNK = int(os.getenv('BROADCAST_CURSOR_CHUNK', 5000))
+BROADCAST_STATE_PATH = os.getenv('BROADCAST_STATE_PATH', 'broadcast_state.json')
+BROADCAST_CHECKPOINT_INTERVAL = int(os.getenv('BROADCAST_CHECKPOINT_INTERVAL', 5))
+
+# Update processing: max updates running at once (polling/webhook wait when reached);
+# updates of one user are processed in order
+UPDATE_MAX_CONCURRENCY = int(os.getenv('UPDATE_MAX_CONCURRENCY', 100))
+# Updates waiting behind a running update of the same user; extra ones are dropped
+UPDATE_MAX_QUEUED_PER_USER = int(os.getenv('UPDATE_MAX_QUEUED_PER_USER', 10))
+# Seconds to wait for in-flight updates on shutdown
+UPDATE_DRAIN_TIMEOUT = int(os.getenv('UPDATE_DRAIN_TIMEOUT', 10))
+# Time budget (seconds) for handling one update, shared by all backend/database calls in it
+UPDATE_DEADLINE = float(os.getenv('UPDATE_DEADLINE', 20))
+
+# FSM storage: memory | redis | sqlite
+FSM_STORAGE = os.getenv('FSM_STORAGE', 'memory')
+FSM_REDIS_URL = os.getenv('FSM_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+FSM_SQLITE_PATH = os.getenv('FSM_SQLITE_PATH', 'fsm_storage.sqlite3')
+# Seconds of inactivity after which an unfinished FSM flow expires (0 - never)
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', 86400))
+
 # Logging
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
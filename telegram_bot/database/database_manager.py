@@ -1,8 +1,24 @@
+import asyncio
 import asyncpg
 import os
-from typing import Optional
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Optional
 from dotenv import load_dotenv
 
+from .login_stats import LoginStatsBuffer
+from .migrator import migration_runner
+from .queries import (
+    QueryConnection, query_registry, PROFILE_BY_TELEGRAM_ID, PROFILE_BY_REFERRAL_CODE,
+    INSERT_PROFILE, LINK_REFERRAL, REFERRAL_STATS
+)
+from .schema import REFERRAL_STATS_MERGE_DUPLICATES
+from ..metrics import registry
+from ..services.profile_cache import invalidate_profile, profile_cache
+from ..services.referral_codes import normalize_code, referral_code_index
+from ..utils.deadline import run_with_deadline
+from ..utils.singleflight import SingleFlight
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -12,6 +28,16 @@ USE_DB_API = os.getenv("USE_DB_API", "false").lower() == "true"
 USE_SUPABASE = os.getenv("USE_SUPABASE", "false").lower() == "true"
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
+# Write-behind буфер статистики входов: интервал сброса (сек) и порог досрочного сброса
+LOGIN_STATS_FLUSH_INTERVAL = float(os.getenv("LOGIN_STATS_FLUSH_INTERVAL", 10))
+LOGIN_STATS_MAX_PENDING = int(os.getenv("LOGIN_STATS_MAX_PENDING", 5000))
+
+# Применять миграции схемы при подключении (иначе: python -m telegram_bot.database.migrator)
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+# Уникальные индексы, без которых не работают запросы с ON CONFLICT
+REQUIRED_INDEXES = ('uq_referral_stats_user_id',)
+
 if USE_API_CLIENT:
     # Используем API клиент для взаимодействия с Node.js сервером
     from ..api_client import api_client
@@ -34,6 +60,46 @@ else:
         # Резервный вариант - старые переменные
         DATABASE_URL = os.getenv("POSTGRES_DATABASE_URL", os.getenv("DATABASE_URL"))
 
+# Счетчики, которые можно атомарно увеличивать через Database.increment_counters
+COUNTER_COLUMNS = {
+    'user_stats': ('total_logins',),
+    'referral_stats': ('total_referrals', 'level_1_count', 'level_2_count',
+                       'level_3_count', 'level_4_count', 'level_5_count'),
+}
+
+# Статистика пользователя без рефералов
+EMPTY_REFERRAL_STATS = {
+    'level_1_count': 0,
+    'level_2_count': 0,
+    'level_3_count': 0,
+    'level_4_count': 0,
+    'level_5_count': 0,
+    'total_referrals': 0
+}
+
+
+class UnsupportedOperationError(Exception):
+    """Операция недоступна для выбранного источника данных (см. Database.supports_bulk_operations)"""
+
+    def __init__(self, operation: str, mode: str):
+        super().__init__(f"{operation} недоступно в режиме {mode}")
+        self.operation = operation
+        self.mode = mode
+
+
+# Длительность и ошибки обращений к источнику данных по режиму Database (mode)
+BACKEND_DURATION = registry.histogram(
+    "bot_db_backend_duration_seconds",
+    "Database call time by backend mode and operation",
+    ("mode", "operation")
+)
+BACKEND_ERRORS = registry.counter(
+    "bot_db_backend_errors_total",
+    "Database calls that raised an exception, by backend mode and operation",
+    ("mode", "operation")
+)
+
+
 class Database:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
@@ -41,9 +107,68 @@ class Database:
         self.use_api_client = USE_API_CLIENT
         self.use_db_api = USE_DB_API
         self.supabase_service_role_key = SUPABASE_SERVICE_ROLE_KEY
-
-    async def connect(self):
-        """Создает подключение к базе данных или инициализирует API клиент"""
+        self.profile_cache = profile_cache
+        self.referral_codes = referral_code_index
+        self.queries = query_registry
+        # Одновременные одинаковые запросы чтения объединяются в один
+        self.flights = SingleFlight("database")
+        self.login_stats = LoginStatsBuffer(
+            self._flush_login_stats,
+            flush_interval=LOGIN_STATS_FLUSH_INTERVAL,
+            max_pending=LOGIN_STATS_MAX_PENDING
+        )
+        # Корутины, ожидающие свободное соединение пула asyncpg
+        self.pool_waiting = 0
+
+    @property
+    def mode(self) -> str:
+        """Источник данных: api_client, db_api, supabase или asyncpg"""
+        if self.use_api_client:
+            return "api_client"
+        if self.use_db_api:
+            return "db_api"
+        if self.use_supabase:
+            return "supabase"
+        return "asyncpg"
+
+    @property
+    def supports_bulk_operations(self) -> bool:
+        """
+        Перебор всех пользователей (рассылка) и обслуживание дерева рефералов.
+        Backend API не предоставляет таких методов - в режиме API клиента они недоступны
+        """
+        return not self.use_api_client
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Соединение из пула asyncpg (с учетом ожидающих свободное соединение)"""
+        self.pool_waiting += 1
+        try:
+            connection = await self.pool.acquire()
+        finally:
+            self.pool_waiting -= 1
+        try:
+            yield connection
+        finally:
+            await self.pool.release(connection)
+
+    async def _backend_call(self, operation: str, call: Awaitable):
+        """Обращение к источнику данных в пределах бюджета обновления, с метриками длительности и ошибок"""
+        labels = (self.mode, operation)
+        started = time.perf_counter()
+        try:
+            return await run_with_deadline(call)
+        except Exception:
+            BACKEND_ERRORS.labels(*labels).inc()
+            raise
+        finally:
+            BACKEND_DURATION.labels(*labels).observe(time.perf_counter() - started)
+
+    async def connect(self, migrate: bool = MIGRATE_ON_STARTUP):
+        """
+        Создает подключение к базе данных или инициализирует API клиент.
+        migrate - применить миграции схемы до проверки обязательных индексов
+        """
         if self.use_api_client:
             print("Используется API клиент для взаимодействия с Node.js сервером")
             # При использовании API клиента не нужно подключаться к БД напрямую
@@ -52,14 +177,13 @@ class Database:
             # Импортируем DB API клиент
             from ..db_api_client import db_api_client
             self.db_api_client = db_api_client
-        elif self.use_db_api:
-            print("Используется DB API для безопасного доступа к базе данных")
-            # Импортируем DB API клиент
-            from ..db_api_client import db_api_client
-            self.db_api_client = db_api_client
+            # Открываем общий пул keep-alive соединений к DB API
+            await db_api_client.start()
         elif self.use_supabase:
             print("Используется Supabase для хранения данных")
             # Подключение к Supabase уже инициализировано в supabase_client
+            from ..supabase_client import supabase_client
+            self.supabase_client = supabase_client
         else:
             if not DATABASE_URL:
                 raise ValueError("Не найдена строка подключения к базе данных. Установите переменную окружения SUPABASE_DATABASE_URL")
@@ -68,39 +192,58 @@ class Database:
                 DATABASE_URL,
                 min_size=5,
                 max_size=20,
-                command_timeout=60
+                command_timeout=60,
+                # Горячие запросы подготавливаются на каждом новом соединении
+                connection_class=QueryConnection,
+                init=self.queries.prepare
             )
             print("Подключение к базе данных установлено")
 
-    async def get_user_by_telegram_id(self, telegram_id: int):
-        """Получает пользователя по telegram_id"""
-        if self.use_api_client:
-            # Используем API клиент для получения пользователя
-            from ..api_client import api_client
-            return await api_client.get_user(telegram_id)
-        elif self.use_db_api:
-            # Используем DB API клиент для получения пользователя
-            from ..db_api_client import db_api_client
-            return db_api_client.get_user_by_telegram_id(telegram_id)
-        elif self.use_supabase:
-            # Используем Supabase клиент для получения пользователя
-            from ..supabase_client import supabase_client
-            return await supabase_client.get_user_by_telegram_id(telegram_id)
-        else:
-            if not self.pool:
-                raise Exception("База данных не подключена")
-
-            async with self.pool.acquire() as connection:
-                query = """
-                    SELECT id, telegram_id, telegram_username, first_name, last_name,
-                           avatar_url, referral_code, referred_by, created_at
-                    FROM profiles
-                    WHERE telegram_id = $1
-                """
-                return await connection.fetchrow(query, telegram_id)
+            try:
+                if migrate:
+                    await self.check_and_create_tables()
+                await self.check_required_indexes()
+            except Exception:
+                # Без актуальной схемы запросы бота могут падать - не оставляем пул открытым
+                await self.pool.close()
+                self.pool = None
+                raise
+
+        # Запускаем фоновый сброс статистики входов
+        self.login_stats.start()
+
+        if not self.use_api_client:
+            # Прогреваем индекс реферальных кодов, чтобы несуществующие коды отклонялись без запроса к БД
+            try:
+                await self.referral_codes.start(self._load_referral_codes)
+            except Exception as e:
+                print(f"Не удалось загрузить реферальные коды, индекс работает без фильтра: {e}")
 
     async def get_user_by_referral_code(self, referral_code: str):
-        """Получает пользователя по реферальному коду"""
+        """
+        Получает пользователя по реферальному коду.
+        Коды, которые источник данных недавно не нашел, отклоняются по индексу referral_codes
+        без повторного запроса, найденные владельцы кодов кэшируются.
+        """
+        if self.referral_codes.is_confirmed_invalid(referral_code):
+            return None
+        cached = self.referral_codes.get_owner(referral_code)
+        if cached is not self.referral_codes.valid.MISSING:
+            return cached
+
+        async def load():
+            user = await self._backend_call('get_user_by_referral_code', self._fetch_user_by_referral_code(referral_code))
+            if user:
+                self.referral_codes.remember_valid(referral_code, user)
+            elif not self.use_api_client:
+                # В режиме API клиента None может означать ошибку запроса, такие ответы не кэшируем
+                self.referral_codes.remember_invalid(referral_code)
+            return user
+
+        return await self.flights.do(('user_by_referral_code', normalize_code(referral_code)), load)
+
+    async def _fetch_user_by_referral_code(self, referral_code: str):
+        """Загружает пользователя по реферальному коду из выбранного источника данных"""
         if self.use_api_client:
             # API клиент не имеет прямого метода для этого, используем verify
             from ..api_client import api_client
@@ -111,7 +254,7 @@ class Database:
         elif self.use_db_api:
             # Используем DB API клиент для получения пользователя
             from ..db_api_client import db_api_client
-            return db_api_client.get_user_by_referral_code(referral_code)
+            return await db_api_client.get_user_by_referral_code(referral_code)
         elif self.use_supabase:
             # Используем Supabase клиент для получения пользователя
             from ..supabase_client import supabase_client
@@ -120,83 +263,103 @@ class Database:
             if not self.pool:
                 raise Exception("База данных не подключена")
 
-            async with self.pool.acquire() as connection:
-                query = """
-                    SELECT id, telegram_id, telegram_username, first_name, last_name,
-                           avatar_url, referral_code, referred_by, created_at
-                    FROM profiles
-                    WHERE referral_code = $1
-                """
-                return await connection.fetchrow(query, referral_code.upper())
-
-    async def create_user(self, telegram_id: int, first_name: str, last_name: str = None,
-                          username: str = None, avatar_url: str = None, referral_code: str = None,
-                          referred_by: str = None):
-        """Создает нового пользователя"""
-        if self.use_api_client:
-            # Используем API клиент для создания пользователя
-            from ..api_client import api_client
-            return await api_client.register_user(
-                telegram_id=telegram_id,
-                first_name=first_name,
-                last_name=last_name,
-                username=username,
-                avatar_url=avatar_url,
-                referral_code=referral_code
-            )
-        elif self.use_db_api:
-            # Используем DB API клиент для создания пользователя
-            from ..db_api_client import db_api_client
-            user_data = {
-                'telegram_id': telegram_id,
-                'telegram_username': username,
-                'first_name': first_name,
-                'last_name': last_name,
-                'avatar_url': avatar_url,
-                'referral_code': referral_code,
-                'referred_by': referred_by
-            }
-            return db_api_client.create_user(user_data)
+            async with self.acquire() as connection:
+                return await self.queries.fetchrow(connection, PROFILE_BY_REFERRAL_CODE, referral_code.upper())
+
+    async def _load_referral_codes(self, since=None):
+        """
+        Загружает пары (referral_code, created_at) для индекса реферальных кодов.
+        since - наибольший created_at из предыдущей загрузки (None - загрузить все коды).
+        При ошибке бросает исключение: по неполному списку нельзя отклонять коды.
+        """
+        if self.use_db_api:
+            rows = await self.db_api_client.list_referral_codes(since)
+            return [(row.get('referral_code'), row.get('created_at')) for row in rows]
         elif self.use_supabase:
-            # Используем Supabase клиент для создания пользователя
             from ..supabase_client import supabase_client
-            return await supabase_client.create_user(
-                telegram_id, first_name, last_name, username,
-                avatar_url, referral_code, referred_by
-            )
+            rows = await supabase_client.list_referral_codes(since)
+            return [(row.get('referral_code'), row.get('created_at')) for row in rows]
         else:
             if not self.pool:
                 raise Exception("База данных не подключена")
 
-            async with self.pool.acquire() as connection:
-                query = """
-                    INSERT INTO profiles (
-                        telegram_id, telegram_username, first_name, last_name,
-                        avatar_url, referral_code, referred_by
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7)
-                    RETURNING id, telegram_id, created_at
-                """
-                return await connection.fetchrow(
-                    query,
-                    telegram_id, username, first_name, last_name,
-                    avatar_url, referral_code, referred_by
-                )
+            async with self.acquire() as connection:
+                if since is None:
+                    rows = await connection.fetch(
+                        "SELECT referral_code, created_at FROM profiles WHERE referral_code IS NOT NULL"
+                    )
+                else:
+                    # Перекрытие в минуту покрывает транзакции, зафиксированные позже своего created_at
+                    rows = await connection.fetch("""
+                        SELECT referral_code, created_at FROM profiles
+                        WHERE referral_code IS NOT NULL AND created_at >= $1 - INTERVAL '1 minute'
+                    """, since)
+                return [(row['referral_code'], row['created_at']) for row in rows]
+
+    async def iter_telegram_ids(self, after: int = 0, prefetch: int = 500, chunk_size: int = 5000):
+        """
+        Потоково перебирает telegram_id всех пользователей по возрастанию, начиная после after.
+        В asyncpg используется серверный курсор; курсор переоткрывается каждые chunk_size строк,
+        чтобы не держать транзакцию открытой на всю рассылку.
+        """
+        if not self.supports_bulk_operations:
+            raise UnsupportedOperationError("Перебор пользователей", self.mode)
+        elif self.use_db_api or self.use_supabase:
+            if self.use_db_api:
+                client = self.db_api_client
+            else:
+                from ..supabase_client import supabase_client as client
+            while True:
+                ids = await client.list_telegram_ids(after, prefetch)
+                for telegram_id in ids:
+                    yield telegram_id
+                if len(ids) < prefetch:
+                    return
+                after = ids[-1]
+        else:
+            if not self.pool:
+                raise Exception("База данных не подключена")
 
-            # Проверяем и создаем таблицы при подключении
-            await self.check_and_create_tables()
+            query = "SELECT telegram_id FROM profiles WHERE telegram_id > $1 ORDER BY telegram_id"
+            while True:
+                ids = []
+                async with self.acquire() as connection:
+                    async with connection.transaction():
+                        async for row in connection.cursor(query, after, prefetch=prefetch):
+                            ids.append(row['telegram_id'])
+                            if len(ids) >= chunk_size:
+                                break
+                for telegram_id in ids:
+                    yield telegram_id
+                if len(ids) < chunk_size:
+                    return
+                after = ids[-1]
 
     async def disconnect(self):
         """Закрывает пул соединений или завершает работу с API клиентом"""
-        if not self.use_api_client and not self.use_supabase and self.pool:
+        # Записываем накопленную статистику входов до закрытия соединений
+        await self.login_stats.stop()
+        await self.referral_codes.stop()
+
+        if self.use_db_api:
+            from ..db_api_client import db_api_client
+            await db_api_client.close()
+            print("Отключение от DB API завершено")
+        elif not self.use_api_client and not self.use_supabase and self.pool:
             await self.pool.close()
             print("Подключение к базе данных закрыто")
         elif self.use_api_client:
             print("Отключение от API клиента завершено")
         elif self.use_supabase:
+            from ..supabase_client import supabase_client
+            await supabase_client.close()
             print("Отключение от Supabase завершено")
 
     async def check_and_create_tables(self):
-        """Проверяет наличие всех таблиц и столбцов в базе данных и создает/обновляет их при необходимости"""
+        """
+        Приводит схему базы данных к актуальной версии (см. migrator).
+        Если схема актуальна, выполняется один запрос версии из schema_migrations.
+        """
         if self.use_api_client or self.use_supabase:
             # При использовании API клиента или Supabase, управление схемой базы данных осуществляется на сервере
             print(f"Пропускаем проверку и создание таблиц - используется {'API клиент' if self.use_api_client else 'Supabase'}")
@@ -205,672 +368,48 @@ class Database:
         if not self.pool:
             raise Exception("База данных не подключена")
 
-        async with self.pool.acquire() as connection:
-            # Проверяем и создаем/обновляем таблицы
-            await self.ensure_profiles_table(connection)
-            await self.ensure_referrals_table(connection)
-            await self.ensure_balances_table(connection)
-            await self.ensure_user_stats_table(connection)
-            await self.ensure_referral_stats_table(connection)
-            await self.ensure_subscriptions_table(connection)
-            await self.ensure_vpn_keys_table(connection)
-            await self.ensure_channels_table(connection)
-            await self.ensure_bots_table(connection)
-            await self.ensure_user_roles_table(connection)
-            await self.ensure_support_tickets_table(connection)
-
-            print("Структура базы данных проверена и обновлена при необходимости")
-
-    async def ensure_profiles_table(self, connection):
-        """Проверяет и создает/обновляет таблицу profiles"""
-        # Проверяем, существует ли таблица
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'profiles'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу profiles...")
-            await connection.execute("""
-                -- Таблица пользователей
-                CREATE TABLE profiles (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    telegram_id BIGINT UNIQUE NOT NULL,
-                    telegram_username VARCHAR(255),
-                    first_name VARCHAR(255) NOT NULL,
-                    last_name VARCHAR(255),
-                    avatar_url TEXT,
-                    referral_code VARCHAR(50) UNIQUE,
-                    referred_by UUID REFERENCES profiles(id),
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска по Telegram ID
-                CREATE INDEX idx_profiles_telegram_id ON profiles(telegram_id);
-
-                -- Индекс для быстрого поиска по реферальному коду
-                CREATE INDEX idx_profiles_referral_code ON profiles(referral_code);
-            """)
-        else:
-            # Проверяем и добавляем отсутствующие столбцы в таблицу profiles
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'telegram_id': 'BIGINT UNIQUE NOT NULL',
-                'telegram_username': 'VARCHAR(255)',
-                'first_name': 'VARCHAR(255) NOT NULL',
-                'last_name': 'VARCHAR(255)',
-                'avatar_url': 'TEXT',
-                'referral_code': 'VARCHAR(50) UNIQUE',
-                'referred_by': 'UUID REFERENCES profiles(id)',
-                'created_at': 'TIMESTAMP DEFAULT NOW()',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'profiles' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу profiles...")
-                    if col_name == 'id':
-                        # Для первичного ключа создаем отдельно
-                        await connection.execute(f"ALTER TABLE profiles ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE profiles ADD CONSTRAINT pk_profiles_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        # Для внешних ключей сначала добавляем столбец, потом создаем связь
-                        ref_part = col_def.split('REFERENCES')[1].strip()
-                        await connection.execute(f"ALTER TABLE profiles ADD COLUMN {col_name} UUID")
-                        await connection.execute(f"ALTER TABLE profiles ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE profiles ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_referrals_table(self, connection):
-        """Проверяет и создает/обновляет таблицу referrals"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'referrals'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу referrals...")
-            await connection.execute("""
-                -- Таблица рефералов
-                CREATE TABLE referrals (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    referrer_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    referred_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    level INTEGER DEFAULT 1,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    
-                    -- Один пользователь не может быть рефералом одного и того же пригласившего несколько раз
-                    CONSTRAINT unique_referral_per_referrer UNIQUE (referrer_id, referred_id)
-                );
-
-                -- Индекс для быстрого поиска рефералов по пригласившему
-                CREATE INDEX idx_referrals_referrer ON referrals(referrer_id);
-                CREATE INDEX idx_referrals_referred ON referrals(referred_id);
-            """)
-        else:
-            # Проверяем и добавляем отсутствующие столбцы в таблицу referrals
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'referrer_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'referred_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'level': 'INTEGER DEFAULT 1',
-                'is_active': 'BOOLEAN DEFAULT TRUE',
-                'created_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'referrals' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу referrals...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE referrals ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE referrals ADD CONSTRAINT pk_referrals_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE referrals ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE referrals ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE referrals ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_balances_table(self, connection):
-        """Проверяет и создает/обновляет таблицу balances"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'balances'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу balances...")
-            await connection.execute("""
-                -- Таблица балансов пользователей
-                CREATE TABLE balances (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    internal_balance DECIMAL(10, 2) DEFAULT 0.00,
-                    external_balance DECIMAL(10, 2) DEFAULT 0.00,
-                    total_earned DECIMAL(10, 2) DEFAULT 0.00,
-                    total_withdrawn DECIMAL(10, 2) DEFAULT 0.00,
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска баланса по пользователю
-                CREATE INDEX idx_balances_user_id ON balances(user_id);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'internal_balance': 'DECIMAL(10, 2) DEFAULT 0.00',
-                'external_balance': 'DECIMAL(10, 2) DEFAULT 0.00',
-                'total_earned': 'DECIMAL(10, 2) DEFAULT 0.00',
-                'total_withdrawn': 'DECIMAL(10, 2) DEFAULT 0.00',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'balances' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу balances...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE balances ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE balances ADD CONSTRAINT pk_balances_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE balances ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE balances ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE balances ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_user_stats_table(self, connection):
-        """Проверяет и создает/обновляет таблицу user_stats"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'user_stats'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу user_stats...")
-            await connection.execute("""
-                -- Таблица статистики пользователей
-                CREATE TABLE user_stats (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    total_logins INTEGER DEFAULT 0,
-                    last_login_at TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска статистики по пользователю
-                CREATE INDEX idx_user_stats_user_id ON user_stats(user_id);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'total_logins': 'INTEGER DEFAULT 0',
-                'last_login_at': 'TIMESTAMP',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'user_stats' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу user_stats...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE user_stats ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE user_stats ADD CONSTRAINT pk_user_stats_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE user_stats ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE user_stats ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE user_stats ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_referral_stats_table(self, connection):
-        """Проверяет и создает/обновляет таблицу referral_stats"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'referral_stats'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу referral_stats...")
-            await connection.execute("""
-                -- Таблица статистики по рефералам
-                CREATE TABLE referral_stats (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    total_referrals INTEGER DEFAULT 0,
-                    total_earnings DECIMAL(10, 2) DEFAULT 0.00,
-                    level_1_count INTEGER DEFAULT 0,
-                    level_2_count INTEGER DEFAULT 0,
-                    level_3_count INTEGER DEFAULT 0,
-                    level_4_count INTEGER DEFAULT 0,
-                    level_5_count INTEGER DEFAULT 0,
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска статистики по пользователю
-                CREATE INDEX idx_referral_stats_user_id ON referral_stats(user_id);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'total_referrals': 'INTEGER DEFAULT 0',
-                'total_earnings': 'DECIMAL(10, 2) DEFAULT 0.00',
-                'level_1_count': 'INTEGER DEFAULT 0',
-                'level_2_count': 'INTEGER DEFAULT 0',
-                'level_3_count': 'INTEGER DEFAULT 0',
-                'level_4_count': 'INTEGER DEFAULT 0',
-                'level_5_count': 'INTEGER DEFAULT 0',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'referral_stats' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу referral_stats...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE referral_stats ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE referral_stats ADD CONSTRAINT pk_referral_stats_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE referral_stats ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE referral_stats ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE referral_stats ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_subscriptions_table(self, connection):
-        """Проверяет и создает/обновляет таблицу subscriptions"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'subscriptions'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу subscriptions...")
-            await connection.execute("""
-                -- Таблица подписок
-                CREATE TABLE subscriptions (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    plan_name VARCHAR(100) NOT NULL,
-                    plan_type VARCHAR(50) NOT NULL,
-                    status VARCHAR(20) DEFAULT 'inactive',
-                    expires_at TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска активных подписок
-                CREATE INDEX idx_subscriptions_user_id_status ON subscriptions(user_id, status);
-                CREATE INDEX idx_subscriptions_expires_at ON subscriptions(expires_at);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'plan_name': 'VARCHAR(100) NOT NULL',
-                'plan_type': 'VARCHAR(50) NOT NULL',
-                'status': 'VARCHAR(20) DEFAULT \'inactive\'',
-                'expires_at': 'TIMESTAMP',
-                'created_at': 'TIMESTAMP DEFAULT NOW()',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'subscriptions' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу subscriptions...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE subscriptions ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE subscriptions ADD CONSTRAINT pk_subscriptions_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE subscriptions ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE subscriptions ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE subscriptions ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_vpn_keys_table(self, connection):
-        """Проверяет и создает/обновляет таблицу vpn_keys"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'vpn_keys'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу vpn_keys...")
-            await connection.execute("""
-                -- Таблица ключей VPN
-                CREATE TABLE vpn_keys (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    status VARCHAR(20) DEFAULT 'inactive',
-                    expires_at TIMESTAMP,
-                    server_location VARCHAR(100),
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска VPN ключей по пользователю
-                CREATE INDEX idx_vpn_keys_user_id ON vpn_keys(user_id);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'status': 'VARCHAR(20) DEFAULT \'inactive\'',
-                'expires_at': 'TIMESTAMP',
-                'server_location': 'VARCHAR(100)',
-                'created_at': 'TIMESTAMP DEFAULT NOW()',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'vpn_keys' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу vpn_keys...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE vpn_keys ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE vpn_keys ADD CONSTRAINT pk_vpn_keys_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE vpn_keys ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE vpn_keys ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE vpn_keys ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_channels_table(self, connection):
-        """Проверяет и создает/обновляет таблицу channels"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'channels'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу channels...")
-            await connection.execute("""
-                -- Таблица телеграм каналов
-                CREATE TABLE channels (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    channel_title VARCHAR(255) NOT NULL,
-                    channel_username VARCHAR(255),
-                    subscribers_count INTEGER,
-                    is_verified BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска каналов по пользователю
-                CREATE INDEX idx_channels_user_id ON channels(user_id);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'channel_title': 'VARCHAR(255) NOT NULL',
-                'channel_username': 'VARCHAR(255)',
-                'subscribers_count': 'INTEGER',
-                'is_verified': 'BOOLEAN DEFAULT FALSE',
-                'created_at': 'TIMESTAMP DEFAULT NOW()',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'channels' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу channels...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE channels ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE channels ADD CONSTRAINT pk_channels_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE channels ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE channels ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE channels ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_bots_table(self, connection):
-        """Проверяет и создает/обновляет таблицу bots"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'bots'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу bots...")
-            await connection.execute("""
-                -- Таблица ботов пользователя
-                CREATE TABLE bots (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    bot_name VARCHAR(255) NOT NULL,
-                    bot_username VARCHAR(255),
-                    bot_type VARCHAR(50) DEFAULT 'unknown',
-                    is_active BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска ботов по пользователю
-                CREATE INDEX idx_bots_user_id ON bots(user_id);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'bot_name': 'VARCHAR(255) NOT NULL',
-                'bot_username': 'VARCHAR(255)',
-                'bot_type': 'VARCHAR(50) DEFAULT \'unknown\'',
-                'is_active': 'BOOLEAN DEFAULT FALSE',
-                'created_at': 'TIMESTAMP DEFAULT NOW()',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'bots' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу bots...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE bots ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE bots ADD CONSTRAINT pk_bots_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE bots ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE bots ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE bots ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_user_roles_table(self, connection):
-        """Проверяет и создает/обновляет таблицу user_roles"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'user_roles'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу user_roles...")
-            await connection.execute("""
-                -- Таблица ролей пользователей
-                CREATE TABLE user_roles (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    role VARCHAR(50) DEFAULT 'user',
-                    created_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска роли по пользователю
-                CREATE INDEX idx_roles_user_id ON user_roles(user_id);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'role': 'VARCHAR(50) DEFAULT \'user\'',
-                'created_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'user_roles' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу user_roles...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE user_roles ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE user_roles ADD CONSTRAINT pk_user_roles_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE user_roles ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE user_roles ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE user_roles ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
-
-    async def ensure_support_tickets_table(self, connection):
-        """Проверяет и создает/обновляет таблицу support_tickets"""
-        table_exists = await connection.fetchval("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables
-                WHERE table_schema = 'public'
-                AND table_name = 'support_tickets'
-            );
-        """)
-        
-        if not table_exists:
-            print("Создаем таблицу support_tickets...")
-            await connection.execute("""
-                -- Таблица заявок в поддержку
-                CREATE TABLE support_tickets (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
-                    category VARCHAR(100) NOT NULL,
-                    subject VARCHAR(255),
-                    message TEXT NOT NULL,
-                    status VARCHAR(20) DEFAULT 'open',
-                    created_at TIMESTAMP DEFAULT NOW(),
-                    updated_at TIMESTAMP DEFAULT NOW()
-                );
-
-                -- Индекс для быстрого поиска заявок по пользователю
-                CREATE INDEX idx_tickets_user_id ON support_tickets(user_id);
-            """)
-        else:
-            columns_to_check = {
-                'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
-                'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
-                'category': 'VARCHAR(100) NOT NULL',
-                'subject': 'VARCHAR(255)',
-                'message': 'TEXT NOT NULL',
-                'status': 'VARCHAR(20) DEFAULT \'open\'',
-                'created_at': 'TIMESTAMP DEFAULT NOW()',
-                'updated_at': 'TIMESTAMP DEFAULT NOW()'
-            }
-
-            for col_name, col_def in columns_to_check.items():
-                column_exists = await connection.fetchval(f"""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.columns
-                        WHERE table_name = 'support_tickets' AND column_name = '{col_name}'
-                    );
-                """)
-                if not column_exists:
-                    print(f"Добавляем столбец {col_name} в таблицу support_tickets...")
-                    if col_name == 'id':
-                        await connection.execute(f"ALTER TABLE support_tickets ADD COLUMN {col_name} {col_def.split('PRIMARY')[0]}")
-                        await connection.execute("ALTER TABLE support_tickets ADD CONSTRAINT pk_support_tickets_id PRIMARY KEY (id)")
-                    elif 'REFERENCES' in col_def:
-                        ref_part = col_def.split('REFERENCES')[1].split('ON')[0].strip()
-                        await connection.execute(f"ALTER TABLE support_tickets ADD COLUMN {col_name} UUID NOT NULL")
-                        await connection.execute(f"ALTER TABLE support_tickets ADD FOREIGN KEY ({col_name}) REFERENCES {ref_part}")
-                    else:
-                        await connection.execute(f"ALTER TABLE support_tickets ADD COLUMN {col_name} {col_def.replace('PRIMARY KEY', '')}")
+        applied = await migration_runner.migrate(self.pool)
+        if applied:
+            print(f"Применены миграции схемы: {', '.join(str(version) for version in applied)}")
+
+    async def check_required_indexes(self):
+        """
+        Проверяет уникальные индексы, на которые опираются запросы бота (ON CONFLICT).
+        Без них каждая регистрация по реферальной ссылке завершалась бы ошибкой,
+        поэтому бот не запускается.
+        """
+        async with self.acquire() as connection:
+            rows = await connection.fetch(
+                "SELECT name FROM unnest($1::text[]) AS name WHERE to_regclass('public.' || name) IS NULL",
+                list(REQUIRED_INDEXES)
+            )
+        if rows:
+            missing = ', '.join(row['name'] for row in rows)
+            raise Exception(f"В базе данных нет индексов {missing}: примените миграции "
+                            "(python -m telegram_bot.database.migrator)")
 
     async def get_user_by_telegram_id(self, telegram_id: int):
-        """Получает пользователя по telegram_id"""
+        """
+        Получает пользователя по telegram_id.
+        Найденные профили кэшируются в памяти процесса (profile_cache) до истечения TTL
+        или до create_user для этого telegram_id.
+        """
+        cached = self.profile_cache.get(telegram_id)
+        if cached is not self.profile_cache.MISSING:
+            return cached
+
+        async def load():
+            # create_user во время чтения сбрасывает кэш - тогда результат может быть устаревшим
+            cache_version = self.profile_cache.version
+            user = await self._backend_call('get_user_by_telegram_id', self._fetch_user_by_telegram_id(telegram_id))
+            if user:
+                self.profile_cache.set(telegram_id, user, version=cache_version)
+            return user
+
+        return await self.flights.do(('user_by_telegram_id', telegram_id), load)
+
+    async def _fetch_user_by_telegram_id(self, telegram_id: int):
+        """Загружает пользователя по telegram_id из выбранного источника данных"""
         if self.use_api_client:
             # Используем API клиент для получения пользователя
             from ..api_client import api_client
@@ -878,7 +417,7 @@ class Database:
         elif self.use_db_api:
             # Используем DB API клиент для получения пользователя
             from ..db_api_client import db_api_client
-            return db_api_client.get_user_by_telegram_id(telegram_id)
+            return await db_api_client.get_user_by_telegram_id(telegram_id)
         elif self.use_supabase:
             # Используем Supabase клиент для получения пользователя
             from ..supabase_client import supabase_client
@@ -887,19 +426,30 @@ class Database:
             if not self.pool:
                 raise Exception("База данных не подключена")
 
-            async with self.pool.acquire() as connection:
-                query = """
-                    SELECT id, telegram_id, telegram_username, first_name, last_name,
-                           avatar_url, referral_code, referred_by, created_at
-                    FROM profiles
-                    WHERE telegram_id = $1
-                """
-                return await connection.fetchrow(query, telegram_id)
+            async with self.acquire() as connection:
+                return await self.queries.fetchrow(connection, PROFILE_BY_TELEGRAM_ID, telegram_id)
 
     async def create_user(self, telegram_id: int, first_name: str, last_name: str = None,
                           username: str = None, avatar_url: str = None, referral_code: str = None,
                           referred_by: str = None):
         """Создает нового пользователя"""
+        # Сбрасываем закэшированный профиль, чтобы следующее чтение вернуло созданного пользователя
+        invalidate_profile(telegram_id)
+        self.flights.forget(('user_by_telegram_id', telegram_id))
+
+        # По истечении бюджета обновления вставка отменяется (транзакция откатывается)
+        user = await self._backend_call('create_user', self._insert_user(
+            telegram_id, first_name, last_name, username,
+            avatar_url, referral_code, referred_by
+        ))
+        if user:
+            # Код нового пользователя сразу становится известен индексу реферальных кодов
+            profile = (user.get('profile') or user) if isinstance(user, dict) else user
+            self.referral_codes.add(profile.get('referral_code'))
+        return user
+
+    async def _insert_user(self, telegram_id: int, first_name: str, last_name: str,
+                           username: str, avatar_url: str, referral_code: str, referred_by: str):
         if self.use_api_client:
             # Используем API клиент для создания пользователя
             from ..api_client import api_client
@@ -923,7 +473,7 @@ class Database:
                 'referral_code': referral_code,
                 'referred_by': referred_by
             }
-            return db_api_client.create_user(user_data)
+            return await db_api_client.create_user(user_data)
         elif self.use_supabase:
             # Используем Supabase клиент для создания пользователя
             from ..supabase_client import supabase_client
@@ -935,33 +485,33 @@ class Database:
             if not self.pool:
                 raise Exception("База данных не подключена")
 
-            async with self.pool.acquire() as connection:
-                query = """
-                    INSERT INTO profiles (
-                        telegram_id, telegram_username, first_name, last_name,
+            async with self.acquire() as connection:
+                async with connection.transaction():
+                    user = await self.queries.fetchrow(
+                        connection, INSERT_PROFILE,
+                        telegram_id, username, first_name, last_name,
                         avatar_url, referral_code, referred_by
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7)
-                    RETURNING id, telegram_id, created_at
-                """
-                return await connection.fetchrow(
-                    query,
-                    telegram_id, username, first_name, last_name,
-                    avatar_url, referral_code, referred_by
-                )
+                    )
+                    if referred_by:
+                        await self._link_referral(connection, referred_by, user['id'])
+                    return user
 
     async def get_referral_stats(self, user_id: str):
         """Получает статистику по рефералам пользователя"""
+        return await self.flights.do(
+            ('referral_stats', user_id),
+            lambda: self._backend_call('get_referral_stats', self._fetch_referral_stats(user_id))
+        )
+
+    async def _fetch_referral_stats(self, user_id: str):
         if self.use_api_client:
             # При использовании API клиента, статистика получается через веб-приложение
             # Возвращаем заглушку, так как полная реализация требует дополнительных API эндпоинтов
-            return {
-                'level_1_count': 0,
-                'level_2_count': 0,
-                'level_3_count': 0,
-                'level_4_count': 0,
-                'level_5_count': 0,
-                'total_referrals': 0
-            }
+            return dict(EMPTY_REFERRAL_STATS)
+        elif self.use_db_api:
+            # Счетчики по уровням хранятся в referral_stats
+            result = await self.db_api_client.select("referral_stats", where={"user_id": user_id})
+            return result[0] if result else dict(EMPTY_REFERRAL_STATS)
         elif self.use_supabase:
             # Используем Supabase клиент для получения статистики рефералов
             return await supabase_client.get_referral_stats(user_id)
@@ -969,36 +519,137 @@ class Database:
             if not self.pool:
                 raise Exception("База данных не подключена")
 
-            async with self.pool.acquire() as connection:
-                # Получаем количество рефералов на каждом уровне
-                query = """
-                    WITH RECURSIVE referral_tree AS (
-                      -- Начальный уровень (непосредственные рефералы)
-                      SELECT id, referred_by, 1 as level
-                      FROM profiles
-                      WHERE referred_by = $1
-
-                      UNION ALL
-
-                      -- Рекурсивно находим рефералов рефералов
-                      SELECT p.id, p.referred_by, rt.level + 1
-                      FROM profiles p
-                      JOIN referral_tree rt ON p.referred_by = rt.id
-                      WHERE rt.level < 5  -- Максимум 5 уровней
+            async with self.acquire() as connection:
+                # Счетчики по уровням поддерживаются при регистрации (_link_referral)
+                # и пересчитываются rebuild_referral_stats, поэтому чтение - одна строка по индексу
+                row = await self.queries.fetchrow(connection, REFERRAL_STATS, user_id)
+                return row if row else dict(EMPTY_REFERRAL_STATS)
+
+    async def _link_referral(self, connection, referrer_id: str, referred_id: str):
+        """
+        Записывает реферальные связи нового пользователя со всеми предками (до 5 уровней)
+        одной вставкой в referrals и увеличивает их счетчики в referral_stats - всё одним запросом.
+        Подъем по цепочке referred_by - не более 5 чтений по первичному ключу.
+        """
+        await self.queries.fetch(connection, LINK_REFERRAL, referrer_id, referred_id)
+
+    async def backfill_referral_edges(self):
+        """
+        Дописывает в referrals связи со всеми предками (уровни 2-5) для уже существующих пользователей.
+        После этого выборки по уровням используют индекс referrals(referrer_id, level).
+        """
+        if not self.supports_bulk_operations:
+            raise UnsupportedOperationError("Заполнение реферальных связей", self.mode)
+        if self.use_db_api:
+            return await self.db_api_client.backfill_referral_edges()
+        if self.use_supabase:
+            from ..supabase_client import supabase_client
+            return await supabase_client.backfill_referral_edges()
+        if not self.pool:
+            raise Exception("База данных не подключена")
+
+        async with self.acquire() as connection:
+            return await connection.execute("""
+                WITH RECURSIVE tree AS (
+                    SELECT referred_by AS ancestor_id, id AS descendant_id, 1 AS level
+                    FROM profiles
+                    WHERE referred_by IS NOT NULL
+                    UNION ALL
+                    SELECT p.referred_by, t.descendant_id, t.level + 1
+                    FROM tree t
+                    JOIN profiles p ON p.id = t.ancestor_id
+                    WHERE p.referred_by IS NOT NULL AND t.level < 5
+                )
+                INSERT INTO referrals (referrer_id, referred_id, level, is_active)
+                SELECT ancestor_id, descendant_id, level, TRUE FROM tree
+                ON CONFLICT (referrer_id, referred_id) DO UPDATE SET level = EXCLUDED.level
+            """)
+
+    async def rebuild_referral_stats(self):
+        """
+        Пересчитывает счетчики referral_stats всех пользователей по дереву profiles.referred_by.
+        Используется для первичного заполнения и восстановления после записи в обход бота
+        (python -m telegram_bot.database.rebuild_referral_stats).
+        """
+        if not self.supports_bulk_operations:
+            raise UnsupportedOperationError("Пересчет статистики рефералов", self.mode)
+        if self.use_db_api:
+            return await self.db_api_client.rebuild_referral_stats()
+        if self.use_supabase:
+            from ..supabase_client import supabase_client
+            return await supabase_client.rebuild_referral_stats()
+        if not self.pool:
+            raise Exception("База данных не подключена")
+
+        async with self.acquire() as connection:
+            async with connection.transaction():
+                # Блокируем параллельные изменения счетчиков на время пересчета
+                await connection.execute("LOCK TABLE referral_stats IN SHARE ROW EXCLUSIVE MODE")
+
+                # ON CONFLICT (user_id) требует уникальности: сводим возможные дубликаты к одной строке
+                await connection.execute(REFERRAL_STATS_MERGE_DUPLICATES)
+                await connection.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS uq_referral_stats_user_id ON referral_stats(user_id)"
+                )
+
+                return await connection.execute("""
+                    WITH RECURSIVE tree AS (
+                        SELECT referred_by AS ancestor_id, id AS descendant_id, 1 AS level
+                        FROM profiles
+                        WHERE referred_by IS NOT NULL
+                        UNION ALL
+                        SELECT p.referred_by, t.descendant_id, t.level + 1
+                        FROM tree t
+                        JOIN profiles p ON p.id = t.ancestor_id
+                        WHERE p.referred_by IS NOT NULL AND t.level < 5
+                    ),
+                    counts AS (
+                        SELECT ancestor_id,
+                               COUNT(*) FILTER (WHERE level = 1) AS level_1_count,
+                               COUNT(*) FILTER (WHERE level = 2) AS level_2_count,
+                               COUNT(*) FILTER (WHERE level = 3) AS level_3_count,
+                               COUNT(*) FILTER (WHERE level = 4) AS level_4_count,
+                               COUNT(*) FILTER (WHERE level = 5) AS level_5_count,
+                               COUNT(*) AS total_referrals
+                        FROM tree
+                        GROUP BY ancestor_id
                     )
-                    SELECT
-                      COUNT(*) FILTER (WHERE level = 1) as level_1_count,
-                      COUNT(*) FILTER (WHERE level = 2) as level_2_count,
-                      COUNT(*) FILTER (WHERE level = 3) as level_3_count,
-                      COUNT(*) FILTER (WHERE level = 4) as level_4_count,
-                      COUNT(*) FILTER (WHERE level = 5) as level_5_count,
-                      COUNT(*) as total_referrals
-                    FROM referral_tree;
-                """
-                return await connection.fetchrow(query, user_id)
+                    INSERT INTO referral_stats (user_id, total_referrals, level_1_count, level_2_count,
+                                                level_3_count, level_4_count, level_5_count)
+                    SELECT p.id, COALESCE(c.total_referrals, 0), COALESCE(c.level_1_count, 0),
+                           COALESCE(c.level_2_count, 0), COALESCE(c.level_3_count, 0),
+                           COALESCE(c.level_4_count, 0), COALESCE(c.level_5_count, 0)
+                    FROM profiles p
+                    LEFT JOIN counts c ON c.ancestor_id = p.id
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        total_referrals = EXCLUDED.total_referrals,
+                        level_1_count = EXCLUDED.level_1_count,
+                        level_2_count = EXCLUDED.level_2_count,
+                        level_3_count = EXCLUDED.level_3_count,
+                        level_4_count = EXCLUDED.level_4_count,
+                        level_5_count = EXCLUDED.level_5_count,
+                        updated_at = NOW()
+                """)
 
     async def get_user_referral_code(self, referral_code: str):
-        """Получает пользователя по реферальному коду"""
+        """Получает пользователя по реферальному коду (id и telegram_id)"""
+        if self.referral_codes.is_confirmed_invalid(referral_code):
+            return None
+        cached = self.referral_codes.get_owner(referral_code)
+        if cached is not self.referral_codes.valid.MISSING:
+            return cached
+
+        async def load():
+            user = await self._backend_call('get_user_referral_code', self._fetch_user_referral_code(referral_code))
+            if user:
+                self.referral_codes.add(referral_code)
+            elif not self.use_api_client:
+                self.referral_codes.remember_invalid(referral_code)
+            return user
+
+        return await self.flights.do(('user_referral_code', normalize_code(referral_code)), load)
+
+    async def _fetch_user_referral_code(self, referral_code: str):
         if self.use_api_client:
             # При использовании API клиента, поиск по реферальному коду требует дополнительного API эндпоинта
             # Возвращаем заглушку, так как полная реализация требует дополнительных API эндпоинтов
@@ -1008,7 +659,7 @@ class Database:
             from ..db_api_client import db_api_client
             try:
                 # Ищем пользователя по реферальному коду через DB API
-                result = db_api_client.select("profiles", where={"referral_code": referral_code.upper()})
+                result = await db_api_client.select("profiles", where={"referral_code": referral_code.upper()})
                 return result[0] if result and len(result) > 0 else None
             except:
                 return None
@@ -1019,7 +670,7 @@ class Database:
             if not self.pool:
                 raise Exception("База данных не подключена")
 
-            async with self.pool.acquire() as connection:
+            async with self.acquire() as connection:
                 query = "SELECT id, telegram_id FROM profiles WHERE referral_code = $1"
                 return await connection.fetchrow(query, referral_code)
 
@@ -1039,7 +690,7 @@ class Database:
                     'level': level,
                     'is_active': True
                 }
-                db_api_client.insert("referrals", referral_data)
+                await db_api_client.insert("referrals", referral_data)
             except Exception as e:
                 print(f"Ошибка при создании реферальной записи через DB API: {e}")
         elif self.use_supabase:
@@ -1049,7 +700,7 @@ class Database:
             if not self.pool:
                 raise Exception("База данных не подключена")
 
-            async with self.pool.acquire() as connection:
+            async with self.acquire() as connection:
                 query = """
                     INSERT INTO referrals (referrer_id, referred_id, level, is_active)
                     VALUES ($1, $2, $3, TRUE)
@@ -1058,4 +709,87 @@ class Database:
                 """
                 await connection.execute(query, referrer_id, referred_id, level)
 
+    async def increment_counters(self, table: str, user_id: str, counters: dict):
+        """
+        Атомарно увеличивает счетчики статистики пользователя за один запрос
+        (UPDATE ... SET x = x + n) без предварительного чтения текущих значений
+        """
+        allowed = COUNTER_COLUMNS.get(table)
+        if not allowed or not counters or any(column not in allowed for column in counters):
+            raise ValueError(f"Недопустимые счетчики для таблицы {table}: {counters}")
+
+        if self.use_api_client:
+            # Статистикой управляет Node.js сервер
+            return
+        elif self.use_db_api:
+            if not await self.db_api_client.increment(table, user_id, counters):
+                raise Exception(f"DB API не увеличил счетчики {table} пользователя {user_id}")
+        elif self.use_supabase:
+            if not await self.supabase_client.increment_counters(table, user_id, counters):
+                raise Exception(f"Supabase не увеличил счетчики {table} пользователя {user_id}")
+        else:
+            if not self.pool:
+                raise Exception("База данных не подключена")
+
+            columns = list(counters)
+            assignments = [f"{column} = COALESCE({column}, 0) + ${i}" for i, column in enumerate(columns, start=2)]
+            if table == 'user_stats' and 'total_logins' in counters:
+                assignments.append("last_login_at = NOW()")
+            assignments.append("updated_at = NOW()")
+
+            async with self.acquire() as connection:
+                query = f"UPDATE {table} SET {', '.join(assignments)} WHERE user_id = $1"
+                await connection.execute(query, user_id, *[int(counters[column]) for column in columns])
+
+    async def update_user_login_stats(self, user_id: str):
+        """
+        Обновляет статистику входа пользователя.
+        После connect() событие попадает в write-behind буфер и записывается пакетно.
+        """
+        if self.login_stats.running:
+            self.login_stats.record(user_id)
+        else:
+            await self.increment_counters('user_stats', user_id, {'total_logins': 1})
+
+    async def _flush_login_stats(self, batch: dict):
+        """
+        Записывает накопленные входы пакетом: {user_id: количество входов}.
+        Возвращает незаписанную часть пакета (буфер вернет ее в очередь) или бросает исключение,
+        если не записано ничего.
+        """
+        if self.use_api_client:
+            # Статистикой управляет Node.js сервер
+            return None
+        elif self.use_db_api or self.use_supabase:
+            # Пакетного RPC нет - отправляем по одному атомарному инкременту на пользователя;
+            # записанные инкременты не повторяем, иначе входы посчитаются дважды
+            results = await asyncio.gather(*[
+                self.increment_counters('user_stats', user_id, {'total_logins': count})
+                for user_id, count in batch.items()
+            ], return_exceptions=True)
+            failed = {
+                user_id: count
+                for (user_id, count), result in zip(batch.items(), results)
+                if isinstance(result, BaseException)
+            }
+            if failed and len(failed) == len(batch):
+                raise next(result for result in results if isinstance(result, BaseException))
+            return failed
+        else:
+            if not self.pool:
+                raise Exception("База данных не подключена")
+
+            user_ids = list(batch)
+            async with self.acquire() as connection:
+                # Один UPDATE на весь пакет; last_login_at фиксируется с точностью до интервала сброса
+                query = """
+                    UPDATE user_stats AS s
+                    SET total_logins = COALESCE(s.total_logins, 0) + v.delta,
+                        last_login_at = NOW(),
+                        updated_at = NOW()
+                    FROM unnest($1::uuid[], $2::int[]) AS v(user_id, delta)
+                    WHERE s.user_id = v.user_id
+                """
+                await connection.execute(query, user_ids, [batch[user_id] for user_id in user_ids])
+
 database = Database()
\ No newline at end of file
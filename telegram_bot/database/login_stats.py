@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoginStatsBuffer:
+    """
+    Write-behind буфер статистики входов.
+    События входа копятся в памяти с объединением по пользователю и сбрасываются
+    в БД пакетно: по таймеру, при переполнении буфера и при остановке.
+
+    flush_callback записывает пакет; если он бросает исключение, пакет возвращается в буфер
+    целиком, если возвращает словарь - в буфер возвращается только эта (незаписанная) часть.
+    """
+
+    def __init__(self, flush_callback: Callable[[Dict[str, int]], Awaitable[Optional[Dict[str, int]]]],
+                 flush_interval: float, max_pending: int):
+        self._flush_callback = flush_callback
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+        # Статистика работы буфера
+        self.events_total = 0
+        self.flushes_total = 0
+        self.rows_flushed = 0
+        self.flush_errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def record(self, user_id: str, count: int = 1):
+        """Регистрирует событие входа пользователя (без обращения к БД)"""
+        self._pending[user_id] = self._pending.get(user_id, 0) + count
+        self.events_total += count
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def start(self):
+        """Запускает фоновый сброс буфера"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает фоновый сброс и записывает оставшиеся события"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Сбрасывает накопленные события одним пакетом"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, {}
+            try:
+                failed = await self._flush_callback(batch)
+            except asyncio.CancelledError:
+                self._restore(batch)
+                raise
+            except Exception as e:
+                # Возвращаем события в буфер, чтобы записать их при следующем сбросе
+                self.flush_errors += 1
+                logger.error(f"Error flushing login stats ({len(batch)} users): {e}")
+                self._restore(batch)
+                return
+
+            if failed:
+                self.flush_errors += 1
+                logger.error(f"Login stats not written for {len(failed)} of {len(batch)} users, will retry")
+                self._restore(failed)
+            self.flushes_total += 1
+            self.rows_flushed += len(batch) - len(failed or ())
+
+    def _restore(self, batch: Dict[str, int]):
+        for user_id, count in batch.items():
+            self._pending[user_id] = self._pending.get(user_id, 0) + count
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': self.pending,
+            'events_total': self.events_total,
+            'flushes_total': self.flushes_total,
+            'rows_flushed': self.rows_flushed,
+            'flush_errors': self.flush_errors
+        }
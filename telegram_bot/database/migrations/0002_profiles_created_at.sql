@@ -0,0 +1,3 @@
+-- migrate:no-transaction
+-- Периодическое обновление индекса реферальных кодов выбирает новые профили по created_at
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_created_at ON profiles(created_at);
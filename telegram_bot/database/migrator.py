@@ -0,0 +1,156 @@
+"""
+Миграции схемы БД для прямого подключения (asyncpg).
+
+- 0001 - базовая схема (schema.sync_schema), дальнейшие - SQL-файлы migrations/NNNN_name.sql;
+- примененные версии записываются в schema_migrations, поэтому при запуске бота
+  выполняется один запрос версии, а каждая миграция применяется один раз;
+- миграция выполняется в транзакции вместе с записью версии; файл с первой строкой
+  "-- migrate:no-transaction" выполняется по одной команде вне транзакции
+  (нужно для CREATE INDEX CONCURRENTLY, который не блокирует запись в таблицу);
+- несколько процессов не применяют миграции одновременно (advisory-блокировка).
+
+Запуск вручную: python -m telegram_bot.database.migrator
+"""
+
+import asyncio
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+
+import asyncpg
+
+from .schema import sync_schema
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+
+# Ключ advisory-блокировки миграций (произвольная константа)
+MIGRATION_LOCK_ID = 720_190_001
+
+SCHEMA_MIGRATIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT NOW()
+    )
+"""
+
+_FILENAME_RE = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    sql: Optional[str] = None
+    # Миграция, которую нельзя записать статическим SQL (например, базовая схема)
+    apply: Optional[Callable[[asyncpg.Connection], Awaitable]] = None
+    transactional: bool = True
+
+    @property
+    def title(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+
+def split_statements(sql: str) -> List[str]:
+    """
+    Делит SQL миграции вне транзакции на команды.
+    Такие миграции состоят из простых команд (без тел функций и строк с ';').
+    """
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in "\n".join(lines).split(';') if statement.strip()]
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    migrations = [Migration(1, "baseline", apply=sync_schema)]
+    for path in sorted(directory.glob("*.sql")):
+        match = _FILENAME_RE.match(path.name)
+        if not match:
+            raise ValueError(f"Некорректное имя файла миграции: {path.name}")
+        sql = path.read_text(encoding="utf-8")
+        migrations.append(Migration(
+            version=int(match.group(1)),
+            name=match.group(2),
+            sql=sql,
+            transactional=not sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+        ))
+    return migrations
+
+
+class MigrationRunner:
+    def __init__(self, migrations: List[Migration]):
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        versions = [m.version for m in self.migrations]
+        if len(versions) != len(set(versions)):
+            raise ValueError(f"Повторяющиеся версии миграций: {versions}")
+
+    @property
+    def latest_version(self) -> int:
+        return self.migrations[-1].version if self.migrations else 0
+
+    async def current_version(self, connection) -> int:
+        try:
+            return await connection.fetchval("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        except asyncpg.UndefinedTableError:
+            return 0
+
+    async def migrate(self, pool) -> List[int]:
+        """Применяет недостающие миграции; возвращает список примененных версий"""
+        async with pool.acquire() as connection:
+            # Обычный запуск: схема актуальна, достаточно одного запроса
+            if await self.current_version(connection) >= self.latest_version:
+                return []
+
+            await connection.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+            try:
+                await connection.execute(SCHEMA_MIGRATIONS_DDL)
+                # Перечитываем под блокировкой: миграции мог применить другой процесс
+                applied = {row['version'] for row in await connection.fetch("SELECT version FROM schema_migrations")}
+                done = []
+                for migration in self.migrations:
+                    if migration.version in applied:
+                        continue
+                    print(f"Применяем миграцию {migration.title}...")
+                    await self._apply(connection, migration)
+                    done.append(migration.version)
+                return done
+            finally:
+                await connection.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+    async def _apply(self, connection, migration: Migration):
+        if migration.transactional:
+            async with connection.transaction():
+                if migration.apply is not None:
+                    await migration.apply(connection)
+                else:
+                    await connection.execute(migration.sql)
+                await self._record(connection, migration)
+            return
+
+        # Вне транзакции команды выполняются по одной: многокомандный запрос PostgreSQL
+        # тоже выполняет в неявной транзакции. Прерванный CREATE INDEX CONCURRENTLY оставляет
+        # невалидный индекс, его нужно удалить (DROP INDEX) перед повторным запуском.
+        for statement in split_statements(migration.sql):
+            await connection.execute(statement)
+        await self._record(connection, migration)
+
+    async def _record(self, connection, migration: Migration):
+        await connection.execute(
+            "INSERT INTO schema_migrations (version, name) VALUES ($1, $2)",
+            migration.version, migration.name
+        )
+
+
+migration_runner = MigrationRunner(load_migrations())
+
+
+async def main():
+    from telegram_bot.database import database
+    # Миграции применяются при подключении, до проверки обязательных индексов
+    await database.connect(migrate=True)
+    await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
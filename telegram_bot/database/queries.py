@@ -0,0 +1,149 @@
+"""
+Реестр запросов горячего пути для прямого подключения (asyncpg).
+Запросы подготавливаются на каждом соединении пула при его создании (init пула),
+поэтому при выполнении не тратится время на разбор и планирование.
+По каждому запросу собирается гистограмма длительности.
+"""
+import time
+from typing import Any, Dict
+
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+
+from ..utils.histogram import Histogram
+
+PROFILE_BY_TELEGRAM_ID = 'profile_by_telegram_id'
+PROFILE_BY_REFERRAL_CODE = 'profile_by_referral_code'
+INSERT_PROFILE = 'insert_profile'
+LINK_REFERRAL = 'link_referral'
+REFERRAL_STATS = 'referral_stats'
+
+QUERIES: Dict[str, str] = {
+    PROFILE_BY_TELEGRAM_ID: """
+        SELECT id, telegram_id, telegram_username, first_name, last_name,
+               avatar_url, referral_code, referred_by, created_at
+        FROM profiles
+        WHERE telegram_id = $1
+    """,
+    PROFILE_BY_REFERRAL_CODE: """
+        SELECT id, telegram_id, telegram_username, first_name, last_name,
+               avatar_url, referral_code, referred_by, created_at
+        FROM profiles
+        WHERE referral_code = $1
+    """,
+    INSERT_PROFILE: """
+        INSERT INTO profiles (
+            telegram_id, telegram_username, first_name, last_name,
+            avatar_url, referral_code, referred_by
+        ) VALUES ($1, $2, $3, $4, $5, $6, $7)
+        RETURNING id, telegram_id, referral_code, created_at
+    """,
+    # Связи нового пользователя со всеми предками (до 5 уровней) и их счетчики - одним запросом.
+    # Подъем по цепочке referred_by - не более 5 чтений по первичному ключу.
+    LINK_REFERRAL: """
+        WITH RECURSIVE ancestors AS (
+            SELECT id, referred_by, 1 AS level FROM profiles WHERE id = $1
+            UNION ALL
+            SELECT p.id, p.referred_by, a.level + 1
+            FROM profiles p
+            JOIN ancestors a ON p.id = a.referred_by
+            WHERE a.level < 5
+        ),
+        edges AS (
+            INSERT INTO referrals (referrer_id, referred_id, level, is_active)
+            SELECT id, $2, level, TRUE FROM ancestors
+            ON CONFLICT (referrer_id, referred_id)
+            DO UPDATE SET level = EXCLUDED.level, is_active = TRUE
+        )
+        INSERT INTO referral_stats (user_id, total_referrals, level_1_count, level_2_count,
+                                    level_3_count, level_4_count, level_5_count)
+        SELECT id, 1, (level = 1)::int, (level = 2)::int, (level = 3)::int,
+               (level = 4)::int, (level = 5)::int
+        FROM ancestors
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_referrals = COALESCE(referral_stats.total_referrals, 0) + 1,
+            level_1_count = COALESCE(referral_stats.level_1_count, 0) + EXCLUDED.level_1_count,
+            level_2_count = COALESCE(referral_stats.level_2_count, 0) + EXCLUDED.level_2_count,
+            level_3_count = COALESCE(referral_stats.level_3_count, 0) + EXCLUDED.level_3_count,
+            level_4_count = COALESCE(referral_stats.level_4_count, 0) + EXCLUDED.level_4_count,
+            level_5_count = COALESCE(referral_stats.level_5_count, 0) + EXCLUDED.level_5_count,
+            updated_at = NOW()
+    """,
+    REFERRAL_STATS: """
+        SELECT level_1_count, level_2_count, level_3_count,
+               level_4_count, level_5_count, total_referrals
+        FROM referral_stats
+        WHERE user_id = $1
+    """,
+}
+
+
+class QueryConnection(asyncpg.Connection):
+    """Соединение пула, хранящее подготовленные запросы реестра (имя -> PreparedStatement)"""
+
+    __slots__ = ('prepared_statements',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements: Dict[str, PreparedStatement] = {}
+
+
+class QueryRegistry:
+    def __init__(self, queries: Dict[str, str]):
+        self.queries = queries
+        self.histograms = {name: Histogram() for name in queries}
+        self.errors = {name: 0 for name in queries}
+        self.prepare_errors = 0
+
+    async def prepare(self, connection):
+        """init пула: подготавливает все запросы на новом соединении"""
+        failed = []
+        for name in self.queries:
+            try:
+                await self._prepare(connection, name)
+            except asyncpg.PostgresError:
+                # Например, таблиц еще нет до первой миграции - запрос подготовится при первом вызове
+                self.prepare_errors += 1
+                failed.append(name)
+        if failed:
+            print(f"Запросы будут подготовлены при первом вызове: {', '.join(failed)}")
+
+    async def _prepare(self, connection, name: str):
+        statement = await connection.prepare(self.queries[name])
+        connection.prepared_statements[name] = statement
+        return statement
+
+    async def fetchrow(self, connection, name: str, *args):
+        return await self._run(connection, name, 'fetchrow', args)
+
+    async def fetch(self, connection, name: str, *args):
+        return await self._run(connection, name, 'fetch', args)
+
+    async def _run(self, connection, name: str, method: str, args: tuple) -> Any:
+        started = time.perf_counter()
+        try:
+            statement = connection.prepared_statements.get(name) or await self._prepare(connection, name)
+            try:
+                return await getattr(statement, method)(*args)
+            except (asyncpg.InvalidCachedStatementError, asyncpg.FeatureNotSupportedError):
+                # План устарел после изменения схемы: подготавливаем заново; внутри транзакции
+                # повтор невозможен (она уже прервана) - ошибка уходит вызывающему
+                connection.prepared_statements.pop(name, None)
+                if connection.is_in_transaction():
+                    raise
+                statement = await self._prepare(connection, name)
+                return await getattr(statement, method)(*args)
+        except Exception:
+            self.errors[name] += 1
+            raise
+        finally:
+            self.histograms[name].observe(time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {**histogram.stats(), 'errors': self.errors[name]}
+            for name, histogram in self.histograms.items()
+        }
+
+
+query_registry = QueryRegistry(QUERIES)
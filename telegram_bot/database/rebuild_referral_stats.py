@@ -0,0 +1,32 @@
+"""
+Заполнение реферальных связей всех уровней (referrals) и пересчет счетчиков referral_stats
+по дереву рефералов (profiles.referred_by).
+
+Запуск: python -m telegram_bot.database.rebuild_referral_stats
+
+Нужен один раз после обновления для заполнения уровней 2-5 у существующих пользователей,
+а также после регистраций в обход бота, которые записывают только первый уровень.
+"""
+
+import asyncio
+import sys
+
+from telegram_bot.database import database
+
+
+async def main():
+    if not database.supports_bulk_operations:
+        sys.exit("Пересчет недоступен в режиме API клиента (USE_API_CLIENT): "
+                 "запустите с прямым подключением к БД, USE_SUPABASE или USE_DB_API")
+    await database.connect()
+    try:
+        result = await database.backfill_referral_edges()
+        print(f"Реферальные связи заполнены: {result or 'OK'}")
+        result = await database.rebuild_referral_stats()
+        print(f"Статистика рефералов пересчитана: {result or 'OK'}")
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
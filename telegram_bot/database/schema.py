@@ -0,0 +1,341 @@
+"""
+Базовая схема БД для прямого подключения (asyncpg) - миграция 0001.
+sync_schema сравнивает описание с каталогом одним запросом и применяет недостающие
+таблицы, столбцы и индексы одной транзакцией, поэтому базовая миграция подходит и для
+пустой БД, и для БД, созданной прежними версиями бота.
+Дальнейшие изменения схемы оформляются SQL-миграциями в каталоге migrations/.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+@dataclass
+class Index:
+    name: str
+    # Определение после имени индекса: "ON table(columns)"
+    definition: str
+    unique: bool = False
+    # Слияние дубликатов перед созданием уникального индекса на существующей таблице
+    dedupe: Optional[str] = None
+
+    def create_sql(self) -> str:
+        unique = "UNIQUE " if self.unique else ""
+        return f"CREATE {unique}INDEX IF NOT EXISTS {self.name} {self.definition}"
+
+
+@dataclass
+class Table:
+    name: str
+    # Столбец -> определение; порядок совпадает с порядком в CREATE TABLE
+    columns: Dict[str, str]
+    constraints: Tuple[str, ...] = ()
+    indexes: List[Index] = field(default_factory=list)
+
+    def create_sql(self) -> str:
+        lines = [f"{name} {definition}" for name, definition in self.columns.items()]
+        lines.extend(self.constraints)
+        body = ",\n    ".join(lines)
+        return f"CREATE TABLE {self.name} (\n    {body}\n)"
+
+    def add_column_sql(self, column: str) -> str:
+        # PostgreSQL принимает ограничения столбца (PRIMARY KEY, REFERENCES) прямо в ADD COLUMN
+        return f"ALTER TABLE {self.name} ADD COLUMN {column} {self.columns[column]}"
+
+
+# Дубликаты referral_stats сливаются в одну строку: начисления (total_earnings) суммируются,
+# счетчики берутся наибольшие (они только растут, точные значения восстанавливает
+# python -m telegram_bot.database.rebuild_referral_stats)
+REFERRAL_STATS_MERGE_DUPLICATES = """
+    WITH duplicates AS (
+        SELECT user_id,
+               (array_agg(id ORDER BY COALESCE(total_referrals, 0) DESC,
+                                      updated_at DESC NULLS LAST))[1] AS keep_id,
+               SUM(COALESCE(total_earnings, 0)) AS total_earnings,
+               MAX(total_referrals) AS total_referrals,
+               MAX(level_1_count) AS level_1_count,
+               MAX(level_2_count) AS level_2_count,
+               MAX(level_3_count) AS level_3_count,
+               MAX(level_4_count) AS level_4_count,
+               MAX(level_5_count) AS level_5_count
+        FROM referral_stats
+        GROUP BY user_id
+        HAVING COUNT(*) > 1
+    ),
+    merged AS (
+        UPDATE referral_stats s SET
+            total_earnings = d.total_earnings,
+            total_referrals = d.total_referrals,
+            level_1_count = d.level_1_count,
+            level_2_count = d.level_2_count,
+            level_3_count = d.level_3_count,
+            level_4_count = d.level_4_count,
+            level_5_count = d.level_5_count,
+            updated_at = NOW()
+        FROM duplicates d
+        WHERE s.id = d.keep_id
+    )
+    DELETE FROM referral_stats s
+    USING duplicates d
+    WHERE s.user_id = d.user_id AND s.id <> d.keep_id
+"""
+
+
+# Таблицы в порядке создания (ссылки только на уже созданные таблицы)
+TABLES: List[Table] = [
+    # Таблица пользователей
+    Table(
+        name='profiles',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'telegram_id': 'BIGINT UNIQUE NOT NULL',
+            'telegram_username': 'VARCHAR(255)',
+            'first_name': 'VARCHAR(255) NOT NULL',
+            'last_name': 'VARCHAR(255)',
+            'avatar_url': 'TEXT',
+            'referral_code': 'VARCHAR(50) UNIQUE',
+            'referred_by': 'UUID REFERENCES profiles(id)',
+            'created_at': 'TIMESTAMP DEFAULT NOW()',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[
+            Index('idx_profiles_telegram_id', 'ON profiles(telegram_id)'),
+            Index('idx_profiles_referral_code', 'ON profiles(referral_code)')
+        ]
+    ),
+    # Таблица рефералов: связи пользователя со всеми пригласившими до 5 уровня
+    Table(
+        name='referrals',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'referrer_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'referred_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'level': 'INTEGER DEFAULT 1',
+            'is_active': 'BOOLEAN DEFAULT TRUE',
+            'created_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        # Один пользователь не может быть рефералом одного и того же пригласившего несколько раз
+        constraints=('CONSTRAINT unique_referral_per_referrer UNIQUE (referrer_id, referred_id)',),
+        indexes=[
+            Index('idx_referrals_referrer', 'ON referrals(referrer_id)'),
+            Index('idx_referrals_referred', 'ON referrals(referred_id)'),
+            Index('idx_referrals_referrer_level', 'ON referrals(referrer_id, level)')
+        ]
+    ),
+    # Таблица балансов пользователей
+    Table(
+        name='balances',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'internal_balance': 'DECIMAL(10, 2) DEFAULT 0.00',
+            'external_balance': 'DECIMAL(10, 2) DEFAULT 0.00',
+            'total_earned': 'DECIMAL(10, 2) DEFAULT 0.00',
+            'total_withdrawn': 'DECIMAL(10, 2) DEFAULT 0.00',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[Index('idx_balances_user_id', 'ON balances(user_id)')]
+    ),
+    # Таблица статистики пользователей
+    Table(
+        name='user_stats',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'total_logins': 'INTEGER DEFAULT 0',
+            'last_login_at': 'TIMESTAMP',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[Index('idx_user_stats_user_id', 'ON user_stats(user_id)')]
+    ),
+    # Таблица статистики по рефералам
+    Table(
+        name='referral_stats',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'total_referrals': 'INTEGER DEFAULT 0',
+            'total_earnings': 'DECIMAL(10, 2) DEFAULT 0.00',
+            'level_1_count': 'INTEGER DEFAULT 0',
+            'level_2_count': 'INTEGER DEFAULT 0',
+            'level_3_count': 'INTEGER DEFAULT 0',
+            'level_4_count': 'INTEGER DEFAULT 0',
+            'level_5_count': 'INTEGER DEFAULT 0',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[
+            Index('idx_referral_stats_user_id', 'ON referral_stats(user_id)'),
+            # Счетчики рефералов обновляются через ON CONFLICT (user_id)
+            Index('uq_referral_stats_user_id', 'ON referral_stats(user_id)', unique=True,
+                  dedupe=REFERRAL_STATS_MERGE_DUPLICATES)
+        ]
+    ),
+    # Таблица подписок
+    Table(
+        name='subscriptions',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'plan_name': 'VARCHAR(100) NOT NULL',
+            'plan_type': 'VARCHAR(50) NOT NULL',
+            'status': "VARCHAR(20) DEFAULT 'inactive'",
+            'expires_at': 'TIMESTAMP',
+            'created_at': 'TIMESTAMP DEFAULT NOW()',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[
+            Index('idx_subscriptions_user_id_status', 'ON subscriptions(user_id, status)'),
+            Index('idx_subscriptions_expires_at', 'ON subscriptions(expires_at)')
+        ]
+    ),
+    # Таблица ключей VPN
+    Table(
+        name='vpn_keys',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'status': "VARCHAR(20) DEFAULT 'inactive'",
+            'expires_at': 'TIMESTAMP',
+            'server_location': 'VARCHAR(100)',
+            'created_at': 'TIMESTAMP DEFAULT NOW()',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[Index('idx_vpn_keys_user_id', 'ON vpn_keys(user_id)')]
+    ),
+    # Таблица телеграм каналов
+    Table(
+        name='channels',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'channel_title': 'VARCHAR(255) NOT NULL',
+            'channel_username': 'VARCHAR(255)',
+            'subscribers_count': 'INTEGER',
+            'is_verified': 'BOOLEAN DEFAULT FALSE',
+            'created_at': 'TIMESTAMP DEFAULT NOW()',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[Index('idx_channels_user_id', 'ON channels(user_id)')]
+    ),
+    # Таблица ботов пользователя
+    Table(
+        name='bots',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'bot_name': 'VARCHAR(255) NOT NULL',
+            'bot_username': 'VARCHAR(255)',
+            'bot_type': "VARCHAR(50) DEFAULT 'unknown'",
+            'is_active': 'BOOLEAN DEFAULT FALSE',
+            'created_at': 'TIMESTAMP DEFAULT NOW()',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[Index('idx_bots_user_id', 'ON bots(user_id)')]
+    ),
+    # Таблица ролей пользователей
+    Table(
+        name='user_roles',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'role': "VARCHAR(50) DEFAULT 'user'",
+            'created_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[Index('idx_roles_user_id', 'ON user_roles(user_id)')]
+    ),
+    # Таблица заявок в поддержку
+    Table(
+        name='support_tickets',
+        columns={
+            'id': 'UUID PRIMARY KEY DEFAULT gen_random_uuid()',
+            'user_id': 'UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE',
+            'category': 'VARCHAR(100) NOT NULL',
+            'subject': 'VARCHAR(255)',
+            'message': 'TEXT NOT NULL',
+            'status': "VARCHAR(20) DEFAULT 'open'",
+            'created_at': 'TIMESTAMP DEFAULT NOW()',
+            'updated_at': 'TIMESTAMP DEFAULT NOW()'
+        },
+        indexes=[Index('idx_tickets_user_id', 'ON support_tickets(user_id)')]
+    ),
+]
+
+# Все столбцы и индексы описанных таблиц одним запросом к каталогу
+CATALOG_QUERY = """
+    SELECT c.relname::text AS table_name, a.attname::text AS column_name, NULL::text AS index_name
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND c.relname = ANY($1::text[])
+    UNION ALL
+    SELECT tablename::text, NULL, indexname::text
+    FROM pg_indexes
+    WHERE schemaname = 'public' AND tablename = ANY($1::text[])
+"""
+
+
+@dataclass
+class SchemaPlan:
+    """Недостающие объекты схемы и DDL для их создания"""
+    statements: List[str] = field(default_factory=list)
+    # Уникальные индексы на существующих таблицах: создаются после слияния дубликатов
+    unique_indexes: List[Index] = field(default_factory=list)
+    changes: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.statements or self.unique_indexes)
+
+
+def plan_schema_changes(catalog_rows: Iterable, tables: List[Table] = TABLES) -> SchemaPlan:
+    """Сравнивает строки CATALOG_QUERY с описанием схемы и составляет список DDL"""
+    columns: Dict[str, Set[str]] = {}
+    indexes: Set[str] = set()
+    for row in catalog_rows:
+        if row['index_name'] is not None:
+            indexes.add(row['index_name'])
+        else:
+            columns.setdefault(row['table_name'], set()).add(row['column_name'])
+
+    plan = SchemaPlan()
+    for table in tables:
+        existing = columns.get(table.name)
+        if existing is None:
+            plan.changes.append(f"таблица {table.name}")
+            plan.statements.append(table.create_sql())
+            plan.statements.extend(index.create_sql() for index in table.indexes)
+            continue
+
+        for column in table.columns:
+            if column not in existing:
+                plan.changes.append(f"столбец {table.name}.{column}")
+                plan.statements.append(table.add_column_sql(column))
+        for index in table.indexes:
+            if index.name in indexes:
+                continue
+            plan.changes.append(f"индекс {index.name}")
+            if index.unique:
+                plan.unique_indexes.append(index)
+            else:
+                plan.statements.append(index.create_sql())
+    return plan
+
+
+async def sync_schema(connection, tables: List[Table] = TABLES) -> SchemaPlan:
+    """Создает недостающие объекты схемы; возвращает примененный план"""
+    rows = await connection.fetch(CATALOG_QUERY, [table.name for table in tables])
+    plan = plan_schema_changes(rows, tables)
+    if not plan:
+        return plan
+
+    print(f"Обновляем структуру базы данных: {', '.join(plan.changes)}")
+    async with connection.transaction():
+        if plan.statements:
+            # Без параметров asyncpg отправляет все команды одним запросом
+            await connection.execute(";\n".join(plan.statements))
+        for index in plan.unique_indexes:
+            # Запросы бота рассчитывают на уникальность (ON CONFLICT), поэтому индекс обязателен:
+            # если он все же не создается, миграция откатывается целиком и не записывается
+            if index.dedupe:
+                result = await connection.execute(index.dedupe)
+                print(f"Объединены дубликаты перед созданием индекса {index.name}: {result}")
+            await connection.execute(index.create_sql())
+    return plan
@@ -1,14 +1,34 @@
 import os
-import requests
+import aiohttp
 from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 
+from .config import API_POOL_LIMIT, API_POOL_LIMIT_PER_HOST, API_KEEPALIVE_TIMEOUT, API_DNS_CACHE_TTL
+from .services.http_session import PooledHttpSession
+from .utils.deadline import DeadlineExceeded, run_with_deadline
+
 load_dotenv()
 
+
+class DBAPIError(Exception):
+    """Ошибка, которую вернула Edge Function (HTTP статус и текст из поля error)"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"DB API {status}: {message}")
+        self.status = status
+        self.message = message
+
+    @property
+    def unknown_action(self) -> bool:
+        """Функция старой версии не знает запрошенное действие"""
+        return self.status == 400 and self.message.startswith("Unknown action")
+
+
 class DBAPIClient:
     def __init__(self):
         self.api_url = os.getenv("DB_API_URL", "https://jjaeybwuhnokrcprgait.supabase.co/functions/v1/db-api")
         self.api_key = os.getenv("DB_API_KEY")  # ваш_DB_API_KEY
+        self.timeout = int(os.getenv("DB_API_TIMEOUT", 30))
         
         if not self.api_key:
             raise ValueError("Необходимо указать DB_API_KEY в .env файле")
@@ -18,7 +38,41 @@ class DBAPIClient:
             "x-api-key": self.api_key
         }
 
-    def select(self, table: str, where: Dict[str, Any] = None) -> Optional[List[Dict[str, Any]]]:
+        # Общий пул keep-alive соединений к Edge Function
+        self.http = PooledHttpSession(
+            name="db-api",
+            limit=API_POOL_LIMIT,
+            limit_per_host=API_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+            dns_cache_ttl=API_DNS_CACHE_TTL,
+            timeout=self.timeout,
+            headers=self.headers
+        )
+
+    async def start(self):
+        """Открывает общую сессию с пулом соединений"""
+        await self.http.start()
+
+    async def close(self):
+        """Закрывает общую сессию"""
+        await self.http.close()
+
+    async def _post(self, payload: Dict[str, Any]) -> Any:
+        """Отправляет запрос к DB API и возвращает разобранный JSON (не дольше бюджета обновления)"""
+        return await run_with_deadline(self._request(payload))
+
+    async def _request(self, payload: Dict[str, Any]) -> Any:
+        async with self.http.request("POST", self.api_url, json=payload) as response:
+            if response.status >= 400:
+                try:
+                    body = await response.json(content_type=None)
+                    message = body.get('error') if isinstance(body, dict) else None
+                except ValueError:
+                    message = None
+                raise DBAPIError(response.status, message or response.reason or "")
+            return await response.json(content_type=None)
+
+    async def select(self, table: str, where: Dict[str, Any] = None) -> Optional[List[Dict[str, Any]]]:
         """Выполняет SELECT запрос к таблице"""
         try:
             payload = {
@@ -29,14 +83,14 @@ class DBAPIClient:
             if where:
                 payload["where"] = where
 
-            response = requests.post(self.api_url, json=payload, headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+            return await self._post(payload)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при выполнении SELECT запроса: {e}")
             return None
 
-    def insert(self, table: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def insert(self, table: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Выполняет INSERT запрос в таблицу"""
         try:
             payload = {
@@ -44,15 +98,15 @@ class DBAPIClient:
                 "table": table,
                 "data": data
             }
-            response = requests.post(self.api_url, json=payload, headers=self.headers)
-            response.raise_for_status()
-            result = response.json()
+            result = await self._post(payload)
             return result[0] if isinstance(result, list) and len(result) > 0 else result
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при выполнении INSERT запроса: {e}")
             return None
 
-    def update(self, table: str, data: Dict[str, Any], where: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def update(self, table: str, data: Dict[str, Any], where: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Выполняет UPDATE запрос в таблице"""
         try:
             payload = {
@@ -61,15 +115,15 @@ class DBAPIClient:
                 "data": data,
                 "where": where
             }
-            response = requests.post(self.api_url, json=payload, headers=self.headers)
-            response.raise_for_status()
-            result = response.json()
+            result = await self._post(payload)
             return result[0] if isinstance(result, list) and len(result) > 0 else result
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при выполнении UPDATE запроса: {e}")
             return None
 
-    def delete(self, table: str, where: Dict[str, Any]) -> bool:
+    async def delete(self, table: str, where: Dict[str, Any]) -> bool:
         """Выполняет DELETE запрос из таблицы"""
         try:
             payload = {
@@ -77,38 +131,155 @@ class DBAPIClient:
                 "table": table,
                 "where": where
             }
-            response = requests.post(self.api_url, json=payload, headers=self.headers)
-            response.raise_for_status()
+            await self._post(payload)
             return True
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при выполнении DELETE запроса: {e}")
             return False
 
-    def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+    async def increment(self, table: str, user_id: str, counters: Dict[str, int]) -> bool:
+        """Атомарно увеличивает счетчики статистики пользователя (RPC increment_counters)"""
+        try:
+            payload = {
+                "action": "increment",
+                "table": table,
+                "data": counters,
+                "where": {"user_id": user_id}
+            }
+            await self._post(payload)
+            return True
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Ошибка при увеличении счетчиков: {e}")
+            return False
+
+    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict[str, Any]]:
         """Получает пользователя по telegram_id"""
-        result = self.select("profiles", where={"telegram_id": telegram_id})
+        result = await self.select("profiles", where={"telegram_id": telegram_id})
         return result[0] if result and len(result) > 0 else None
 
-    def get_user_by_referral_code(self, referral_code: str) -> Optional[Dict[str, Any]]:
+    async def get_user_by_referral_code(self, referral_code: str) -> Optional[Dict[str, Any]]:
         """Получает пользователя по реферальному коду"""
-        result = self.select("profiles", where={"referral_code": referral_code.upper()})
+        result = await self.select("profiles", where={"referral_code": referral_code.upper()})
         return result[0] if result and len(result) > 0 else None
 
-    def create_user(self, user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Создает нового пользователя"""
-        result = self.insert("profiles", user_data)
+    async def list_referral_codes(self, since: Optional[str] = None, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Загружает реферальные коды постранично (для прогрева индекса кодов).
+        page_size не больше max_rows PostgREST (1000), иначе усеченная страница будет принята за последнюю.
+        Ошибки не перехватываются: неполный список кодов нельзя использовать для отклонения кодов.
+        """
+        rows = []
+        offset = 0
+        previous_page = None
+        while True:
+            payload = {
+                "action": "select",
+                "table": "profiles",
+                "columns": "referral_code, created_at",
+                "order": "created_at",
+                "offset": offset,
+                "limit": page_size
+            }
+            if since:
+                payload["gte"] = {"created_at": since}
+            page = await self._post(payload)
+            if not isinstance(page, list):
+                raise Exception(f"DB API вернул неожиданный ответ: {page}")
+            if page and page == previous_page:
+                # Edge Function старой версии игнорирует offset/limit и возвращает одни и те же строки
+                raise Exception("DB API не поддерживает постраничную выборку, обновите функцию db-api")
+            rows.extend(row for row in page if row.get('referral_code'))
+            if len(page) < page_size:
+                return rows
+            previous_page = page
+            offset += page_size
+
+    async def list_telegram_ids(self, after: int, limit: int) -> List[int]:
+        """Следующие limit значений telegram_id больше after по возрастанию (для рассылки)"""
+        page = await self._post({
+            "action": "select",
+            "table": "profiles",
+            "columns": "telegram_id",
+            "gte": {"telegram_id": after + 1},
+            "order": "telegram_id",
+            "limit": limit
+        })
+        if not isinstance(page, list):
+            raise Exception(f"DB API вернул неожиданный ответ: {page}")
+        ids = [row['telegram_id'] for row in page]
+        if len(ids) > limit or ids != sorted(ids) or (ids and ids[0] <= after):
+            # Edge Function старой версии игнорирует диапазон и возвращает все профили
+            raise Exception("DB API не поддерживает постраничную выборку, обновите функцию db-api")
+        return ids
+
+    async def backfill_referral_edges(self):
+        """Дописывает связи со всеми предками для существующих пользователей (RPC backfill_referral_edges)"""
+        await self._maintenance("backfill_referral_edges")
+
+    async def rebuild_referral_stats(self):
+        """Пересчитывает счетчики referral_stats всех пользователей (RPC rebuild_referral_stats)"""
+        await self._maintenance("rebuild_referral_stats")
+
+    async def _maintenance(self, action: str):
+        try:
+            await self._post({"action": action})
+        except DBAPIError as e:
+            if e.unknown_action:
+                raise Exception(f"DB API не поддерживает {action}, обновите функцию db-api") from e
+            raise
+
+    async def provision_user(self, user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Создает профиль, связанные записи и реферальную связь одним запросом.
+        На сервере выполняется в одной транзакции (функция provision_user в БД).
+        Ошибки не перехватываются: решение о резервном пути принимает create_user.
+        """
+        payload = {
+            "action": "provision_user",
+            "data": user_data
+        }
+        result = await self._post(payload)
+        return result[0] if isinstance(result, list) and len(result) > 0 else result
+
+    async def create_user(self, user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Создает нового пользователя.
+        К созданию отдельными запросами переходит только Edge Function старой версии без
+        provision_user: при любой другой ошибке (дубликат, 5xx, таймаут после фиксации)
+        повтор по частям создал бы дубликат или пользователя без связанных записей.
+        """
+        try:
+            return await self.provision_user(user_data)
+        except DeadlineExceeded:
+            raise
+        except DBAPIError as e:
+            if not e.unknown_action:
+                print(f"Ошибка при пакетном создании пользователя: {e}")
+                return None
+        except Exception as e:
+            print(f"Ошибка при пакетном создании пользователя: {e}")
+            return None
+
+        # Резервный путь для DB API без действия provision_user
+        result = await self.insert("profiles", user_data)
         if result:
             # Создаем связанные записи для нового пользователя
             user_id = result.get('id')
             if user_id:
-                self.create_related_records(user_id)
+                await self.create_related_records(user_id)
+                if user_data.get('referred_by'):
+                    await self.create_referral_record(user_data['referred_by'], user_id)
         return result
 
-    def create_related_records(self, user_id: str):
+    async def create_related_records(self, user_id: str):
         """Создает связанные записи для нового пользователя"""
         try:
             # Создаем запись баланса
-            self.insert("balances", {
+            await self.insert("balances", {
                 "user_id": user_id,
                 "internal_balance": 0,
                 "external_balance": 0,
@@ -117,37 +288,41 @@ class DBAPIClient:
             })
 
             # Создаем запись статистики пользователя
-            self.insert("user_stats", {
+            await self.insert("user_stats", {
                 "user_id": user_id,
                 "total_logins": 1,
                 "last_login_at": "now()"
             })
 
             # Создаем запись статистики по рефералам
-            self.insert("referral_stats", {
+            await self.insert("referral_stats", {
                 "user_id": user_id,
                 "total_referrals": 0,
                 "total_earnings": 0
             })
 
             # Создаем запись роли пользователя
-            self.insert("user_roles", {
+            await self.insert("user_roles", {
                 "user_id": user_id,
                 "role": "user"
             })
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при создании связанных записей: {e}")
 
-    def create_referral_record(self, referrer_id: str, referred_id: str, level: int = 1):
+    async def create_referral_record(self, referrer_id: str, referred_id: str, level: int = 1):
         """Создает запись о реферале"""
         try:
-            self.insert("referrals", {
+            await self.insert("referrals", {
                 "referrer_id": referrer_id,
                 "referred_id": referred_id,
                 "level": level,
                 "is_active": True
             })
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при создании реферальной записи: {e}")
 
-db_api_client = DBAPIClient()
\ No newline at end of file
+db_api_client = DBAPIClient()
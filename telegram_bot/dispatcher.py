@@ -1,18 +1,109 @@
-from aiogram import Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+import logging
+
+from aiogram import Bot, Dispatcher
 
 # Импортируем роутеры
 from telegram_bot.handlers.start_handler import start_router
 from telegram_bot.handlers.otp_handler import otp_router
 from telegram_bot.handlers.error_handler import error_router
+from telegram_bot.handlers.broadcast_handler import broadcast_router
+from telegram_bot.services.api_client import api_client
+from telegram_bot.services.send_queue import send_scheduler
+from telegram_bot.services.broadcast import broadcast_engine
+from telegram_bot.database import database
+from telegram_bot.storage import create_fsm_storage
+from telegram_bot.middlewares import (
+    RateLimit, ThrottlingMiddleware, UpdateScheduler, DeadlineMiddleware, HandlerMetricsMiddleware
+)
+from telegram_bot.metrics import registry as metrics_registry
+from telegram_bot.metrics.collectors import BotCollector
+from telegram_bot.config import (
+    ADMIN_IDS,
+    THROTTLE_DEFAULT_BURST,
+    THROTTLE_DEFAULT_PERIOD,
+    THROTTLE_START_BURST,
+    THROTTLE_START_PERIOD,
+    THROTTLE_OTP_BURST,
+    THROTTLE_OTP_PERIOD,
+    UPDATE_MAX_CONCURRENCY,
+    UPDATE_MAX_QUEUED_PER_USER,
+    UPDATE_DRAIN_TIMEOUT,
+    UPDATE_DEADLINE
+)
+
+logger = logging.getLogger(__name__)
 
-# Создаем хранилище состояний
-storage = MemoryStorage()
+# Создаем хранилище состояний (тип задается FSM_STORAGE в config)
+storage = create_fsm_storage()
 
 # Создаем диспетчер
 dp = Dispatcher(storage=storage)
 
+# Ограничиваем число одновременно обрабатываемых обновлений (с ожиданием на приеме)
+# и обрабатываем обновления одного пользователя по порядку
+update_scheduler = UpdateScheduler(dp, max_concurrency=UPDATE_MAX_CONCURRENCY,
+                                   max_queued=UPDATE_MAX_QUEUED_PER_USER)
+dp.update.outer_middleware(update_scheduler)
+
+# Ограничиваем частоту действий пользователя до фильтров и обработчиков:
+# /start регистрирует пользователя в backend, /send_otp отправляет письмо с паролем
+throttling = ThrottlingMiddleware(
+    default_limit=RateLimit(THROTTLE_DEFAULT_BURST, THROTTLE_DEFAULT_PERIOD),
+    limits={
+        'start': RateLimit(THROTTLE_START_BURST, THROTTLE_START_PERIOD),
+        'send_otp': RateLimit(THROTTLE_OTP_BURST, THROTTLE_OTP_PERIOD),
+        'link_account': RateLimit(THROTTLE_OTP_BURST, THROTTLE_OTP_PERIOD),
+    },
+    exempt_user_ids=ADMIN_IDS
+)
+dp.message.outer_middleware(throttling)
+dp.callback_query.outer_middleware(throttling)
+
+# Длительность и ошибки обработчиков (первым из inner-middleware - измеряет и остальные)
+handler_metrics = HandlerMetricsMiddleware()
+dp.message.middleware(handler_metrics)
+dp.callback_query.middleware(handler_metrics)
+
+# Общий бюджет времени на все запросы к backend и БД при обработке обновления
+deadline = DeadlineMiddleware(timeout=UPDATE_DEADLINE)
+dp.message.middleware(deadline)
+dp.callback_query.middleware(deadline)
+
+# Состояние компонентов снимается при запросе /metrics
+metrics_registry.add_collector(BotCollector(update_scheduler, throttling, deadline, storage))
+
 # Регистрируем роутеры
 dp.include_router(error_router)
+# Команды администратора - раньше start_router, чтобы не перехватывались его FSM-обработчиками
+dp.include_router(broadcast_router)
 dp.include_router(start_router)
-dp.include_router(otp_router)
\ No newline at end of file
+dp.include_router(otp_router)
+
+
+async def on_startup(bot: Bot):
+    """Открывает общие ресурсы процесса при запуске бота"""
+    await api_client.start()
+    try:
+        await database.connect()
+    except Exception as e:
+        # Обработчики работают через backend API, поэтому бот запускается и без прямого доступа к БД
+        logger.error(f"Database connection failed, continuing without it: {e}")
+    else:
+        # Продолжаем рассылку, прерванную перезапуском
+        broadcast_engine.resume(bot)
+
+
+async def on_shutdown():
+    """Освобождает общие ресурсы процесса при остановке бота"""
+    # Даем принятым обновлениям завершиться, пока соединения еще открыты
+    await update_scheduler.drain(UPDATE_DRAIN_TIMEOUT)
+    # Рассылка сохраняет контрольную точку и продолжится при следующем запуске
+    await broadcast_engine.stop()
+    # Database.disconnect() сбрасывает буфер статистики входов перед закрытием соединений
+    await database.disconnect()
+    await api_client.close()
+    await send_scheduler.stop()
+
+
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
@@ -0,0 +1,62 @@
+import logging
+from aiogram import Bot, F, Router, types
+from aiogram.filters import Command
+
+from telegram_bot.config import ADMIN_IDS
+from telegram_bot.services.broadcast import broadcast_engine
+
+logger = logging.getLogger(__name__)
+
+broadcast_router = Router(name="broadcast")
+# Команды рассылки доступны только администраторам
+broadcast_router.message.filter(F.from_user.id.in_(set(ADMIN_IDS)))
+
+
+@broadcast_router.message(Command("broadcast"))
+async def broadcast_command(message: types.Message, bot: Bot):
+    """
+    Обработчик команды /broadcast: рассылает всем пользователям сообщение, на которое ответил администратор
+    """
+    if not message.reply_to_message:
+        await message.answer("ℹ️ Ответьте командой /broadcast на сообщение, которое нужно разослать всем пользователям.")
+        return
+
+    if broadcast_engine.running:
+        await message.answer("⚠️ Рассылка уже выполняется. Статус: /broadcast_status, отмена: /broadcast_cancel")
+        return
+
+    try:
+        broadcast_engine.start(
+            bot,
+            admin_id=message.from_user.id,
+            from_chat_id=message.chat.id,
+            message_id=message.reply_to_message.message_id
+        )
+    except RuntimeError as e:
+        await message.answer(f"⚠️ {e}")
+        return
+    logger.info(f"Broadcast started by admin {message.from_user.id}")
+    await message.answer("📢 Рассылка запущена. Отчет придет по завершении. Статус: /broadcast_status")
+
+
+@broadcast_router.message(Command("broadcast_status"))
+async def broadcast_status_command(message: types.Message):
+    """
+    Обработчик команды /broadcast_status
+    """
+    job = broadcast_engine.job
+    if job is None:
+        await message.answer("ℹ️ Рассылок еще не было.")
+        return
+    await message.answer(job.summary())
+
+
+@broadcast_router.message(Command("broadcast_cancel"))
+async def broadcast_cancel_command(message: types.Message):
+    """
+    Обработчик команды /broadcast_cancel
+    """
+    if not await broadcast_engine.cancel():
+        await message.answer("ℹ️ Нет активной рассылки.")
+        return
+    await message.answer(broadcast_engine.job.summary())
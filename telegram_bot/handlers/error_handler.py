@@ -4,7 +4,7 @@ from aiogram.types import ErrorEvent
 
 logger = logging.getLogger(__name__)
 
-error_router = Router()
+error_router = Router(name="error")
 
 @error_router.error()
 async def global_error_handler(event: ErrorEvent):
@@ -1,11 +1,14 @@
 import logging
+import math
 from aiogram import Router, types
 from aiogram.filters import Command
 from telegram_bot.services.api_client import api_client
+from telegram_bot.services.circuit_breaker import CircuitOpenError
+from telegram_bot.templates.messages import MESSAGE_SERVICE_UNAVAILABLE
 
 logger = logging.getLogger(__name__)
 
-otp_router = Router()
+otp_router = Router(name="otp")
 
 @otp_router.message(Command("send_otp"))
 async def send_otp_command(message: types.Message):
@@ -15,8 +18,8 @@ async def send_otp_command(message: types.Message):
     user_id = message.from_user.id
     
     try:
-        # Получаем информацию о пользователе через API
-        user_info = await api_client.get_user(user_id)
+        # Email мог быть привязан на сайте после кэширования профиля - читаем из backend
+        user_info = await api_client.get_user(user_id, use_cache=False)
         
         if not user_info or not user_info.get('email'):
             await message.answer(
@@ -57,6 +60,8 @@ async def send_otp_command(message: types.Message):
                     logger.error(f"Error sending OTP: {response.status}, {error_text}")
                     await message.answer("❌ Ошибка при отправке одноразового пароля. Попробуйте позже.")
                     
+    except CircuitOpenError as e:
+        await message.answer(MESSAGE_SERVICE_UNAVAILABLE.format(retry_after=math.ceil(e.retry_after)))
     except Exception as e:
         logger.error(f"Error in send_otp command: {e}")
         await message.answer("❌ Произошла ошибка при отправке одноразового пароля. Попробуйте позже.")
@@ -70,8 +75,8 @@ async def link_account_command(message: types.Message):
     user_id = message.from_user.id
     
     try:
-        # Сначала проверяем, есть ли у пользователя email аккаунт
-        user_info = await api_client.get_user(user_id)
+        # Сначала проверяем, есть ли у пользователя email аккаунт (в backend, не в кэше)
+        user_info = await api_client.get_user(user_id, use_cache=False)
         
         if user_info and user_info.get('email'):
             await message.answer(
@@ -88,6 +93,8 @@ async def link_account_command(message: types.Message):
             "Альтернативно, вы можете использовать команду /send_otp для получения одноразового пароля для входа на сайт."
         )
         
+    except CircuitOpenError as e:
+        await message.answer(MESSAGE_SERVICE_UNAVAILABLE.format(retry_after=math.ceil(e.retry_after)))
     except Exception as e:
         logger.error(f"Error in link_account command: {e}")
         await message.answer("❌ Произошла ошибка. Попробуйте позже.")
\ No newline at end of file
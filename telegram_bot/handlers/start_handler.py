@@ -1,4 +1,5 @@
 import logging
+import math
 from typing import Dict, Any, Optional
 from aiogram import Router, types, F
 from aiogram.filters import CommandStart, Command
@@ -6,8 +7,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
 import re
 
-from telegram_bot.states import RegistrationStates
+from telegram_bot.states import RegistrationStates, RegistrationData
 from telegram_bot.services.api_client import api_client
+from telegram_bot.database import database
+from telegram_bot.services.circuit_breaker import CircuitOpenError
 from telegram_bot.keyboards.start_kb import (
     get_registration_keyboard,
     get_confirm_referral_keyboard,
@@ -20,14 +23,15 @@ from telegram_bot.templates.messages import (
     MESSAGE_REGISTRATION_SUCCESS,
     MESSAGE_INVALID_CODE,
     MESSAGE_ENTER_REFERRAL_CODE,
-    MESSAGE_WELCOME_BACK
+    MESSAGE_WELCOME_BACK,
+    MESSAGE_SERVICE_UNAVAILABLE
 )
 from telegram_bot.utils.validators import sanitize_referral_code
 from telegram_bot.config import ADMIN_IDS
 
 logger = logging.getLogger(__name__)
 
-start_router = Router()
+start_router = Router(name="start")
 
 @start_router.message(CommandStart())
 async def command_start_handler(message: Message, state: FSMContext):
@@ -55,9 +59,6 @@ async def command_start_handler(message: Message, state: FSMContext):
             await message.answer("❌ Ошибка регистрации. Попробуйте позже.")
             return
         
-        # Store result in state for later use
-        await state.update_data(registration_result=result, referral_code=referral_code)
-        
         # Check if user is existing
         is_existing = result.get('is_existing', False)
         profile = result.get('profile', {})
@@ -68,8 +69,13 @@ async def command_start_handler(message: Message, state: FSMContext):
             welcome_text = MESSAGE_WELCOME_BACK.format(first_name=profile.get('first_name', 'User'))
             await message.answer(welcome_text, reply_markup=get_main_menu_keyboard())
             await state.clear()
+            await record_login(profile.get('id'))
             return
         
+        # Store only the compact registration record in state
+        registration = RegistrationData.from_api_result(result, message.from_user.id, referral_code)
+        await state.set_data(registration.to_state())
+        
         # New user - handle referral flow
         if referrer_info:
             # Referral code was valid
@@ -89,27 +95,36 @@ async def command_start_handler(message: Message, state: FSMContext):
             await state.set_state(RegistrationStates.waiting_for_action)
             await message.answer(MESSAGE_NO_REFERRAL, reply_markup=get_registration_keyboard())
             
+    except CircuitOpenError as e:
+        # Backend недоступен - отвечаем сразу, не дожидаясь таймаута
+        await message.answer(MESSAGE_SERVICE_UNAVAILABLE.format(retry_after=math.ceil(e.retry_after)))
     except Exception as e:
         logger.error(f"Error in start handler: {e}")
         await message.answer("❌ Произошла ошибка. Попробуйте позже.")
 
+async def record_login(user_id: Optional[str]):
+    """Учитывает вход вернувшегося пользователя (пакетно, через буфер статистики входов)"""
+    if not user_id:
+        return
+    try:
+        await database.update_user_login_stats(user_id)
+    except Exception as e:
+        # Статистика входов не должна мешать ответу пользователю
+        logger.warning(f"Failed to record login for user {user_id}: {e}")
+
 @start_router.callback_query(F.data == "confirm:admin")
 async def confirm_admin_callback(callback: CallbackQuery, state: FSMContext):
     """
     Обработчик подтверждения регистрации как администратор
     """
     try:
-        data = await state.get_data()
-        result = data.get('registration_result')
+        registration = RegistrationData.from_state(await state.get_data())
         
-        if not result:
+        if not registration:
             await callback.answer("❌ Ошибка данных. Попробуйте снова.", show_alert=True)
             return
         
-        profile = result.get('profile', {})
-        first_name = profile.get('first_name', 'User')
-        
-        success_text = MESSAGE_REGISTRATION_SUCCESS.format(first_name=first_name)
+        success_text = MESSAGE_REGISTRATION_SUCCESS.format(first_name=registration.first_name)
         await callback.message.answer(success_text, reply_markup=get_main_menu_keyboard())
         await callback.answer("✅ Регистрация успешна!")
         await state.clear()
@@ -124,17 +139,13 @@ async def confirm_referral_callback(callback: CallbackQuery, state: FSMContext):
     Обработчик подтверждения регистрации с текущим реферером
     """
     try:
-        data = await state.get_data()
-        result = data.get('registration_result')
+        registration = RegistrationData.from_state(await state.get_data())
         
-        if not result:
+        if not registration:
             await callback.answer("❌ Ошибка данных. Попробуйте снова.", show_alert=True)
             return
         
-        profile = result.get('profile', {})
-        first_name = profile.get('first_name', 'User')
-        
-        success_text = MESSAGE_REGISTRATION_SUCCESS.format(first_name=first_name)
+        success_text = MESSAGE_REGISTRATION_SUCCESS.format(first_name=registration.first_name)
         await callback.message.answer(success_text, reply_markup=get_main_menu_keyboard())
         await callback.answer("✅ Регистрация успешна!")
         await state.clear()
@@ -162,8 +173,8 @@ async def back_to_start_callback(callback: CallbackQuery, state: FSMContext):
     Обработчик возврата к началу регистрации
     """
     try:
-        data = await state.get_data()
-        referral_code = data.get('referral_code')
+        registration = RegistrationData.from_state(await state.get_data())
+        referral_code = registration.referral_code if registration else None
         
         await state.set_state(RegistrationStates.waiting_for_action)
         
@@ -203,7 +214,8 @@ async def handle_referral_code_input(message: Message, state: FSMContext):
                 referrer_info = result.get('user', {})
                 referrer_name = referrer_info.get('first_name', 'Unknown')
                 
-                await state.update_data(registration_result=reg_result, referral_code=code)
+                registration = RegistrationData.from_api_result(reg_result, message.from_user.id, code)
+                await state.set_data(registration.to_state())
                 await state.set_state(RegistrationStates.waiting_for_action)
                 
                 text = MESSAGE_REFERRAL_FOUND.format(referrer_name=referrer_name)
@@ -218,6 +230,8 @@ async def handle_referral_code_input(message: Message, state: FSMContext):
                 reply_markup=get_registration_keyboard()
             )
             
+    except CircuitOpenError as e:
+        await message.answer(MESSAGE_SERVICE_UNAVAILABLE.format(retry_after=math.ceil(e.retry_after)))
     except Exception as e:
         logger.error(f"Error handling referral code input: {e}")
         await message.answer("❌ Ошибка обработки кода. Попробуйте позже.")
\ No newline at end of file
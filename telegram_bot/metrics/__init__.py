@@ -0,0 +1,5 @@
+from .registry import CONTENT_TYPE, Counter, Gauge, LatencyHistogram, MetricsRegistry, registry
+from .server import metrics_handler, start_metrics_server
+
+__all__ = ["CONTENT_TYPE", "Counter", "Gauge", "LatencyHistogram", "MetricsRegistry", "registry",
+           "metrics_handler", "start_metrics_server"]
@@ -0,0 +1,104 @@
+"""
+Коллектор состояния компонентов бота: значения снимаются из их stats() и атрибутов
+в момент запроса /metrics, поэтому на горячем пути ничего не добавляется.
+"""
+from typing import List, Optional
+
+from aiogram.fsm.storage.base import BaseStorage
+
+from ..database import database
+from ..database.queries import query_registry
+from ..middlewares import DeadlineMiddleware, ThrottlingMiddleware, UpdateScheduler
+from ..services.api_client import api_client
+from ..services.send_queue import send_scheduler
+from .registry import Counter, Gauge, LatencyHistogram, Metric
+
+
+class BotCollector:
+    def __init__(self, update_scheduler: UpdateScheduler, throttling: ThrottlingMiddleware,
+                 deadline: DeadlineMiddleware, storage: Optional[BaseStorage] = None):
+        self.update_scheduler = update_scheduler
+        self.throttling = throttling
+        self.deadline = deadline
+        self.storage = storage
+
+    async def __call__(self) -> List[Metric]:
+        metrics = self._updates() + self._backend() + self._database()
+        # size() есть у хранилищ memory и sqlite; для Redis пришлось бы сканировать ключи
+        size = getattr(self.storage, "size", None)
+        if size is not None:
+            fsm_size = Gauge("bot_fsm_storage_size", "Users with FSM state or data in storage")
+            fsm_size.labels().set(await size())
+            metrics.append(fsm_size)
+        return metrics
+
+    def _updates(self) -> List[Metric]:
+        scheduler = self.update_scheduler.stats()
+        updates = Counter("bot_updates_total", "Updates processed by outcome", ("outcome",))
+        updates.labels("processed").inc(scheduler['processed_total'])
+        updates.labels("failed").inc(scheduler['failed_total'])
+        updates.labels("dropped").inc(scheduler['dropped_total'])
+        in_flight = Gauge("bot_updates_in_flight", "Updates accepted and not yet finished (running or queued)")
+        in_flight.labels().set(scheduler['in_flight'])
+        queued = Gauge("bot_updates_queued", "Updates waiting behind an earlier update of the same user")
+        queued.labels().set(scheduler['queued'])
+        backpressure = Counter("bot_updates_backpressure_total", "Updates that waited for a free processing slot")
+        backpressure.labels().inc(scheduler['backpressure_total'])
+
+        throttled = Counter("bot_throttled_total", "Actions rejected by throttling", ("action",))
+        for action, count in self.throttling.stats()['throttled_by_action'].items():
+            throttled.labels(action).inc(count)
+
+        deadline_exceeded = Counter("bot_deadline_exceeded_total", "Updates that ran out of time budget", ("handler",))
+        for handler, count in self.deadline.stats()['exceeded_by_handler'].items():
+            deadline_exceeded.labels(handler).inc(count)
+
+        send = send_scheduler.stats()
+        send_queue = Gauge("bot_send_queue_depth", "Outgoing messages waiting for a send slot")
+        send_queue.labels().set(send['queue_depth'])
+        sent = Counter("bot_sent_messages_total", "Outgoing messages by outcome", ("outcome",))
+        sent.labels("sent").inc(send['sent_total'])
+        sent.labels("retry_after").inc(send['retry_after_total'])
+        sent.labels("failed").inc(send['failed_total'])
+
+        return [updates, in_flight, queued, backpressure, throttled, deadline_exceeded, send_queue, sent]
+
+    def _backend(self) -> List[Metric]:
+        circuit_open = Gauge("bot_api_circuit_open", "Backend circuit breaker is open (1) or not (0)", ("endpoint",))
+        rejected = Counter("bot_api_circuit_rejected_total", "Backend calls rejected by an open breaker", ("endpoint",))
+        for endpoint, breaker in api_client.breaker_stats().items():
+            circuit_open.labels(endpoint).set(breaker['state'] == "open")
+            rejected.labels(endpoint).inc(breaker['rejected_total'])
+        retries = Counter("bot_api_retries_total", "Backend call retries")
+        retries.labels().inc(api_client.retries_total)
+
+        calls = Counter("bot_singleflight_calls_total", "Reads sent to the data source", ("name",))
+        saved = Counter("bot_singleflight_saved_total", "Reads joined to an identical in-flight read", ("name",))
+        for flights in (api_client.flights, database.flights):
+            flight = flights.stats()
+            calls.labels(flight['name']).inc(flight['calls_total'])
+            saved.labels(flight['name']).inc(flight['saved_total'])
+
+        return [circuit_open, rejected, retries, calls, saved]
+
+    def _database(self) -> List[Metric]:
+        if database.pool is None:
+            return []
+        pool = database.pool
+        idle = pool.get_idle_size()
+        connections = Gauge("bot_db_pool_connections", "asyncpg pool connections by state", ("state",))
+        connections.labels("in_use").set(pool.get_size() - idle)
+        connections.labels("idle").set(idle)
+        max_size = Gauge("bot_db_pool_max_size", "asyncpg pool size limit")
+        max_size.labels().set(pool.get_max_size())
+        waiting = Gauge("bot_db_pool_waiting", "Callers waiting for a free asyncpg pool connection")
+        waiting.labels().set(database.pool_waiting)
+
+        # Гистограммы реестра подготовленных запросов публикуются как есть, без копирования
+        queries = LatencyHistogram("bot_db_query_duration_seconds", "Prepared hot-path query time", ("query",))
+        errors = Counter("bot_db_query_errors_total", "Prepared hot-path query errors", ("query",))
+        for name, histogram in query_registry.histograms.items():
+            queries.add((name,), histogram)
+            errors.labels(name).inc(query_registry.errors[name])
+
+        return [connections, max_size, waiting, queries, errors]
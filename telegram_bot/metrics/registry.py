@@ -0,0 +1,189 @@
+"""
+Метрики процесса в текстовом формате Prometheus.
+
+Значения меняются только в потоке event loop, поэтому счетчики и гистограммы -
+обычные числа без блокировок: наблюдение на горячем пути - поиск по словарю
+и несколько сложений. Состояние компонентов (пулы, очереди, хранилища)
+снимается коллекторами в момент запроса /metrics.
+"""
+import inspect
+import logging
+import math
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+from ..utils.histogram import Histogram
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class CounterValue:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class GaugeValue(CounterValue):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Metric:
+    """Семейство метрик с одним именем; значения по наборам меток создаются при первом обращении"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+
+    def labels(self, *values: Any):
+        """
+        Значение для набора меток. На горячем пути результат можно сохранить
+        и обращаться к нему напрямую, без поиска по словарю
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}: ожидаются метки {self.labelnames}, получено {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[str]:
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}"
+        ]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> CounterValue:
+        return CounterValue()
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self) -> GaugeValue:
+        return GaugeValue()
+
+
+class LatencyHistogram(Metric):
+    """Гистограмма длительностей в секундах; значения по меткам - utils.Histogram"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def _new_child(self) -> Histogram:
+        return Histogram(self.buckets)
+
+    def add(self, values: LabelValues, histogram: Histogram):
+        """Публикует уже существующую гистограмму (например, из реестра запросов)"""
+        self._children[values] = histogram
+
+    def _samples(self) -> Iterable[str]:
+        names = self.labelnames + ("le",)
+        for values, histogram in self._children.items():
+            for bound, count in histogram.cumulative():
+                yield f"{self.name}_bucket{_format_labels(names, values + (_format_value(bound),))} {count}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(histogram.sum)}"
+            yield f"{self.name}_count{labels} {histogram.count}"
+
+
+Collector = Callable[[], Union[Iterable[Metric], Awaitable[Iterable[Metric]]]]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS) -> LatencyHistogram:
+        return self._register(LatencyHistogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Collector):
+        """
+        Коллектор вызывается при каждом запросе /metrics и возвращает новые объекты
+        Metric (не регистрируя их) с текущим состоянием компонента
+        """
+        self._collectors.append(collector)
+
+    async def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                metrics = collector()
+                if inspect.isawaitable(metrics):
+                    metrics = await metrics
+                rendered = [line for metric in metrics for line in metric.render()]
+            except Exception as e:
+                # Ошибка одного коллектора не должна лишать остальных метрик
+                logger.error(f"Metrics collector {collector!r} failed: {e}")
+                continue
+            lines.extend(rendered)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
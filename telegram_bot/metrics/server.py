@@ -0,0 +1,29 @@
+import logging
+
+from aiohttp import web
+
+from .registry import CONTENT_TYPE, registry
+
+logger = logging.getLogger(__name__)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Метрики процесса в текстовом формате Prometheus"""
+    body = await registry.render()
+    return web.Response(body=body.encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def start_metrics_server(host: str, port: int, path: str = "/metrics") -> web.AppRunner:
+    """
+    Запускает отдельный HTTP сервер метрик (в режиме polling у бота нет своего сервера).
+    Возвращает runner - остановка через runner.cleanup()
+    """
+    app = web.Application()
+    app.router.add_get(path, metrics_handler)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"Metrics server listening on {host}:{port}{path}")
+    return runner
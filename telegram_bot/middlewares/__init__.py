@@ -1 +1,7 @@
-# Папка для middleware
\ No newline at end of file
+# Папка для middleware
+from .throttling import RateLimit, ThrottlingMiddleware
+from .update_scheduler import UpdateScheduler
+from .deadline import DeadlineMiddleware
+from .metrics import HandlerMetricsMiddleware
+
+__all__ = ["RateLimit", "ThrottlingMiddleware", "UpdateScheduler", "DeadlineMiddleware", "HandlerMetricsMiddleware"]
@@ -0,0 +1,53 @@
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from telegram_bot.utils.deadline import deadline_scope
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """
+    Бюджет времени на обработку обновления. Регистрируется как inner-middleware
+    (известен выбранный обработчик), действует для всех роутеров диспетчера.
+
+    ApiClient, Database и клиенты Supabase/DB API берут таймаут вызова из оставшегося
+    бюджета и прерывают вызов по его истечении, поэтому обработчик с несколькими
+    последовательными запросами к backend не ждет дольше timeout секунд в сумме.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+        # Статистика работы
+        self.exceeded_total = 0
+        self.exceeded_by_handler: Dict[str, int] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        with deadline_scope(self.timeout) as deadline:
+            try:
+                return await handler(event, data)
+            finally:
+                # Обработчики обычно перехватывают ошибки сами, поэтому смотрим на отметку,
+                # а не на исключение
+                if deadline.exceeded:
+                    handler_object = data.get("handler")
+                    name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+                    self.exceeded_total += 1
+                    self.exceeded_by_handler[name] = self.exceeded_by_handler.get(name, 0) + 1
+                    logger.warning(f"Deadline of {self.timeout}s exceeded in handler {name}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'timeout': self.timeout,
+            'exceeded_total': self.exceeded_total,
+            'exceeded_by_handler': dict(self.exceeded_by_handler)
+        }
@@ -0,0 +1,47 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from telegram_bot.metrics import registry
+
+HANDLER_DURATION = registry.histogram(
+    "bot_handler_duration_seconds",
+    "Handler execution time",
+    ("router", "handler")
+)
+HANDLER_ERRORS = registry.counter(
+    "bot_handler_errors_total",
+    "Handler calls that raised an exception",
+    ("router", "handler")
+)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Длительность и ошибки обработчиков по роутеру и имени обработчика.
+    Регистрируется как inner-middleware (известен выбранный обработчик) раньше остальных
+    inner-middleware, чтобы их время входило в измерение.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        router = data.get("event_router")
+        handler_object = data.get("handler")
+        labels = (
+            router.name if router is not None else "unknown",
+            handler_object.callback.__name__ if handler_object is not None else "unknown"
+        )
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(*labels).inc()
+            raise
+        finally:
+            HANDLER_DURATION.labels(*labels).observe(time.perf_counter() - started)
@@ -0,0 +1,144 @@
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from telegram_bot.templates.messages import MESSAGE_TOO_MANY_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Лимит token bucket: burst действий подряд, восполняются равномерно за period секунд"""
+    burst: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.burst / self.period
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты действий пользователя (token bucket на пару пользователь + команда).
+    Регистрируется как outer-middleware для сообщений и callback-запросов, поэтому
+    отклоненные события не доходят ни до фильтров, ни до обработчиков.
+
+    Корзина хранится только пока она не восполнилась полностью: полная корзина
+    эквивалентна отсутствию записи, поэтому такие записи периодически удаляются.
+    """
+
+    def __init__(self, default_limit: RateLimit, limits: Dict[str, RateLimit] = None,
+                 exempt_user_ids: Iterable[int] = (), sweep_interval: float = 60):
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self.exempt_user_ids = set(exempt_user_ids)
+        self.sweep_interval = sweep_interval
+        # (user_id, action) -> [tokens, updated_at, notified]
+        self._buckets: Dict[Tuple[int, str], list] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+
+        # Статистика работы
+        self.allowed_total = 0
+        self.throttled_total = 0
+        self.throttled_by_action: Dict[str, int] = {}
+
+    def get_action(self, event: TelegramObject) -> Optional[str]:
+        """
+        Ключ лимита: имя команды с отдельным лимитом, иначе "command", "message" или "callback".
+        Произвольные команды не получают своих корзин, поэтому число корзин на пользователя ограничено.
+        """
+        if isinstance(event, Message):
+            text = event.text or event.caption or ""
+            if text.startswith('/') and len(text) > 1:
+                # "/start@bot_name payload" -> "start"
+                command = text[1:].split(maxsplit=1)[0].split('@', 1)[0].lower()
+                return command if command in self.limits else "command"
+            return "message"
+        if isinstance(event, CallbackQuery):
+            return "callback"
+        return None
+
+    def get_limit(self, action: str) -> RateLimit:
+        return self.limits.get(action, self.default_limit)
+
+    def consume(self, user_id: int, action: str) -> float:
+        """Списывает токен; возвращает 0, если действие разрешено, иначе секунды до появления токена"""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        limit = self.get_limit(action)
+        key = (user_id, action)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [limit.burst - 1, now, False]
+            return 0
+
+        tokens = min(limit.burst, bucket[0] + (now - bucket[1]) * limit.rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            bucket[2] = False
+            return 0
+
+        bucket[0] = tokens
+        return (1 - tokens) / limit.rate
+
+    def _sweep(self, now: float):
+        """Удаляет корзины, которые уже восполнились полностью"""
+        expired = []
+        for key, bucket in self._buckets.items():
+            limit = self.get_limit(key[1])
+            if bucket[0] + (now - bucket[1]) * limit.rate >= limit.burst:
+                expired.append(key)
+        for key in expired:
+            del self._buckets[key]
+        self._next_sweep = now + self.sweep_interval
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        action = self.get_action(event)
+        if user is None or action is None or user.id in self.exempt_user_ids:
+            return await handler(event, data)
+
+        retry_after = self.consume(user.id, action)
+        if not retry_after:
+            self.allowed_total += 1
+            return await handler(event, data)
+
+        self.throttled_total += 1
+        self.throttled_by_action[action] = self.throttled_by_action.get(action, 0) + 1
+        await self._notify(event, self._buckets[(user.id, action)], math.ceil(retry_after))
+        return None
+
+    async def _notify(self, event: TelegramObject, bucket: list, retry_after: int):
+        text = MESSAGE_TOO_MANY_REQUESTS.format(retry_after=retry_after)
+        try:
+            if isinstance(event, CallbackQuery):
+                # На callback нужно ответить в любом случае, иначе у кнопки останутся "часики"
+                await event.answer(text, show_alert=False)
+            elif not bucket[2]:
+                # На сообщения предупреждаем один раз за серию, чтобы не отвечать на каждый флуд
+                bucket[2] = True
+                await event.answer(text)
+        except Exception as e:
+            logger.warning(f"Failed to send throttling notice: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'buckets': len(self._buckets),
+            'allowed_total': self.allowed_total,
+            'throttled_total': self.throttled_total,
+            'throttled_by_action': dict(self.throttled_by_action)
+        }
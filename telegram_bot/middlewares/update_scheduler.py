@@ -0,0 +1,153 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Set, Tuple
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.dispatcher.middlewares.error import ErrorsMiddleware
+from aiogram.types import TelegramObject
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]]
+
+
+class UpdateScheduler(BaseMiddleware):
+    """
+    Планировщик обработки обновлений, регистрируется как outer-middleware dp.update.
+
+    - глобальный лимит: одновременно выполняется не более max_concurrency обновлений;
+      при достижении лимита middleware не возвращает управление, поэтому polling
+      (handle_as_tasks=False) не запрашивает новые обновления, а webhook не отвечает
+      Telegram, пока не освободится место;
+    - обновления одного пользователя (или чата, если пользователя нет) обрабатываются
+      строго по очереди, разных пользователей - параллельно. Повторное нажатие /start
+      не обгоняет первое и не регистрирует пользователя дважды;
+    - обновление, ждущее в очереди своего пользователя, не занимает слот и не задерживает
+      прием; в очереди пользователя не более max_queued обновлений, остальные отбрасываются,
+      поэтому поток сообщений одного пользователя не останавливает обработку остальных.
+
+    Обработка идет в фоновой задаче, поэтому ошибки передаются в error-роутеры здесь же
+    (ErrorsMiddleware диспетчера к этому моменту уже завершился).
+    """
+
+    def __init__(self, dispatcher: Dispatcher, max_concurrency: int, max_queued: int):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self._errors = ErrorsMiddleware(dispatcher)
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # Ключ -> ожидающие обновления; наличие ключа означает, что его очередь уже обрабатывается
+        self._queues: Dict[Hashable, Deque[Tuple[Handler, TelegramObject, Dict[str, Any]]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._in_flight = 0
+
+        # Статистика работы
+        self.processed_total = 0
+        self.failed_total = 0
+        self.backpressure_total = 0
+        self.dropped_total = 0
+
+    @staticmethod
+    def get_key(data: Dict[str, Any]) -> Optional[Hashable]:
+        user = data.get("event_from_user")
+        if user is not None:
+            return "user", user.id
+        chat = data.get("event_chat")
+        if chat is not None:
+            return "chat", chat.id
+        return None
+
+    async def __call__(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]) -> Any:
+        key = self.get_key(data)
+        if key is None:
+            await self._acquire()
+            self._in_flight += 1
+            self._spawn(self._run(handler, event, data))
+            return None
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            # Пользователь уже обрабатывается: обновление ждет в его очереди без слота
+            if len(queue) >= self.max_queued:
+                self.dropped_total += 1
+                logger.warning(f"Dropping update {getattr(event, 'update_id', None)}: "
+                               f"{len(queue)} updates already queued for {key}")
+            else:
+                queue.append((handler, event, data))
+                self._in_flight += 1
+            return None
+
+        # Очередь создается до ожидания слота: следующие обновления пользователя встанут за этим
+        queue = self._queues[key] = deque([(handler, event, data)])
+        self._in_flight += 1
+        try:
+            await self._acquire()
+        except BaseException:
+            self._in_flight -= len(queue)
+            del self._queues[key]
+            raise
+        self._spawn(self._drain(key))
+        return None
+
+    async def _acquire(self):
+        if self._slots.locked():
+            self.backpressure_total += 1
+        await self._slots.acquire()
+
+    def _spawn(self, coro: Awaitable):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key: Hashable):
+        """Выполняет очередь пользователя; слот для первого обновления занят при приеме"""
+        queue = self._queues[key]
+        try:
+            while True:
+                await self._run(*queue.popleft())
+                if not queue:
+                    break
+                await self._acquire()
+        finally:
+            # При отмене (остановка бота) оставшиеся обновления не обрабатываются
+            self._in_flight -= len(queue)
+            del self._queues[key]
+
+    async def _run(self, handler: Handler, event: TelegramObject, data: Dict[str, Any]):
+        try:
+            state = data.get("state")
+            if state is not None:
+                # FSMContextMiddleware прочитал состояние при постановке в очередь; предыдущее
+                # обновление пользователя могло его изменить - фильтры должны видеть текущее
+                data["raw_state"] = await state.get_state()
+            await self._errors(handler, event, data)
+            self.processed_total += 1
+        except Exception as e:
+            self.failed_total += 1
+            logger.exception(f"Error processing update {getattr(event, 'update_id', None)}: {e}")
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    async def drain(self, timeout: float):
+        """Ждет завершения принятых обновлений (при остановке бота), по таймауту отменяет их"""
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        if pending:
+            logger.warning(f"Cancelling {len(pending)} update tasks after {timeout}s drain timeout")
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_flight': self._in_flight,
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'active_keys': len(self._queues),
+            'processed_total': self.processed_total,
+            'failed_total': self.failed_total,
+            'backpressure_total': self.backpressure_total,
+            'dropped_total': self.dropped_total
+        }
@@ -20,6 +20,9 @@ CREATE INDEX IF NOT EXISTS idx_profiles_telegram_id ON profiles(telegram_id);
 -- Индекс для быстрого поиска по реферальному коду
 CREATE INDEX IF NOT EXISTS idx_profiles_referral_code ON profiles(referral_code);
 
+-- Индекс для выборки новых профилей при обновлении индекса реферальных кодов
+CREATE INDEX IF NOT EXISTS idx_profiles_created_at ON profiles(created_at);
+
 -- Таблица рефералов
 CREATE TABLE IF NOT EXISTS referrals (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -36,6 +39,8 @@ CREATE TABLE IF NOT EXISTS referrals (
 -- Индекс для быстрого поиска рефералов по пригласившему
 CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals(referrer_id);
 CREATE INDEX IF NOT EXISTS idx_referrals_referred ON referrals(referred_id);
+-- Выборки рефералов по уровням (связи хранятся для всех 5 уровней)
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer_level ON referrals(referrer_id, level);
 
 -- Таблица балансов пользователей
 CREATE TABLE IF NOT EXISTS balances (
@@ -66,7 +71,7 @@ CREATE INDEX IF NOT EXISTS idx_user_stats_user_id ON user_stats(user_id);
 -- Таблица статистики по рефералам
 CREATE TABLE IF NOT EXISTS referral_stats (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-    user_id UUID NOT NULL REFERENCES profiles(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL UNIQUE REFERENCES profiles(id) ON DELETE CASCADE,
     total_referrals INTEGER DEFAULT 0,
     total_earnings DECIMAL(10, 2) DEFAULT 0.00,
     level_1_count INTEGER DEFAULT 0,
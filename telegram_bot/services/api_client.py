@@ -1,7 +1,32 @@
+import asyncio
+import random
+import time
 import aiohttp
 import logging
-from typing import Optional, Dict, Any
-from telegram_bot.config import API_BASE_URL, API_TIMEOUT
+from typing import Optional, Dict, Any, Tuple
+from telegram_bot.config import (
+    API_BASE_URL,
+    API_TIMEOUT,
+    API_POOL_LIMIT,
+    API_POOL_LIMIT_PER_HOST,
+    API_KEEPALIVE_TIMEOUT,
+    API_DNS_CACHE_TTL,
+    API_BREAKER_WINDOW,
+    API_BREAKER_MIN_CALLS,
+    API_BREAKER_FAILURE_RATE,
+    API_BREAKER_SLOW_CALL,
+    API_BREAKER_OPEN_SECONDS,
+    API_BREAKER_HALF_OPEN_CALLS,
+    API_RETRY_ATTEMPTS,
+    API_RETRY_BASE_DELAY,
+    API_RETRY_MAX_DELAY
+)
+from telegram_bot.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from telegram_bot.services.http_session import PooledHttpSession
+from telegram_bot.services.profile_cache import backend_profile_cache, invalidate_profile
+from telegram_bot.services.referral_codes import normalize_code, referral_code_index
+from telegram_bot.utils.deadline import DeadlineExceeded, deadline_expired, timeout_for
+from telegram_bot.utils.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -9,60 +34,233 @@ class ApiClient:
     def __init__(self):
         self.base_url = API_BASE_URL
         self.timeout = API_TIMEOUT
-    
-    async def register_user(self, telegram_id: int, first_name: str, username: str = None,
-                           referral_code: str = None) -> Optional[Dict[str, Any]]:
+        self.http = PooledHttpSession(
+            name="backend-api",
+            limit=API_POOL_LIMIT,
+            limit_per_host=API_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=API_KEEPALIVE_TIMEOUT,
+            dns_cache_ttl=API_DNS_CACHE_TTL,
+            timeout=API_TIMEOUT
+        )
+        self.profile_cache = backend_profile_cache
+        self.referral_codes = referral_code_index
+        # Одновременные одинаковые запросы чтения объединяются в один
+        self.flights = SingleFlight("backend-api")
+        # Автоматы защиты по endpoint: при недоступном backend запросы отклоняются сразу
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retries_total = 0
+
+    async def start(self):
+        """
+        Открывает общую сессию с пулом соединений (вызывается при старте диспетчера)
+        """
+        await self.http.start()
+
+    async def close(self):
+        """
+        Закрывает общую сессию (вызывается при остановке диспетчера)
+        """
+        await self.http.close()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Метрики заполненности пула соединений
         """
-        Регистрация пользователя через backend API
+        return self.http.stats()
+
+    def breaker_stats(self) -> Dict[str, Any]:
+        """
+        Состояние автоматов защиты по endpoint
+        """
+        return {name: breaker.stats() for name, breaker in self.breakers.items()}
+
+    def _breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            breaker = self.breakers[endpoint] = CircuitBreaker(
+                name=endpoint,
+                window_size=API_BREAKER_WINDOW,
+                min_calls=API_BREAKER_MIN_CALLS,
+                failure_rate=API_BREAKER_FAILURE_RATE,
+                slow_call_duration=API_BREAKER_SLOW_CALL,
+                open_duration=API_BREAKER_OPEN_SECONDS,
+                half_open_calls=API_BREAKER_HALF_OPEN_CALLS
+            )
+        return breaker
+
+    async def _request(self, endpoint: str, method: str, path: str, idempotent: bool = False,
+                       **kwargs) -> Tuple[int, Any]:
         """
-        async with aiohttp.ClientSession() as session:
+        Запрос к backend через автомат защиты endpoint.
+        Возвращает (HTTP статус, JSON при 200 или текст ответа).
+        Идемпотентные запросы повторяются при ошибках соединения и ответах 5xx
+        (не более API_RETRY_ATTEMPTS раз, пауза со случайной составляющей).
+        Таймауты не повторяются: медленный backend повторами только перегружается.
+        Таймаут попытки ограничен оставшимся бюджетом обновления (DeadlineExceeded по его истечении).
+        Бросает CircuitOpenError, если автомат разомкнут.
+        """
+        breaker = self._breaker(endpoint)
+        attempts = 1 + (API_RETRY_ATTEMPTS if idempotent else 0)
+        for attempt in range(attempts):
+            timeout = timeout_for(self.timeout)
+            if not breaker.allow():
+                raise CircuitOpenError(endpoint, breaker.retry_after)
+
+            started = time.monotonic()
+            retryable = False
             try:
-                payload = {
-                    'telegram_id': telegram_id,
-                    'first_name': first_name,
-                    'username': username,
-                    'referral_code': referral_code
-                }
-
-                async with session.post(
-                    f"{self.base_url}/users/register",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=self.timeout)
+                async with self.http.request(
+                    method,
+                    f"{self.base_url}{path}",
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                    **kwargs
                 ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.info(f"User registered successfully: {telegram_id}")
-                        return result
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"API error {response.status}: {error_text}")
-                        return None
-            except Exception as e:
-                logger.error(f"Error registering user: {e}")
-                return None
-    
+                    data = await response.json() if response.status == 200 else await response.text()
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except asyncio.TimeoutError:
+                if deadline_expired():
+                    # Исчерпан бюджет обновления, а не таймаут backend - автомат не учитывает
+                    breaker.release()
+                    raise DeadlineExceeded() from None
+                breaker.record(False, time.monotonic() - started)
+                raise
+            except aiohttp.ClientConnectionError as e:
+                breaker.record(False, time.monotonic() - started)
+                if attempt + 1 >= attempts:
+                    raise
+                retryable = True
+                logger.warning(f"Backend {endpoint} connection error, retrying: {e}")
+            except Exception:
+                breaker.record(False, time.monotonic() - started)
+                raise
+            else:
+                ok = response.status < 500
+                breaker.record(ok, time.monotonic() - started)
+                if ok or attempt + 1 >= attempts:
+                    return response.status, data
+                retryable = True
+                logger.warning(f"Backend {endpoint} returned {response.status}, retrying")
+
+            if retryable:
+                self.retries_total += 1
+                # Full jitter: повторы разных обработчиков не приходят в backend одновременно
+                delay = random.uniform(0, min(API_RETRY_MAX_DELAY, API_RETRY_BASE_DELAY * 2 ** attempt))
+                await asyncio.sleep(timeout_for(delay))
+
+    async def register_user(self, telegram_id: int, first_name: str, username: str = None,
+                           referral_code: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Регистрация пользователя через backend API.
+        Не повторяется автоматически; при разомкнутом автомате бросает CircuitOpenError.
+        """
+        if referral_code and self.referral_codes.is_confirmed_invalid(referral_code):
+            # Код, которого backend уже не нашел, не отправляем. Промах фильтра Блума
+            # не отбрасываем: код мог появиться после обновления фильтра, а регистрация
+            # не повторяется - реферальная связь была бы потеряна
+            referral_code = None
+
+        payload = {
+            'telegram_id': telegram_id,
+            'first_name': first_name,
+            'username': username,
+            'referral_code': referral_code
+        }
+
+        # Регистрация может изменить профиль - закэшированные копии больше не актуальны
+        invalidate_profile(telegram_id)
+        self.flights.forget(('get_user', telegram_id))
+
+        try:
+            status, result = await self._request('users.register', 'POST', "/users/register", json=payload)
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error(f"Error registering user: {e}")
+            return None
+
+        if status == 200:
+            logger.info(f"User registered successfully: {telegram_id}")
+            profile = result.get('profile') or {}
+            self.referral_codes.add(profile.get('referral_code'))
+            return result
+        logger.error(f"API error {status}: {result}")
+        return None
+
+    async def get_user(self, telegram_id: int, use_cache: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Получение профиля пользователя через backend API (с кэшем профилей).
+        use_cache=False - прочитать профиль из backend (например, email мог быть привязан на сайте).
+        При разомкнутом автомате бросает CircuitOpenError.
+        """
+        if use_cache:
+            cached = self.profile_cache.get(telegram_id)
+            if cached is not self.profile_cache.MISSING:
+                return cached
+
+        return await self.flights.do(('get_user', telegram_id), lambda: self._fetch_user(telegram_id))
+
+    async def _fetch_user(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        # Регистрация во время запроса сбрасывает кэш - тогда ответ может быть устаревшим
+        cache_version = self.profile_cache.version
+        try:
+            status, result = await self._request('users.get', 'GET', f"/users/{telegram_id}", idempotent=True)
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error(f"Error getting user: {e}")
+            return None
+
+        if status == 200:
+            profile = result.get('profile', result)
+            if profile:
+                self.profile_cache.set(telegram_id, profile, version=cache_version)
+            return profile
+        elif status == 404:
+            return None
+        logger.error(f"API error {status}: {result}")
+        return None
+
     async def verify_referral_code(self, referral_code: str) -> Optional[Dict[str, Any]]:
         """
-        Проверка реферального кода через backend API
+        Проверка реферального кода через backend API.
+        Коды, которые backend недавно не нашел, отклоняются локально по индексу referral_codes,
+        подтвержденные коды кэшируются. При разомкнутом автомате бросает CircuitOpenError.
         """
-        async with aiohttp.ClientSession() as session:
-            try:
-                async with session.post(
-                    f"{self.base_url}/referral-code/verify",
-                    json={'referral_code': referral_code},
-                    timeout=aiohttp.ClientTimeout(total=self.timeout)
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        logger.info(f"Referral code verified: {referral_code}")
-                        return result
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"API error {response.status}: {error_text}")
-                        return None
-            except Exception as e:
-                logger.error(f"Error verifying referral code: {e}")
-                return None
+        if self.referral_codes.is_confirmed_invalid(referral_code):
+            return {'valid': False}
+        owner = self.referral_codes.get_owner(referral_code)
+        if owner is not self.referral_codes.valid.MISSING:
+            return {'valid': True, 'user': owner}
+
+        return await self.flights.do(
+            ('verify_referral_code', normalize_code(referral_code)),
+            lambda: self._verify_referral_code(referral_code)
+        )
+
+    async def _verify_referral_code(self, referral_code: str) -> Optional[Dict[str, Any]]:
+        try:
+            # Проверка кода только читает данные, поэтому ее можно повторять
+            status, result = await self._request(
+                'referral_code.verify', 'POST', "/referral-code/verify",
+                idempotent=True, json={'referral_code': referral_code}
+            )
+        except (CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error(f"Error verifying referral code: {e}")
+            return None
+
+        if status == 200:
+            logger.info(f"Referral code verified: {referral_code}")
+            if result.get('valid'):
+                self.referral_codes.remember_valid(referral_code, result.get('user') or {})
+            else:
+                self.referral_codes.remember_invalid(referral_code)
+            return result
+        logger.error(f"API error {status}: {result}")
+        return None
 
 # Global instance
 api_client = ApiClient()
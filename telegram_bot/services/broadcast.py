@@ -0,0 +1,224 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+
+from telegram_bot.config import (
+    BROADCAST_WORKERS,
+    BROADCAST_QUEUE_SIZE,
+    BROADCAST_CURSOR_PREFETCH,
+    BROADCAST_CURSOR_CHUNK,
+    BROADCAST_STATE_PATH,
+    BROADCAST_CHECKPOINT_INTERVAL
+)
+from telegram_bot.database import database
+from telegram_bot.services.send_queue import PRIORITY_BULK, send_priority
+from telegram_bot.utils.deadline import background_context
+
+logger = logging.getLogger(__name__)
+
+
+STATUS_TITLES = {
+    "running": "выполняется",
+    "finished": "завершена",
+    "cancelled": "отменена",
+    "failed": "прервана из-за ошибки",
+}
+
+
+@dataclass
+class BroadcastJob:
+    """Состояние рассылки; сохраняется в BROADCAST_STATE_PATH для продолжения после перезапуска"""
+    admin_id: int
+    from_chat_id: int
+    message_id: int
+    status: str = "running"  # running | finished | cancelled | failed
+    checkpoint: int = 0  # все telegram_id <= checkpoint уже обработаны
+    delivered: int = 0
+    blocked: int = 0
+    failed: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def processed(self) -> int:
+        return self.delivered + self.blocked + self.failed
+
+    def summary(self) -> str:
+        return (
+            f"Рассылка {STATUS_TITLES.get(self.status, self.status)}\n"
+            f"Доставлено: {self.delivered}\n"
+            f"Заблокировали бота: {self.blocked}\n"
+            f"Ошибки: {self.failed}"
+        )
+
+
+class BroadcastEngine:
+    """
+    Рассылка сообщения администратора всем пользователям.
+    - получатели читаются потоково (Database.iter_telegram_ids) в порядке telegram_id;
+    - отправку выполняет пул воркеров с низким приоритетом планировщика отправки,
+      поэтому лимиты Telegram соблюдаются, а ответы в диалогах не задерживаются;
+    - контрольная точка - наибольший telegram_id, до которого включительно все обработаны;
+      после перезапуска рассылка продолжается с нее (повторно могут уйти не более
+      workers сообщений, которые были в отправке в момент остановки).
+    """
+
+    def __init__(self, workers: int, queue_size: int, state_path: str, checkpoint_interval: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.state_path = state_path
+        self.checkpoint_interval = checkpoint_interval
+        self.job: Optional[BroadcastJob] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot: Bot, admin_id: int, from_chat_id: int, message_id: int) -> BroadcastJob:
+        if self.running:
+            raise RuntimeError("Рассылка уже выполняется")
+        if not database.supports_bulk_operations:
+            raise RuntimeError("Рассылка недоступна в режиме API клиента (USE_API_CLIENT): список пользователей не загружается")
+        self.job = BroadcastJob(admin_id=admin_id, from_chat_id=from_chat_id, message_id=message_id)
+        self._save()
+        # Рассылка переживает обработчик /broadcast и не ограничена его бюджетом времени
+        self._task = asyncio.create_task(self._run(bot, self.job), context=background_context())
+        return self.job
+
+    def resume(self, bot: Bot) -> Optional[BroadcastJob]:
+        """Продолжает незавершенную рассылку из сохраненного состояния (вызывается при запуске бота)"""
+        job = self._load()
+        if job is None or job.status != "running" or self.running:
+            return None
+        if not database.supports_bulk_operations:
+            logger.warning("Broadcast checkpoint found, but broadcasts are not supported in API client mode")
+            return None
+        logger.info(f"Resuming broadcast from telegram_id > {job.checkpoint}")
+        self.job = job
+        self._task = asyncio.create_task(self._run(bot, job), context=background_context())
+        return job
+
+    async def cancel(self) -> bool:
+        if not self.running:
+            return False
+        self.job.status = "cancelled"
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    async def stop(self):
+        """Останавливает рассылку при выключении бота, сохраняя контрольную точку для продолжения"""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self, bot: Bot, job: BroadcastJob):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # telegram_id в порядке выдачи и множество завершенных - для продвижения контрольной точки
+        issued: deque = deque()
+        done: set = set()
+        last_saved = time.monotonic()
+
+        def complete(telegram_id: int):
+            nonlocal last_saved
+            done.add(telegram_id)
+            while issued and issued[0] in done:
+                done.discard(issued[0])
+                job.checkpoint = issued.popleft()
+            if time.monotonic() - last_saved >= self.checkpoint_interval:
+                last_saved = time.monotonic()
+                self._save()
+
+        async def worker():
+            with send_priority(PRIORITY_BULK):
+                while True:
+                    telegram_id = await queue.get()
+                    # При отмене во время отправки получатель не отмечается обработанным
+                    await self._send(bot, job, telegram_id)
+                    complete(telegram_id)
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            async for telegram_id in database.iter_telegram_ids(
+                    after=job.checkpoint, prefetch=BROADCAST_CURSOR_PREFETCH, chunk_size=BROADCAST_CURSOR_CHUNK):
+                issued.append(telegram_id)
+                await queue.put(telegram_id)
+            await queue.join()
+            job.status = "finished"
+        except Exception as e:
+            logger.error(f"Broadcast failed: {e}")
+            job.status = "failed"
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if job.status != "running":
+                job.finished_at = time.time()
+            self._save()
+
+        logger.info(f"Broadcast {job.status}: delivered={job.delivered}, blocked={job.blocked}, failed={job.failed}")
+        try:
+            await bot.send_message(job.admin_id, job.summary())
+        except TelegramAPIError as e:
+            logger.error(f"Failed to send broadcast report: {e}")
+
+    async def _send(self, bot: Bot, job: BroadcastJob, telegram_id: int):
+        try:
+            await bot.copy_message(chat_id=telegram_id, from_chat_id=job.from_chat_id, message_id=job.message_id)
+            job.delivered += 1
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота или удалил аккаунт
+            job.blocked += 1
+        except Exception as e:
+            job.failed += 1
+            logger.warning(f"Broadcast to {telegram_id} failed: {e}")
+
+    def _save(self):
+        if self.job is None:
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(asdict(self.job), f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logger.error(f"Failed to save broadcast checkpoint: {e}")
+
+    def _load(self) -> Optional[BroadcastJob]:
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return BroadcastJob(**json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Failed to load broadcast checkpoint: {e}")
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        if self.job is None:
+            return {'running': False}
+        return {'running': self.running, **asdict(self.job), 'processed': self.job.processed}
+
+
+broadcast_engine = BroadcastEngine(
+    workers=BROADCAST_WORKERS,
+    queue_size=BROADCAST_QUEUE_SIZE,
+    state_path=BROADCAST_STATE_PATH,
+    checkpoint_interval=BROADCAST_CHECKPOINT_INTERVAL
+)
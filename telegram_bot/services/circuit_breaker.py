@@ -0,0 +1,115 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+
+class CircuitOpenError(Exception):
+    """Запрос не выполнен: автомат разомкнут, backend считается недоступным"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry after {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Автомат защиты вызовов одного endpoint backend.
+
+    - closed: вызовы проходят; учитываются исходы последних window_size вызовов;
+      неудачным считается вызов с ошибкой или дольше slow_call_duration;
+    - open: если доля неудачных (при не менее min_calls вызовах) достигла failure_rate,
+      вызовы отклоняются сразу, без ожидания таймаута, на open_duration секунд;
+    - half_open: затем пропускается до half_open_calls пробных вызовов; успешная проба
+      замыкает автомат, неудачная снова размыкает его.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, window_size: int, min_calls: int, failure_rate: float,
+                 slow_call_duration: float, open_duration: float, half_open_calls: int):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_duration = slow_call_duration
+        self.open_duration = open_duration
+        self.half_open_calls = half_open_calls
+
+        self.state = self.CLOSED
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+        # Статистика работы
+        self.rejected_total = 0
+        self.opened_total = 0
+
+    @property
+    def retry_after(self) -> float:
+        if self.state != self.OPEN:
+            return 0.0
+        return max(self._opened_at + self.open_duration - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """Можно ли выполнить вызов; при True вызов нужно завершить record() или release()"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_duration:
+                self.rejected_total += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probes = 0
+
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_calls:
+                self.rejected_total += 1
+                return False
+            self._probes += 1
+        return True
+
+    def record(self, success: bool, duration: float):
+        ok = success and duration < self.slow_call_duration
+        if self.state == self.HALF_OPEN:
+            self._probes -= 1
+            if ok:
+                self._close()
+            else:
+                self._open()
+            return
+
+        if len(self._outcomes) == self._outcomes.maxlen and not self._outcomes[0]:
+            self._failures -= 1
+        self._outcomes.append(ok)
+        if not ok:
+            self._failures += 1
+        if (self.state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                and self._failures >= self.failure_rate * len(self._outcomes)):
+            self._open()
+
+    def release(self):
+        """Вызов отменен и не дал результата"""
+        if self.state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def _open(self):
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self.opened_total += 1
+
+    def _close(self):
+        self.state = self.CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'window_calls': len(self._outcomes),
+            'window_failures': self._failures,
+            'rejected_total': self.rejected_total,
+            'opened_total': self.opened_total
+        }
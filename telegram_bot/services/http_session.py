@@ -0,0 +1,101 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class PooledHttpSession:
+    """
+    Общая aiohttp-сессия с пулом keep-alive соединений к одному backend.
+    Создается один раз на процесс (при старте диспетчера) и закрывается при остановке.
+    """
+
+    def __init__(self, name: str, limit: int, limit_per_host: int,
+                 keepalive_timeout: float, dns_cache_ttl: int, timeout: float,
+                 headers: Dict[str, str] = None):
+        self.name = name
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self.headers = headers or {}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # Статистика использования пула
+        self.requests_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.saturated_total = 0
+        self.sessions_created = 0
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+            enable_cleanup_closed=True
+        )
+        self.sessions_created += 1
+        logger.info(
+            f"HTTP pool '{self.name}' started: limit={self.limit}, "
+            f"limit_per_host={self.limit_per_host}, keepalive={self.keepalive_timeout}s"
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Создает сессию, если она еще не создана или была закрыта"""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session()
+        return self._session
+
+    async def close(self):
+        """Закрывает сессию и все соединения пула"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info(f"HTTP pool '{self.name}' closed: {self.stats()}")
+        self._session = None
+
+    @asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs):
+        """
+        Выполняет запрос через общую сессию.
+        Сессия создается лениво, если start() не был вызван (например, вне диспетчера).
+        """
+        session = await self.start()
+
+        self.requests_total += 1
+        if self.in_flight >= self.limit_per_host:
+            # Все соединения к хосту заняты - запрос будет ждать в очереди коннектора
+            self.saturated_total += 1
+        self.in_flight += 1
+        if self.in_flight > self.peak_in_flight:
+            self.peak_in_flight = self.in_flight
+
+        try:
+            async with session.request(method, url, **kwargs) as response:
+                yield response
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Возвращает метрики заполненности пула"""
+        return {
+            'name': self.name,
+            'limit': self.limit,
+            'limit_per_host': self.limit_per_host,
+            'requests_total': self.requests_total,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'saturated_total': self.saturated_total,
+            'sessions_created': self.sessions_created
+        }
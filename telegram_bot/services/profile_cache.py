@@ -0,0 +1,14 @@
+from telegram_bot.config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL
+from telegram_bot.utils.cache import TTLCache
+
+# Кэши профилей по telegram_id. Значения разной формы хранятся раздельно:
+# - profile_cache - профили Database (asyncpg Record или dict выбранного источника данных)
+# - backend_profile_cache - полные профили backend API в ApiClient (с email и т.п.)
+profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL, name="profiles")
+backend_profile_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL, name="backend_profiles")
+
+
+def invalidate_profile(telegram_id: int):
+    """Сбрасывает профиль во всех кэшах (после регистрации пользователя)"""
+    profile_cache.invalidate(telegram_id)
+    backend_profile_cache.invalidate(telegram_id)
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from telegram_bot.config import (
+    REFERRAL_CODE_CACHE_SIZE,
+    REFERRAL_CODE_CACHE_TTL,
+    REFERRAL_CODE_NEGATIVE_TTL,
+    REFERRAL_CODE_BLOOM_CAPACITY,
+    REFERRAL_CODE_BLOOM_ERROR_RATE,
+    REFERRAL_CODE_REFRESH_INTERVAL
+)
+from telegram_bot.utils.bloom import BloomFilter
+from telegram_bot.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Загрузчик кодов: принимает отметку времени последней загрузки (None - загрузить все)
+# и возвращает пары (referral_code, created_at)
+CodeLoader = Callable[[Optional[Any]], Awaitable[List[Tuple[str, Any]]]]
+
+
+def normalize_code(referral_code: str) -> str:
+    return str(referral_code).strip().upper()
+
+
+class ReferralCodeIndex:
+    """
+    Локальный индекс реферальных кодов.
+    - valid: кэш найденных кодов (код -> профиль владельца)
+    - invalid: кэш кодов, для которых backend ответил "не найден"; только такие коды
+      отклоняются без запроса к backend
+    - bloom: фильтр Блума всех кодов из profiles.referral_code, включается после прогрева из БД
+      и периодически дополняется новыми кодами. Отсутствие кода в фильтре не считается отказом:
+      код мог создать другой процесс или Node.js backend после последнего обновления фильтра.
+      Найденные источником коды, которых не было в фильтре, добавляются в него (bloom_misses).
+    """
+
+    def __init__(self, cache_size: int, cache_ttl: float, negative_ttl: float,
+                 bloom_capacity: int, bloom_error_rate: float, refresh_interval: float):
+        self.valid = TTLCache(maxsize=cache_size, ttl=cache_ttl, name="referral_codes")
+        self.invalid = TTLCache(maxsize=cache_size, ttl=negative_ttl, name="invalid_referral_codes")
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.refresh_interval = refresh_interval
+        self.bloom: Optional[BloomFilter] = None
+        self._watermark: Optional[Any] = None
+        self._loader: Optional[CodeLoader] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Статистика работы индекса
+        self.rejected_by_cache = 0
+        self.bloom_misses = 0
+        self.refreshes_total = 0
+        self.refresh_errors = 0
+
+    @property
+    def warmed(self) -> bool:
+        return self.bloom is not None
+
+    def is_confirmed_invalid(self, referral_code: str) -> bool:
+        """
+        Код не найден источником данных (негативный кэш). Отсутствие в фильтре подтверждением
+        не считается: код мог быть создан после последнего обновления фильтра
+        """
+        code = normalize_code(referral_code)
+        if not code:
+            return True
+        if self.invalid.get(code) is not TTLCache.MISSING:
+            self.rejected_by_cache += 1
+            return True
+        return False
+
+    def get_owner(self, referral_code: str) -> Any:
+        """Возвращает закэшированного владельца кода или TTLCache.MISSING"""
+        return self.valid.get(normalize_code(referral_code))
+
+    def remember_valid(self, referral_code: str, owner: Any):
+        self.add(referral_code)
+        self.valid.set(normalize_code(referral_code), owner)
+
+    def remember_invalid(self, referral_code: str):
+        code = normalize_code(referral_code)
+        if code:
+            self.valid.invalidate(code)
+            self.invalid.set(code, True)
+
+    def add(self, referral_code: Optional[str]):
+        """Регистрирует существующий код (новый профиль или код, найденный источником данных)"""
+        if not referral_code:
+            return
+        code = normalize_code(referral_code)
+        self.invalid.invalidate(code)
+        if self.bloom is not None and code not in self.bloom:
+            self.bloom_misses += 1
+            self.bloom.add(code)
+
+    async def warm(self, loader: CodeLoader):
+        """
+        Полностью перестраивает фильтр по всем кодам из БД.
+        Пустой результат фильтр не включает: скорее всего, коды не удалось прочитать
+        (например, из-за RLS), а пустой фильтр отклонил бы все коды.
+        """
+        rows = await loader(None)
+        if not any(code for code, _ in rows):
+            logger.warning("Referral code index not warmed: loader returned no codes")
+            return
+        bloom = BloomFilter(max(self.bloom_capacity, len(rows) * 2), self.bloom_error_rate)
+        watermark = None
+        for code, created_at in rows:
+            if code:
+                bloom.add(normalize_code(code))
+            if created_at is not None and (watermark is None or created_at > watermark):
+                watermark = created_at
+        self.bloom = bloom
+        self._watermark = watermark
+        logger.info(f"Referral code index warmed: {len(bloom)} codes, bloom size {bloom.size} bits")
+
+    async def refresh(self):
+        """Дополняет фильтр кодами, созданными после последней загрузки (в том числе другими процессами)"""
+        if self._loader is None:
+            return
+        if self.bloom is None or self.bloom.saturated:
+            await self.warm(self._loader)
+            return
+
+        rows = await self._loader(self._watermark)
+        for code, created_at in rows:
+            if code:
+                code = normalize_code(code)
+                # Загрузки перекрываются по времени - повторно не добавляем, чтобы не завышать заполненность
+                if code not in self.bloom:
+                    self.bloom.add(code)
+                self.invalid.invalidate(code)
+            if created_at is not None and (self._watermark is None or created_at > self._watermark):
+                self._watermark = created_at
+        self.refreshes_total += 1
+
+    async def start(self, loader: CodeLoader):
+        """
+        Прогревает фильтр и запускает его периодическое обновление.
+        Если прогрев не удался, фильтр выключен, а обновление повторяет прогрев.
+        """
+        self._loader = loader
+        if self.refresh_interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+        await self.warm(loader)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                # Фильтр остается прежним до следующей успешной загрузки
+                self.refresh_errors += 1
+                logger.error(f"Error refreshing referral code index: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'warmed': self.warmed,
+            'bloom_codes': len(self.bloom) if self.bloom is not None else 0,
+            'rejected_by_cache': self.rejected_by_cache,
+            'bloom_misses': self.bloom_misses,
+            'refreshes_total': self.refreshes_total,
+            'refresh_errors': self.refresh_errors,
+            'valid_cache': self.valid.stats(),
+            'invalid_cache': self.invalid.stats()
+        }
+
+
+# Общий индекс реферальных кодов для ApiClient и Database
+referral_code_index = ReferralCodeIndex(
+    cache_size=REFERRAL_CODE_CACHE_SIZE,
+    cache_ttl=REFERRAL_CODE_CACHE_TTL,
+    negative_ttl=REFERRAL_CODE_NEGATIVE_TTL,
+    bloom_capacity=REFERRAL_CODE_BLOOM_CAPACITY,
+    bloom_error_rate=REFERRAL_CODE_BLOOM_ERROR_RATE,
+    refresh_interval=REFERRAL_CODE_REFRESH_INTERVAL
+)
@@ -0,0 +1,248 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Union
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from telegram_bot.config import (
+    SEND_GLOBAL_RATE,
+    SEND_PRIVATE_CHAT_INTERVAL,
+    SEND_GROUP_CHAT_INTERVAL,
+    SEND_MAX_RETRIES
+)
+from telegram_bot.utils.deadline import background_context
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты отправки: меньше - раньше
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+_send_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+# Методы, которые не создают сообщений и не подпадают под лимиты рассылки
+_UNLIMITED_SEND_METHODS = {'sendChatAction', 'sendInvoice'}
+
+
+@contextmanager
+def send_priority(priority: int):
+    """Задает приоритет всех отправок внутри блока (например, PRIORITY_BULK для рассылок)"""
+    token = _send_priority.set(priority)
+    try:
+        yield
+    finally:
+        _send_priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ('priority', 'seq', 'chat_id', 'future', 'enqueued_at')
+
+    def __init__(self, priority: int, seq: int, chat_id: Union[int, str], future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """
+    Планировщик исходящих сообщений, подключается как request-middleware сессии бота,
+    поэтому через него проходят и message.answer в обработчиках, и рассылки.
+
+    - глобальный лимит: не более global_rate сообщений в секунду (token bucket);
+    - лимит на чат: интервал между сообщениями в один чат (для групп и каналов - больше);
+    - 429 Too Many Requests: flood wait Telegram действует на весь бот, поэтому на retry_after
+      приостанавливается вся отправка, а не только этот чат; запрос повторяется;
+    - приоритеты: интерактивные ответы обгоняют массовые отправки (см. send_priority).
+    """
+
+    def __init__(self, global_rate: float, private_chat_interval: float,
+                 group_chat_interval: float, max_retries: int):
+        self.global_rate = global_rate
+        self.private_chat_interval = private_chat_interval
+        self.group_chat_interval = group_chat_interval
+        self.max_retries = max_retries
+
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._tokens = float(global_rate)
+        self._tokens_updated = time.monotonic()
+        # chat_id -> момент, с которого в чат снова можно отправлять
+        self._chat_ready_at: Dict[Union[int, str], float] = {}
+        # Момент окончания flood wait: до него разрешения не выдаются никому
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Статистика работы
+        self.sent_total = 0
+        self.retry_after_total = 0
+        self.failed_total = 0
+        self.max_wait = 0.0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, 'chat_id', None)
+        api_method = method.__api_method__
+        if chat_id is None or api_method in _UNLIMITED_SEND_METHODS or not (
+                api_method.startswith('send') or api_method in ('copyMessage', 'forwardMessage')):
+            return await make_request(bot, method)
+
+        priority = _send_priority.get()
+        attempt = 0
+        while True:
+            await self.acquire(chat_id, priority)
+            try:
+                response = await make_request(bot, method)
+                self.sent_total += 1
+                return response
+            except TelegramRetryAfter as e:
+                self.retry_after_total += 1
+                self.pause(e.retry_after)
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.failed_total += 1
+                    raise
+                logger.warning(f"Flood control for chat {chat_id}: retry in {e.retry_after}s (attempt {attempt})")
+
+    def pause(self, seconds: float):
+        """Приостанавливает всю отправку (flood wait); уже накопленные токены сгорают"""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._tokens_updated = self._paused_until
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _chat_interval(self, chat_id: Union[int, str]) -> float:
+        # Положительные id - личные чаты, отрицательные и @username - группы и каналы
+        if isinstance(chat_id, int) and chat_id > 0:
+            return self.private_chat_interval
+        return self.group_chat_interval
+
+    async def acquire(self, chat_id: Union[int, str], priority: int = PRIORITY_INTERACTIVE):
+        """Ждет разрешения на отправку сообщения в чат"""
+        self._ensure_running()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, _Waiter(priority, next(self._seq), chat_id, future))
+        self._wakeup.set()
+        await future
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            # Запускается из первого отправляющего обработчика - без его бюджета времени
+            self._task = asyncio.create_task(self._run(), context=background_context())
+
+    def _refill(self, now: float):
+        self._tokens = min(self.global_rate, self._tokens + (now - self._tokens_updated) * self.global_rate)
+        self._tokens_updated = now
+
+    async def _run(self):
+        while True:
+            delay = self._dispatch()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _dispatch(self) -> Optional[float]:
+        """
+        Выдает разрешения ожидающим в порядке приоритета, пока позволяют лимиты.
+        Возвращает время до следующей возможной выдачи (None - очередь пуста).
+        """
+        while self._queue:
+            now = time.monotonic()
+            if now < self._paused_until:
+                return self._paused_until - now
+            self._refill(now)
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.global_rate
+
+            # Берем первого по приоритету ожидающего, чей чат уже свободен
+            deferred = []
+            granted = None
+            while self._queue:
+                waiter = heapq.heappop(self._queue)
+                if waiter.future.done():
+                    # Отправитель отменен - его место в очереди не нужно
+                    continue
+                if self._chat_ready_at.get(waiter.chat_id, 0) <= now:
+                    granted = waiter
+                    break
+                deferred.append(waiter)
+            for waiter in deferred:
+                heapq.heappush(self._queue, waiter)
+
+            if granted is None:
+                if not deferred:
+                    break
+                return max(min(self._chat_ready_at[w.chat_id] for w in deferred) - now, 0)
+
+            self._tokens -= 1
+            self._chat_ready_at[granted.chat_id] = now + self._chat_interval(granted.chat_id)
+            wait = now - granted.enqueued_at
+            if wait > self.max_wait:
+                self.max_wait = wait
+            granted.future.set_result(None)
+
+        self._sweep(time.monotonic())
+        return None
+
+    def _sweep(self, now: float):
+        """Забывает чаты, в которые уже можно отправлять, когда их накопилось много"""
+        if len(self._chat_ready_at) > 1000:
+            self._chat_ready_at = {
+                chat_id: ready_at for chat_id, ready_at in self._chat_ready_at.items() if ready_at > now
+            }
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        by_priority: Dict[int, int] = {}
+        for waiter in self._queue:
+            by_priority[waiter.priority] = by_priority.get(waiter.priority, 0) + 1
+        return {
+            'queue_depth': len(self._queue),
+            'queue_depth_interactive': by_priority.get(PRIORITY_INTERACTIVE, 0),
+            'queue_depth_bulk': by_priority.get(PRIORITY_BULK, 0),
+            'tracked_chats': len(self._chat_ready_at),
+            'paused_for': round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            'sent_total': self.sent_total,
+            'retry_after_total': self.retry_after_total,
+            'failed_total': self.failed_total,
+            'max_wait': round(self.max_wait, 3)
+        }
+
+
+send_scheduler = SendScheduler(
+    global_rate=SEND_GLOBAL_RATE,
+    private_chat_interval=SEND_PRIVATE_CHAT_INTERVAL,
+    group_chat_interval=SEND_GROUP_CHAT_INTERVAL,
+    max_retries=SEND_MAX_RETRIES
+)
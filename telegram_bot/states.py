@@ -1,3 +1,6 @@
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
 from aiogram.fsm.state import State, StatesGroup
 
 class RegistrationStates(StatesGroup):
@@ -12,3 +15,39 @@ class SupportStates(StatesGroup):
     waiting_for_title = State()
     waiting_for_description = State()
     waiting_for_confirmation = State()
+
+
+@dataclass
+class RegistrationData:
+    """
+    Минимальные данные незавершенной регистрации, которые хранятся в FSM.
+    Полный ответ API не сохраняется - нужны только идентификаторы и имя для приветствия.
+    """
+    telegram_id: int
+    first_name: str
+    profile_id: Optional[str] = None
+    referrer_id: Optional[str] = None
+    referral_code: Optional[str] = None
+
+    STATE_KEY = "registration"
+
+    @classmethod
+    def from_api_result(cls, result: Dict[str, Any], telegram_id: int,
+                        referral_code: Optional[str] = None) -> "RegistrationData":
+        profile = result.get('profile') or {}
+        referrer_info = result.get('referrer_info') or {}
+        return cls(
+            telegram_id=telegram_id,
+            first_name=profile.get('first_name') or 'User',
+            profile_id=profile.get('id'),
+            referrer_id=referrer_info.get('id'),
+            referral_code=referral_code
+        )
+
+    @classmethod
+    def from_state(cls, data: Dict[str, Any]) -> Optional["RegistrationData"]:
+        record = data.get(cls.STATE_KEY)
+        return cls(**record) if record else None
+
+    def to_state(self) -> Dict[str, Any]:
+        return {self.STATE_KEY: asdict(self)}
@@ -0,0 +1,5 @@
+from .factory import create_fsm_storage
+from .memory_storage import TTLMemoryStorage
+from .sqlite_storage import SQLiteStorage
+
+__all__ = ["create_fsm_storage", "TTLMemoryStorage", "SQLiteStorage"]
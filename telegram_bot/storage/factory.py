@@ -0,0 +1,45 @@
+import logging
+
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+
+from telegram_bot.config import FSM_STORAGE, FSM_REDIS_URL, FSM_SQLITE_PATH, FSM_STATE_TTL
+
+from telegram_bot.storage.memory_storage import TTLMemoryStorage
+
+logger = logging.getLogger(__name__)
+
+
+def create_fsm_storage(kind: str = FSM_STORAGE) -> BaseStorage:
+    """
+    Создает FSM хранилище по настройке FSM_STORAGE:
+    - memory - в памяти процесса (только один процесс, состояние теряется при перезапуске)
+    - redis  - общий Redis для нескольких воркеров (polling/webhook)
+    - sqlite - файл SQLite, работает без внешних сервисов
+    Во всех вариантах состояние, не обновлявшееся FSM_STATE_TTL секунд, истекает.
+    """
+    kind = (kind or "memory").lower()
+    ttl = FSM_STATE_TTL or None
+
+    if kind == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError("Для FSM_STORAGE=redis установите пакет redis") from e
+        logger.info("FSM storage: Redis")
+        return RedisStorage.from_url(
+            FSM_REDIS_URL,
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=ttl,
+            data_ttl=ttl
+        )
+
+    if kind == "sqlite":
+        logger.info(f"FSM storage: SQLite ({FSM_SQLITE_PATH})")
+        from telegram_bot.storage.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(FSM_SQLITE_PATH, ttl=ttl)
+
+    if kind != "memory":
+        raise ValueError(f"Неизвестный тип FSM_STORAGE: {kind}")
+
+    logger.info("FSM storage: memory")
+    return TTLMemoryStorage(ttl=ttl)
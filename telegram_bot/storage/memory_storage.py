@@ -0,0 +1,68 @@
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+
+class TTLMemoryStorage(MemoryStorage):
+    """
+    MemoryStorage с истечением записей: состояние и данные пользователя удаляются,
+    если они не обновлялись дольше ttl секунд (брошенные регистрации).
+    """
+
+    def __init__(self, ttl: Optional[int] = None):
+        super().__init__()
+        self.ttl = ttl
+        self._updated_at: Dict[StorageKey, float] = {}
+        self._last_sweep = time.monotonic()
+
+    def _touch(self, key: StorageKey):
+        if not self.ttl:
+            return
+        now = time.monotonic()
+        self._updated_at[key] = now
+        if now - self._last_sweep >= self.ttl:
+            self._sweep(now)
+
+    def _expire(self, key: StorageKey):
+        if not self.ttl:
+            return
+        updated_at = self._updated_at.get(key)
+        if updated_at is not None and time.monotonic() - updated_at > self.ttl:
+            self.storage.pop(key, None)
+            self._updated_at.pop(key, None)
+
+    def _sweep(self, now: float):
+        """Удаляет все просроченные и пустые записи"""
+        self._last_sweep = now
+        for key, updated_at in list(self._updated_at.items()):
+            if now - updated_at > self.ttl:
+                self.storage.pop(key, None)
+                self._updated_at.pop(key, None)
+        for key, record in list(self.storage.items()):
+            if record.state is None and not record.data:
+                self.storage.pop(key, None)
+                self._updated_at.pop(key, None)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._expire(key)
+        self._touch(key)
+        await super().set_state(key, state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        self._expire(key)
+        return await super().get_state(key)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        self._expire(key)
+        self._touch(key)
+        await super().set_data(key, data)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        self._expire(key)
+        return await super().get_data(key)
+
+    async def size(self) -> int:
+        """Число пользователей с состоянием или данными (для метрик)"""
+        return sum(1 for record in self.storage.values() if record.state is not None or record.data)
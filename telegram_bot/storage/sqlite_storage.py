@@ -0,0 +1,122 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM хранилище в файле SQLite.
+    Не требует внешних сервисов и переживает перезапуск бота; в режиме WAL
+    файл может использоваться несколькими процессами на одном хосте.
+    Записи, не обновлявшиеся дольше ttl секунд, считаются истекшими и удаляются.
+    """
+
+    def __init__(self, path: str, key_builder: Optional[KeyBuilder] = None, ttl: Optional[int] = None):
+        self.path = path
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.ttl = ttl
+        self._last_purge = time.time()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_storage (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS idx_fsm_storage_updated_at ON fsm_storage(updated_at)")
+
+    def _run(self, query: str, params: tuple = ()):
+        with self._lock:
+            return self._connection.execute(query, params).fetchone()
+
+    async def _execute(self, query: str, params: tuple = ()):
+        # sqlite3 блокирует поток, поэтому запросы выполняются вне event loop
+        return await asyncio.to_thread(self._run, query, params)
+
+    def _min_updated_at(self) -> float:
+        """Время, раньше которого записи считаются истекшими"""
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    async def _purge_expired(self):
+        """Периодически удаляет истекшие записи (не чаще раза в ttl)"""
+        now = time.time()
+        if not self.ttl or now - self._last_purge < self.ttl:
+            return
+        self._last_purge = now
+        await self._execute("DELETE FROM fsm_storage WHERE updated_at < ?", (self._min_updated_at(),))
+
+    async def _cleanup(self, key: str):
+        """Удаляет запись, если в ней не осталось ни состояния, ни данных"""
+        await self._execute(
+            "DELETE FROM fsm_storage WHERE key = ? AND state IS NULL AND (data IS NULL OR data = '{}')",
+            (key,)
+        )
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        db_key = self.key_builder.build(key)
+        value = state.state if isinstance(state, State) else state
+        await self._execute(
+            """
+            INSERT INTO fsm_storage (key, state, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                state = excluded.state,
+                data = CASE WHEN fsm_storage.updated_at < ? THEN NULL ELSE fsm_storage.data END,
+                updated_at = excluded.updated_at
+            """,
+            (db_key, value, time.time(), self._min_updated_at())
+        )
+        if value is None:
+            await self._cleanup(db_key)
+        await self._purge_expired()
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._execute(
+            "SELECT state FROM fsm_storage WHERE key = ? AND updated_at >= ?",
+            (self.key_builder.build(key), self._min_updated_at())
+        )
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        db_key = self.key_builder.build(key)
+        await self._execute(
+            """
+            INSERT INTO fsm_storage (key, data, updated_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                data = excluded.data,
+                state = CASE WHEN fsm_storage.updated_at < ? THEN NULL ELSE fsm_storage.state END,
+                updated_at = excluded.updated_at
+            """,
+            (db_key, json.dumps(data, ensure_ascii=False), time.time(), self._min_updated_at())
+        )
+        if not data:
+            await self._cleanup(db_key)
+        await self._purge_expired()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._execute(
+            "SELECT data FROM fsm_storage WHERE key = ? AND updated_at >= ?",
+            (self.key_builder.build(key), self._min_updated_at())
+        )
+        if not row or not row[0]:
+            return {}
+        return json.loads(row[0])
+
+    async def size(self) -> int:
+        """Число неистекших записей (для метрик)"""
+        row = await self._execute("SELECT COUNT(*) FROM fsm_storage WHERE updated_at >= ?", (self._min_updated_at(),))
+        return row[0]
+
+    async def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -1,8 +1,11 @@
 import os
-from typing import Optional, Dict, Any
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 from supabase import create_client, Client
-import uuid
+
+from .utils.deadline import DeadlineExceeded, run_with_deadline
 
 load_dotenv()
 
@@ -45,24 +48,76 @@ class SupabaseClient:
             self.service_client = self.client
             print("⚠️ Supabase: service_role_key не настроен, используется anon key (RLS ограничения активны)")
 
+        # Синхронный клиент supabase блокирует поток на каждом .execute(),
+        # поэтому запросы выполняются в отдельном пуле потоков ограниченного размера,
+        # а event loop бота остается свободным
+        self.max_concurrency = int(os.getenv("SUPABASE_MAX_CONCURRENCY", 10))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="supabase"
+        )
+
+    async def _execute(self, query):
+        """
+        Выполняет запрос PostgREST в пуле потоков, не блокируя event loop.
+        Ожидание ограничено бюджетом обновления; сам HTTP-запрос в потоке при этом
+        завершается в фоне (синхронный клиент нельзя прервать).
+        """
+        loop = asyncio.get_running_loop()
+        return await run_with_deadline(loop.run_in_executor(self._executor, query.execute))
+
+    async def close(self):
+        """Останавливает пул потоков, дожидаясь завершения выполняющихся запросов"""
+        await asyncio.to_thread(self._executor.shutdown, True)
+
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict[str, Any]]:
         """Получает пользователя по telegram_id"""
         try:
-            response = self.client.table('profiles').select('*').eq('telegram_id', telegram_id).execute()
+            response = await self._execute(self.client.table('profiles').select('*').eq('telegram_id', telegram_id))
             if response.data:
                 return response.data[0]
             return None
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при получении пользователя: {e}")
             return None
 
+    async def list_referral_codes(self, since: Optional[str] = None, page_size: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Загружает реферальные коды постранично (для прогрева индекса кодов).
+        Ошибки не перехватываются: неполный список кодов нельзя использовать для отклонения кодов.
+        Читает сервисным клиентом: RLS profiles скрывает от anon-ключа чужие строки.
+        """
+        rows = []
+        offset = 0
+        while True:
+            query = self.service_client.table('profiles').select('referral_code, created_at').not_.is_('referral_code', 'null')
+            if since:
+                query = query.gte('created_at', since)
+            response = await self._execute(query.order('created_at').range(offset, offset + page_size - 1))
+            rows.extend(response.data)
+            if len(response.data) < page_size:
+                return rows
+            offset += page_size
+
+    async def list_telegram_ids(self, after: int, limit: int) -> List[int]:
+        """Возвращает следующую страницу telegram_id (по возрастанию, больше after)"""
+        response = await self._execute(
+            self.service_client.table('profiles').select('telegram_id')
+            .gt('telegram_id', after).order('telegram_id').limit(limit)
+        )
+        return [row['telegram_id'] for row in response.data]
+
     async def get_user_by_referral_code(self, referral_code: str) -> Optional[Dict[str, Any]]:
         """Получает пользователя по реферальному коду"""
         try:
-            response = self.client.table('profiles').select('*').eq('referral_code', referral_code.upper()).execute()
+            response = await self._execute(self.client.table('profiles').select('*').eq('referral_code', referral_code.upper()))
             if response.data:
                 return response.data[0]
             return None
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при получении пользователя по реф. коду: {e}")
             return None
@@ -70,10 +125,12 @@ class SupabaseClient:
     async def create_user(self, telegram_id: int, first_name: str, last_name: str = None,
                          username: str = None, avatar_url: str = None, referral_code: str = None,
                          referred_by: str = None) -> Optional[Dict[str, Any]]:
-        """Создает нового пользователя через прямой вызов Supabase с сервисным ключом"""
+        """
+        Создает нового пользователя одним вызовом RPC функции register_telegram_user.
+        Поиск реферера, профиль, связанные записи, реферальная связь и статистика
+        пригласившего создаются на сервере в одной транзакции.
+        """
         try:
-            new_id = str(uuid.uuid4())
-
             # Генерируем реферальный код
             def generate_referral_code(telegram_id):
                 chars = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
@@ -84,91 +141,21 @@ class SupabaseClient:
                     code += chars[char_index]
                 return code
 
-            new_referral_code = generate_referral_code(telegram_id)
-
-            # Найдем реферера по реферальному коду, если он предоставлен
-            referrer_id = None
-            if referral_code:
-                response = self.service_client.table('profiles').select('id').eq('referral_code', referral_code.upper()).execute()
-                if response.data:
-                    referrer_id = response.data[0]['id']
-
-            # Подготовим данные пользователя
-            user_data = {
-                'id': new_id,
-                'telegram_id': telegram_id,
-                'telegram_username': username,
-                'first_name': first_name,
-                'last_name': last_name,
-                'avatar_url': avatar_url,
-                'referral_code': new_referral_code,
-                'referred_by': referrer_id
-            }
-
-            # Попробуем вставить пользователя
-            response = self.service_client.table('profiles').insert(user_data).execute()
-
-            if response.data:
-                user_id = response.data[0]['id']
-
-                # Создаем связанные записи
-                # Баланс
-                self.service_client.table('balances').insert({
-                    'user_id': user_id,
-                    'internal_balance': 0,
-                    'external_balance': 0,
-                    'total_earned': 0,
-                    'total_withdrawn': 0
-                }).execute()
-
-                # Статистика пользователя
-                self.service_client.table('user_stats').insert({
-                    'user_id': user_id,
-                    'total_logins': 1,
-                    'last_login_at': 'now()'
-                }).execute()
-
-                # Статистика рефералов
-                self.service_client.table('referral_stats').insert({
-                    'user_id': user_id,
-                    'total_referrals': 0,
-                    'total_earnings': 0
-                }).execute()
-
-                # Роль пользователя
-                self.service_client.table('user_roles').insert({
-                    'user_id': user_id,
-                    'role': 'user'
-                }).execute()
-
-                # Если есть реферер, создаем запись о реферале
-                if referrer_id:
-                    self.service_client.table('referrals').insert({
-                        'referrer_id': referrer_id,
-                        'referred_id': user_id,
-                        'level': 1,
-                        'is_active': True
-                    }).execute()
-
-                    # Обновляем статистику реферала у пригласившего
-                    try:
-                        # Получаем текущую статистику
-                        stats_response = self.service_client.table('referral_stats').select('*').eq('user_id', referrer_id).execute()
-                        if stats_response.data:
-                            current_stats = stats_response.data[0]
-                            new_total_referrals = current_stats.get('total_referrals', 0) + 1
-                            new_level_1_count = current_stats.get('level_1_count', 0) + 1
-
-                            # Обновляем статистику
-                            self.service_client.table('referral_stats').update({
-                                'total_referrals': new_total_referrals,
-                                'level_1_count': new_level_1_count
-                            }).eq('user_id', referrer_id).execute()
-                    except Exception as e:
-                        print(f"Ошибка при обновлении статистики реферала: {e}")
-
-                return response.data[0]
-            return None
+            response = await self._execute(self.service_client.rpc('register_telegram_user', {
+                'p_telegram_id': telegram_id,
+                'p_first_name': first_name,
+                'p_last_name': last_name,
+                'p_username': username,
+                'p_avatar_url': avatar_url,
+                'p_referral_code': referral_code,
+                'p_new_referral_code': generate_referral_code(telegram_id)
+            }))
+
+            if isinstance(response.data, list):
+                return response.data[0] if response.data else None
+            return response.data
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при создании пользователя: {e}")
             return None
@@ -176,28 +163,32 @@ class SupabaseClient:
     async def _create_related_records(self, user_id: str):
         """Заглушка - все записи создаются через RPC функцию register_telegram_user"""
         # Эта функция больше не нужна, так как все записи создаются через RPC функцию
+        # (см. supabase/migrations/0005_register_telegram_user.sql)
         pass
 
-    async def update_user_login_stats(self, user_id: str):
-        """Обновляет статистику входа пользователя"""
+    async def increment_counters(self, table: str, user_id: str, counters: Dict[str, int]) -> bool:
+        """Атомарно увеличивает счетчики статистики одним вызовом RPC increment_counters"""
         try:
-            # Получаем текущую статистику
-            stats_response = self.service_client.table('user_stats').select('total_logins').eq('user_id', user_id).execute()
-            if stats_response.data:
-                current_logins = stats_response.data[0].get('total_logins', 0)
-                
-                stats_data = {
-                    'total_logins': current_logins + 1,
-                    'last_login_at': 'now()'
-                }
-                self.service_client.table('user_stats').update(stats_data).eq('user_id', user_id).execute()
+            await self._execute(self.service_client.rpc('increment_counters', {
+                'p_table': table,
+                'p_user_id': user_id,
+                'p_increments': counters
+            }))
+            return True
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            print(f"Ошибка при обновлении статистики входа: {e}")
+            print(f"Ошибка при увеличении счетчиков {table}: {e}")
+            return False
+
+    async def update_user_login_stats(self, user_id: str):
+        """Обновляет статистику входа пользователя"""
+        await self.increment_counters('user_stats', user_id, {'total_logins': 1})
 
     async def get_referral_stats(self, user_id: str) -> Dict[str, Any]:
         """Получает статистику по рефералам пользователя"""
         try:
-            response = self.client.table('referral_stats').select('*').eq('user_id', user_id).execute()
+            response = await self._execute(self.client.table('referral_stats').select('*').eq('user_id', user_id))
             if response.data:
                 return response.data[0]
             return {
@@ -208,6 +199,8 @@ class SupabaseClient:
                 'level_5_count': 0,
                 'total_referrals': 0
             }
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при получении статистики рефералов: {e}")
             return {
@@ -219,6 +212,14 @@ class SupabaseClient:
                 'total_referrals': 0
             }
 
+    async def rebuild_referral_stats(self):
+        """Пересчитывает счетчики referral_stats всех пользователей (RPC rebuild_referral_stats)"""
+        await self._execute(self.service_client.rpc('rebuild_referral_stats', {}))
+
+    async def backfill_referral_edges(self):
+        """Дописывает связи со всеми предками для существующих пользователей (RPC backfill_referral_edges)"""
+        await self._execute(self.service_client.rpc('backfill_referral_edges', {}))
+
     async def create_referral_record(self, referrer_id: str, referred_id: str, level: int = 1):
         """Создает запись о реферале"""
         try:
@@ -228,17 +229,21 @@ class SupabaseClient:
                 'level': level,
                 'is_active': True
             }
-            self.service_client.table('referrals').insert(referral_data).execute()
+            await self._execute(self.service_client.table('referrals').insert(referral_data))
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при создании реферальной записи: {e}")
 
     async def get_user_by_referral_code(self, referral_code: str) -> Optional[Dict[str, Any]]:
         """Получает пользователя по реферальному коду"""
         try:
-            response = self.client.table('profiles').select('id, telegram_id, first_name').eq('referral_code', referral_code.upper()).execute()
+            response = await self._execute(self.client.table('profiles').select('id, telegram_id, first_name').eq('referral_code', referral_code.upper()))
             if response.data:
                 return response.data[0]
             return None
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при поиске пользователя по реферальному коду: {e}")
             return None
@@ -55,3 +55,15 @@ MESSAGE_WELCOME_BACK = f"""\
 
 {EMOJI['MENU']} Вот ваше главное меню:
 """
+
+MESSAGE_TOO_MANY_REQUESTS = f"""\
+{EMOJI['WARNING']} Слишком много запросов
+
+Пожалуйста, подождите {{retry_after}} сек. и попробуйте снова.
+"""
+
+MESSAGE_SERVICE_UNAVAILABLE = f"""\
+{EMOJI['WARNING']} Сервис временно недоступен
+
+Мы уже работаем над этим. Пожалуйста, попробуйте через {{retry_after}} сек.
+"""
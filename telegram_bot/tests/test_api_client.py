@@ -0,0 +1,124 @@
+import asyncio
+
+from telegram_bot.services.api_client import ApiClient
+from telegram_bot.services.referral_codes import ReferralCodeIndex
+
+
+def make_client(codes):
+    client = ApiClient()
+    # Общий кэш профилей backend: invalidate_profile() сбрасывает именно его
+    client.profile_cache.clear()
+    client.referral_codes = ReferralCodeIndex(
+        cache_size=100, cache_ttl=60, negative_ttl=60,
+        bloom_capacity=1000, bloom_error_rate=0.001, refresh_interval=0
+    )
+
+    async def loader(since):
+        return [(code, "2024-01-01") for code in codes]
+
+    asyncio.run(client.referral_codes.warm(loader))
+    client.requests = []
+
+    async def request(endpoint, method, path, idempotent=False, **kwargs):
+        client.requests.append((endpoint, kwargs.get("json")))
+        return 200, {"profile": {"telegram_id": 1, "referral_code": "OWN001"}}
+
+    client._request = request
+    return client
+
+
+def test_register_user_sends_code_missing_from_bloom_filter():
+    client = make_client(["ABC123"])
+    # Код создан после обновления фильтра - регистрация все равно передает его backend
+    asyncio.run(client.register_user(telegram_id=1, first_name="Test", referral_code="NEW001"))
+
+    assert client.requests == [("users.register", {
+        "telegram_id": 1, "first_name": "Test", "username": None, "referral_code": "NEW001"
+    })]
+
+
+def test_register_user_drops_confirmed_invalid_code():
+    client = make_client(["ABC123"])
+    client.referral_codes.remember_invalid("BAD001")
+    asyncio.run(client.register_user(telegram_id=1, first_name="Test", referral_code="BAD001"))
+
+    assert client.requests[0][1]["referral_code"] is None
+
+
+def test_verify_referral_code_missing_from_bloom_filter_asks_backend():
+    client = make_client(["ABC123"])
+
+    async def request(endpoint, method, path, idempotent=False, **kwargs):
+        client.requests.append((endpoint, kwargs.get("json")))
+        return 200, {"valid": True, "user": {"id": "owner"}}
+
+    client._request = request
+    # Код создан Node.js backend после обновления фильтра
+    result = asyncio.run(client.verify_referral_code("NEW001"))
+
+    assert result == {"valid": True, "user": {"id": "owner"}}
+    assert client.requests == [("referral_code.verify", {"referral_code": "NEW001"})]
+    assert "NEW001" in client.referral_codes.bloom
+
+
+def test_verify_referral_code_rejects_confirmed_invalid_locally():
+    client = make_client(["ABC123"])
+    client.referral_codes.remember_invalid("BAD001")
+
+    assert asyncio.run(client.verify_referral_code("BAD001")) == {"valid": False}
+    assert client.requests == []
+
+
+def test_get_user_without_cache_reads_backend():
+    from telegram_bot.services.profile_cache import profile_cache
+
+    client = make_client([])
+    backend_profile = {"telegram_id": 5, "email": None}
+
+    async def request(endpoint, method, path, idempotent=False, **kwargs):
+        client.requests.append((endpoint, path))
+        return 200, {"profile": dict(backend_profile)}
+
+    client._request = request
+
+    async def scenario():
+        assert (await client.get_user(5))["email"] is None
+        backend_profile["email"] = "user@example.com"
+        # Кэшированный профиль устарел: email привязан на сайте
+        assert (await client.get_user(5))["email"] is None
+        assert (await client.get_user(5, use_cache=False))["email"] == "user@example.com"
+
+    asyncio.run(scenario())
+    assert len(client.requests) == 2
+    # Профиль backend не попадает в кэш Database (другая форма значения)
+    assert profile_cache.get(5) is profile_cache.MISSING
+
+
+def test_registration_during_fetch_does_not_cache_stale_profile():
+    client = make_client([])
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def request(endpoint, method, path, idempotent=False, **kwargs):
+        client.requests.append(endpoint)
+        if endpoint == "users.get":
+            if len(client.requests) == 1:
+                started.set()
+                await release.wait()
+                return 200, {"profile": {"telegram_id": 9, "referral_code": None}}
+            return 200, {"profile": {"telegram_id": 9, "referral_code": "OWN009"}}
+        return 200, {"profile": {"telegram_id": 9, "referral_code": "OWN009"}}
+
+    client._request = request
+
+    async def scenario():
+        stale_read = asyncio.create_task(client.get_user(9))
+        await started.wait()
+        await client.register_user(telegram_id=9, first_name="Test")
+        release.set()
+        assert (await stale_read)["referral_code"] is None
+        # Ответ, начатый до регистрации, не закэширован - следующее чтение идет в backend
+        return await client.get_user(9)
+
+    assert asyncio.run(scenario())["referral_code"] == "OWN009"
+    assert client.requests == ["users.get", "users.register", "users.get"]
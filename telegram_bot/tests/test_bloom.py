@@ -0,0 +1,32 @@
+from telegram_bot.utils.bloom import BloomFilter
+
+
+def test_added_keys_are_always_found():
+    bloom = BloomFilter(capacity=1000)
+    keys = [f"CODE{i:05d}" for i in range(1000)]
+    bloom.update(keys)
+
+    assert all(key in bloom for key in keys)
+    assert len(bloom) == 1000
+    assert not bloom.saturated
+
+
+def test_false_positive_rate_stays_near_target():
+    bloom = BloomFilter(capacity=5000, error_rate=0.01)
+    bloom.update(f"CODE{i:05d}" for i in range(5000))
+    false_positives = sum(f"MISS{i:05d}" in bloom for i in range(20000))
+
+    assert false_positives / 20000 < 0.02
+
+
+def test_saturated_after_capacity():
+    bloom = BloomFilter(capacity=2)
+    bloom.update(["A", "B", "C"])
+
+    assert bloom.saturated
+
+
+def test_empty_filter_contains_nothing():
+    bloom = BloomFilter(capacity=0)
+
+    assert "CODE" not in bloom
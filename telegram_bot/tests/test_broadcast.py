@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+# Модуль DB API создает глобальный клиент при импорте, а клиент требует ключ
+os.environ.setdefault("DB_API_KEY", "test-key")
+
+from telegram_bot.database.database_manager import Database  # noqa: E402
+from telegram_bot.db_api_client import DBAPIClient  # noqa: E402
+from telegram_bot.services import broadcast  # noqa: E402
+from telegram_bot.services.broadcast import BroadcastEngine  # noqa: E402
+from telegram_bot.utils.deadline import deadline_scope  # noqa: E402
+
+
+class FakeBot:
+    def __init__(self):
+        self.copied = []
+        self.reports = []
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        self.copied.append(chat_id)
+
+    async def send_message(self, chat_id, text):
+        self.reports.append(text)
+
+
+def slow_db_api_database(telegram_ids, delay):
+    """Database в режиме DB API; каждая страница telegram_id отдается с задержкой"""
+    client = DBAPIClient()
+
+    async def request(payload):
+        await asyncio.sleep(delay)
+        after = payload["gte"]["telegram_id"]
+        return [{"telegram_id": i} for i in telegram_ids if i >= after][:payload["limit"]]
+
+    client._request = request
+    database = Database()
+    database.use_api_client = False
+    database.use_supabase = False
+    database.use_db_api = True
+    database.db_api_client = client
+    return database
+
+
+def test_broadcast_outlives_handler_deadline(monkeypatch, tmp_path):
+    monkeypatch.setattr(broadcast, "database", slow_db_api_database(range(1, 11), delay=0.02))
+    monkeypatch.setattr(broadcast, "BROADCAST_CURSOR_PREFETCH", 2)
+    engine = BroadcastEngine(workers=2, queue_size=4, state_path=str(tmp_path / "state.json"),
+                             checkpoint_interval=60)
+    bot = FakeBot()
+
+    async def main():
+        # Как в обработчике /broadcast: рассылка запускается внутри бюджета обновления
+        with deadline_scope(0.03):
+            job = engine.start(bot, admin_id=1, from_chat_id=1, message_id=1)
+        await engine._task
+        return job
+
+    job = asyncio.run(main())
+    assert job.status == "finished"
+    assert sorted(bot.copied) == list(range(1, 11))
+    assert job.checkpoint == 10
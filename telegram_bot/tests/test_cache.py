@@ -0,0 +1,76 @@
+import pytest
+
+from telegram_bot.utils import cache
+from telegram_bot.utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    profiles = TTLCache(maxsize=10, ttl=60)
+    profiles.set(1, "profile")
+    profiles.set(2, "short", ttl=5)
+    clock.now += 10
+
+    assert profiles.get(1) == "profile"
+    assert profiles.get(2) is TTLCache.MISSING
+    clock.now += 60
+    assert profiles.get(1, None) is None
+    assert len(profiles) == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    profiles = TTLCache(maxsize=2, ttl=60)
+    profiles.set(1, "a")
+    profiles.set(2, "b")
+    profiles.get(1)
+    profiles.set(3, "c")
+
+    assert profiles.get(2) is TTLCache.MISSING
+    assert profiles.get(1) == "a" and profiles.get(3) == "c"
+    assert profiles.stats()['evictions'] == 1
+
+
+def test_write_from_load_started_before_invalidation_is_skipped(clock):
+    profiles = TTLCache(maxsize=10, ttl=60)
+    version = profiles.version
+    profiles.invalidate(1)
+    profiles.set(1, "stale", version=version)
+
+    assert profiles.get(1) is TTLCache.MISSING
+    profiles.set(1, "fresh", version=profiles.version)
+    assert profiles.get(1) == "fresh"
+
+
+def test_zero_size_cache_stores_nothing(clock):
+    profiles = TTLCache(maxsize=0, ttl=60)
+    profiles.set(1, "profile")
+
+    assert profiles.get(1) is TTLCache.MISSING
+
+
+def test_stats_count_hits_misses_and_invalidations(clock):
+    profiles = TTLCache(maxsize=10, ttl=60, name="profiles")
+    profiles.set(1, "profile")
+    profiles.get(1)
+    profiles.get(2)
+    profiles.invalidate(1)
+    profiles.invalidate(2)
+
+    assert profiles.stats() == {
+        'name': "profiles", 'size': 0, 'maxsize': 10,
+        'hits': 1, 'misses': 1, 'evictions': 0, 'invalidations': 1
+    }
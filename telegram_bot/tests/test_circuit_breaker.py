@@ -0,0 +1,112 @@
+import pytest
+
+from telegram_bot.services import circuit_breaker
+from telegram_bot.services.circuit_breaker import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    return clock
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(window_size=10, min_calls=4, failure_rate=0.5, slow_call_duration=1.0,
+                   open_duration=30, half_open_calls=1)
+    options.update(overrides)
+    return CircuitBreaker("users.get", **options)
+
+
+def call(breaker, success=True, duration=0.1):
+    assert breaker.allow()
+    breaker.record(success, duration)
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        call(breaker, success=False)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_opens_at_failure_rate_and_rejects(clock):
+    breaker = make_breaker()
+    call(breaker)
+    call(breaker)
+    call(breaker, success=False)
+    call(breaker, success=False)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected_total == 1
+    assert breaker.retry_after == 30
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, duration=1.5)
+
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_old_failures_leave_the_window(clock):
+    breaker = make_breaker(window_size=4, min_calls=4, failure_rate=0.75)
+    call(breaker, success=False)
+    call(breaker, success=False)
+    for _ in range(4):
+        call(breaker)
+    call(breaker, success=False)
+    call(breaker, success=False)
+
+    assert breaker.stats()['window_failures'] == 2
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_successful_probe_closes(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, success=False)
+    clock.now += 30
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Пока проба выполняется, остальные вызовы отклоняются
+    assert not breaker.allow()
+    breaker.record(True, 0.1)
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()['window_calls'] == 0
+
+
+def test_failed_probe_reopens(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, success=False)
+    clock.now += 30
+    call(breaker, success=False)
+
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_total == 2
+    assert not breaker.allow()
+
+
+def test_released_probe_frees_the_slot(clock):
+    breaker = make_breaker()
+    for _ in range(4):
+        call(breaker, success=False)
+    clock.now += 30
+
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.allow()
@@ -0,0 +1,146 @@
+import asyncio
+import os
+
+import pytest
+
+# Модуль создает глобальный клиент при импорте, а клиент требует ключ
+os.environ.setdefault("DB_API_KEY", "test-key")
+
+from telegram_bot.database.database_manager import Database, UnsupportedOperationError  # noqa: E402
+from telegram_bot.db_api_client import DBAPIClient, DBAPIError  # noqa: E402
+
+
+class FakeTransport:
+    """Подменяет DBAPIClient._post: выполняет select по списку строк с учетом gte/offset/limit"""
+
+    def __init__(self, rows, honour_paging=True):
+        self.rows = rows
+        self.honour_paging = honour_paging
+        self.payloads = []
+
+    async def __call__(self, payload):
+        self.payloads.append(payload)
+        rows = self.rows
+        if not self.honour_paging:
+            return [dict(row) for row in rows[:1000]]
+        for column, value in (payload.get("gte") or {}).items():
+            rows = [row for row in rows if row[column] >= value]
+        start = payload.get("offset", 0)
+        return [dict(row) for row in rows[start:start + payload["limit"]]]
+
+
+def make_client(transport) -> DBAPIClient:
+    client = DBAPIClient()
+    client._post = transport
+    return client
+
+
+def profiles(count):
+    return [{"referral_code": f"CODE{i:05d}", "created_at": f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}"}
+            for i in range(count)]
+
+
+def test_list_referral_codes_pages_through_table():
+    transport = FakeTransport(profiles(2500))
+    rows = asyncio.run(make_client(transport).list_referral_codes(page_size=1000))
+
+    assert len(rows) == 2500
+    assert [p["offset"] for p in transport.payloads] == [0, 1000, 2000]
+    assert all(p["columns"] == "referral_code, created_at" for p in transport.payloads)
+
+
+def test_list_referral_codes_filters_by_since():
+    transport = FakeTransport(profiles(100))
+    rows = asyncio.run(make_client(transport).list_referral_codes(since="2024-01-01T00:01:30", page_size=1000))
+
+    assert [row["referral_code"] for row in rows] == [f"CODE{i:05d}" for i in range(90, 100)]
+    assert transport.payloads[0]["gte"] == {"created_at": "2024-01-01T00:01:30"}
+
+
+def test_list_referral_codes_refuses_function_without_paging():
+    transport = FakeTransport(profiles(3000), honour_paging=False)
+    with pytest.raises(Exception, match="постраничную"):
+        asyncio.run(make_client(transport).list_referral_codes(page_size=1000))
+
+
+class ProvisionTransport:
+    """Отвечает на provision_user заданной ошибкой, остальные действия записывает"""
+
+    def __init__(self, error):
+        self.error = error
+        self.actions = []
+
+    async def __call__(self, payload):
+        self.actions.append(payload["action"])
+        if payload["action"] == "provision_user":
+            raise self.error
+        return [{"id": "new-id", **(payload.get("data") or {})}]
+
+
+@pytest.mark.parametrize("error", [
+    DBAPIError(400, 'duplicate key value violates unique constraint "profiles_telegram_id_key"'),
+    DBAPIError(502, "Bad Gateway"),
+    asyncio.TimeoutError(),
+])
+def test_create_user_does_not_fall_back_on_provision_errors(error):
+    transport = ProvisionTransport(error)
+    result = asyncio.run(make_client(transport).create_user({"telegram_id": 1, "referred_by": "ref"}))
+
+    assert result is None
+    assert transport.actions == ["provision_user"]
+
+
+def test_create_user_falls_back_for_function_without_provision_user():
+    transport = ProvisionTransport(DBAPIError(400, "Unknown action: provision_user"))
+    result = asyncio.run(make_client(transport).create_user({"telegram_id": 1, "referred_by": "ref"}))
+
+    assert result["id"] == "new-id"
+    assert transport.actions[0] == "provision_user"
+    assert transport.actions.count("insert") == 6
+
+
+def db_api_database(client) -> Database:
+    database = Database()
+    database.use_api_client = False
+    database.use_supabase = False
+    database.use_db_api = True
+    database.db_api_client = client
+    return database
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_iter_telegram_ids_pages_by_key():
+    transport = FakeTransport([{"telegram_id": i} for i in range(1, 2501)])
+    database = db_api_database(make_client(transport))
+    ids = asyncio.run(collect(database.iter_telegram_ids(after=10, prefetch=1000)))
+
+    assert ids == list(range(11, 2501))
+    assert [p["gte"] for p in transport.payloads] == [{"telegram_id": 11}, {"telegram_id": 1011}, {"telegram_id": 2011}]
+    assert all(p["columns"] == "telegram_id" and p["order"] == "telegram_id" for p in transport.payloads)
+
+
+def test_list_telegram_ids_refuses_function_without_paging():
+    transport = FakeTransport([{"telegram_id": i} for i in range(1, 100)], honour_paging=False)
+    with pytest.raises(Exception, match="постраничную"):
+        asyncio.run(make_client(transport).list_telegram_ids(after=10, limit=50))
+
+
+def test_rebuild_reports_outdated_function():
+    async def transport(payload):
+        raise DBAPIError(400, f"Unknown action: {payload['action']}")
+
+    database = db_api_database(make_client(transport))
+    with pytest.raises(Exception, match="обновите функцию db-api"):
+        asyncio.run(database.rebuild_referral_stats())
+
+
+def test_bulk_operations_are_rejected_in_api_client_mode():
+    database = Database()
+    database.use_api_client = True
+
+    assert not database.supports_bulk_operations
+    with pytest.raises(UnsupportedOperationError):
+        asyncio.run(collect(database.iter_telegram_ids()))
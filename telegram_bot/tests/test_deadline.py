@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from telegram_bot.middlewares.deadline import DeadlineMiddleware
+from telegram_bot.utils.deadline import (
+    DeadlineExceeded, current_deadline, deadline_scope, run_with_deadline, timeout_for
+)
+
+
+def test_timeout_without_budget_is_default():
+    assert current_deadline() is None
+    assert timeout_for(5) == 5
+    assert timeout_for(None) is None
+
+
+def test_timeout_is_cut_to_remaining_budget():
+    with deadline_scope(0.5) as deadline:
+        assert 0 < timeout_for(10) <= 0.5
+        assert timeout_for(0.1) == 0.1
+        assert not deadline.exceeded
+
+
+def test_exhausted_budget_raises_and_marks_deadline():
+    with deadline_scope(0) as deadline:
+        with pytest.raises(DeadlineExceeded):
+            timeout_for(5)
+        assert deadline.exceeded
+
+
+def test_run_with_deadline_cancels_call_after_budget():
+    async def main():
+        with deadline_scope(0.05) as deadline:
+            with pytest.raises(DeadlineExceeded):
+                await run_with_deadline(asyncio.sleep(1))
+            return deadline.exceeded
+
+    assert asyncio.run(main())
+
+
+def test_run_with_deadline_keeps_default_timeout_error():
+    async def main():
+        with deadline_scope(5) as deadline:
+            with pytest.raises(asyncio.TimeoutError) as error:
+                await run_with_deadline(asyncio.sleep(1), default_timeout=0.05)
+            assert not isinstance(error.value, DeadlineExceeded)
+            return deadline.exceeded
+
+    assert not asyncio.run(main())
+
+
+def test_budget_is_shared_by_sequential_calls():
+    async def main():
+        with deadline_scope(0.1):
+            await run_with_deadline(asyncio.sleep(0.06))
+            with pytest.raises(DeadlineExceeded):
+                await run_with_deadline(asyncio.sleep(0.06))
+
+    asyncio.run(main())
+
+
+def test_middleware_counts_exceeded_handlers():
+    middleware = DeadlineMiddleware(timeout=0.05)
+
+    async def slow_handler(event, data):
+        try:
+            await run_with_deadline(asyncio.sleep(1))
+        except DeadlineExceeded:
+            return "handled"
+
+    data = {"handler": SimpleNamespace(callback=slow_handler)}
+    assert asyncio.run(middleware(slow_handler, None, data)) == "handled"
+    assert middleware.stats()['exceeded_by_handler'] == {"slow_handler": 1}
+    assert current_deadline() is None
@@ -0,0 +1,37 @@
+from telegram_bot.utils.histogram import Histogram
+
+
+def test_bucket_bounds_are_inclusive():
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for value in (0.005, 0.01, 0.05, 1.0, 3.0):
+        histogram.observe(value)
+
+    assert histogram.counts == [2, 1, 1, 1]
+    assert list(histogram.cumulative()) == [(0.01, 2), (0.1, 3), (1.0, 4), (float('inf'), 5)]
+    assert histogram.count == 5
+    assert abs(histogram.sum - 4.065) < 1e-9
+
+
+def test_quantiles_use_bucket_upper_bound():
+    histogram = Histogram(buckets=(0.01, 0.1, 1.0))
+    for _ in range(90):
+        histogram.observe(0.005)
+    for _ in range(9):
+        histogram.observe(0.5)
+    histogram.observe(2.0)
+
+    assert histogram.quantile(0.5) == 0.01
+    assert histogram.quantile(0.95) == 1.0
+    assert histogram.quantile(1.0) == float('inf')
+
+
+def test_empty_histogram_stats():
+    assert Histogram().stats() == {'count': 0, 'avg_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+
+
+def test_unsorted_buckets_are_sorted():
+    histogram = Histogram(buckets=(1.0, 0.1))
+    histogram.observe(0.5)
+
+    assert histogram.buckets == (0.1, 1.0)
+    assert histogram.counts == [0, 1, 0]
@@ -0,0 +1,101 @@
+import asyncio
+
+from telegram_bot.database.database_manager import Database
+from telegram_bot.database.login_stats import LoginStatsBuffer
+
+
+def make_buffer(callback) -> LoginStatsBuffer:
+    return LoginStatsBuffer(callback, flush_interval=60, max_pending=1000)
+
+
+def test_flush_merges_events_per_user():
+    batches = []
+
+    async def callback(batch):
+        batches.append(dict(batch))
+
+    buffer = make_buffer(callback)
+    buffer.record("a")
+    buffer.record("a")
+    buffer.record("b")
+    asyncio.run(buffer.flush())
+
+    assert batches == [{"a": 2, "b": 1}]
+    assert buffer.pending == 0
+    assert buffer.stats()["rows_flushed"] == 2
+
+
+def test_failed_flush_keeps_whole_batch():
+    async def callback(batch):
+        raise ConnectionError("db down")
+
+    buffer = make_buffer(callback)
+    buffer.record("a", 3)
+    asyncio.run(buffer.flush())
+    buffer.record("a")
+
+    assert buffer._pending == {"a": 4}
+    assert buffer.stats()["flush_errors"] == 1
+
+
+def test_partial_flush_keeps_only_unwritten_users():
+    async def callback(batch):
+        return {"b": batch["b"]}
+
+    buffer = make_buffer(callback)
+    buffer.record("a", 2)
+    buffer.record("b", 5)
+    asyncio.run(buffer.flush())
+
+    assert buffer._pending == {"b": 5}
+    assert buffer.stats()["rows_flushed"] == 1
+
+
+def test_database_flush_reports_failed_increments():
+    database = Database()
+    database.use_api_client = False
+    database.use_db_api = True
+    written = []
+
+    async def increment_counters(table, user_id, counters):
+        if user_id == "bad":
+            raise Exception("DB API не увеличил счетчики")
+        written.append((user_id, counters["total_logins"]))
+
+    database.increment_counters = increment_counters
+
+    failed = asyncio.run(database._flush_login_stats({"ok": 2, "bad": 1}))
+    assert failed == {"bad": 1}
+    assert written == [("ok", 2)]
+
+
+class FakeCounterClient:
+    def __init__(self, ok: bool):
+        self.ok = ok
+        self.calls = []
+
+    async def increment(self, table, user_id, counters):
+        self.calls.append((table, user_id, counters))
+        return self.ok
+
+    increment_counters = increment
+
+
+def test_increment_counters_uses_instance_client_and_raises_on_failure():
+    database = Database()
+    database.use_api_client = False
+    database.use_db_api = False
+    database.use_supabase = True
+    database.supabase_client = FakeCounterClient(ok=True)
+    asyncio.run(database.increment_counters('user_stats', 'u1', {'total_logins': 2}))
+    assert database.supabase_client.calls == [('user_stats', 'u1', {'total_logins': 2})]
+
+    database.use_supabase = False
+    database.use_db_api = True
+    database.db_api_client = FakeCounterClient(ok=False)
+    try:
+        asyncio.run(database.increment_counters('user_stats', 'u1', {'total_logins': 1}))
+    except Exception as e:
+        assert "DB API" in str(e)
+    else:
+        raise AssertionError("ожидалось исключение")
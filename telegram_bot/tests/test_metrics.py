@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from telegram_bot.metrics.registry import Gauge, MetricsRegistry, _format_value
+from telegram_bot.utils.histogram import Histogram
+
+
+@pytest.mark.parametrize("value, text", [
+    (3, "3"),
+    (2.0, "2"),
+    (0.25, "0.25"),
+    (True, "1"),
+    (False, "0"),
+    (float('inf'), "+Inf"),
+])
+def test_format_value(value, text):
+    assert _format_value(value) == text
+
+
+def test_counter_and_gauge_render_with_labels():
+    registry = MetricsRegistry()
+    requests = registry.counter("bot_requests_total", "Requests", ("endpoint",))
+    requests.labels("users.get").inc()
+    requests.labels("users.get").inc(2)
+    requests.labels('say "hi"\n').inc()
+    in_flight = registry.gauge("bot_in_flight", "In flight")
+    in_flight.labels().set(4)
+
+    assert asyncio.run(registry.render()) == (
+        "# HELP bot_requests_total Requests\n"
+        "# TYPE bot_requests_total counter\n"
+        'bot_requests_total{endpoint="users.get"} 3\n'
+        'bot_requests_total{endpoint="say \\"hi\\"\\n"} 1\n'
+        "# HELP bot_in_flight In flight\n"
+        "# TYPE bot_in_flight gauge\n"
+        "bot_in_flight 4\n"
+    )
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    registry = MetricsRegistry()
+    duration = registry.histogram("bot_call_seconds", "Call time", ("operation",), buckets=(0.1, 1.0))
+    child = duration.labels("get")
+    child.observe(0.05)
+    child.observe(0.5)
+    child.observe(2)
+
+    assert asyncio.run(registry.render()).splitlines()[2:] == [
+        'bot_call_seconds_bucket{operation="get",le="0.1"} 1',
+        'bot_call_seconds_bucket{operation="get",le="1"} 2',
+        'bot_call_seconds_bucket{operation="get",le="+Inf"} 3',
+        'bot_call_seconds_sum{operation="get"} 2.55',
+        'bot_call_seconds_count{operation="get"} 3',
+    ]
+
+
+def test_labels_count_must_match():
+    registry = MetricsRegistry()
+    requests = registry.counter("bot_requests_total", "Requests", ("endpoint",))
+
+    with pytest.raises(ValueError):
+        requests.labels()
+    with pytest.raises(ValueError):
+        registry.gauge("bot_requests_total", "Duplicate")
+
+
+def test_collectors_are_rendered_and_failures_isolated():
+    registry = MetricsRegistry()
+
+    def broken():
+        raise RuntimeError("storage unavailable")
+
+    async def queue_depth():
+        gauge = Gauge("bot_queue_depth", "Queue depth")
+        gauge.labels().set(7)
+        return [gauge]
+
+    def published():
+        # Готовая гистограмма публикуется без копирования
+        histogram = Histogram(buckets=(1.0,))
+        histogram.observe(0.5)
+        metric = MetricsRegistry().histogram("bot_query_seconds", "Query time", ("query",))
+        metric.add(("profile",), histogram)
+        return [metric]
+
+    registry.add_collector(broken)
+    registry.add_collector(queue_depth)
+    registry.add_collector(published)
+    lines = asyncio.run(registry.render()).splitlines()
+
+    assert "bot_queue_depth 7" in lines
+    assert 'bot_query_seconds_bucket{query="profile",le="1"} 1' in lines
+    assert 'bot_query_seconds_count{query="profile"} 1' in lines
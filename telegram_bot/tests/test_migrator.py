@@ -0,0 +1,173 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from telegram_bot.database.migrator import (
+    MIGRATIONS_DIR, SCHEMA_MIGRATIONS_DDL, Migration, MigrationRunner, load_migrations, split_statements
+)
+
+
+def test_split_statements_drops_comments_and_empty_parts():
+    sql = """-- migrate:no-transaction
+-- комментарий
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON a(x);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_b ON b(y);
+"""
+    assert split_statements(sql) == [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON a(x)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_b ON b(y)"
+    ]
+
+
+def test_load_migrations_reads_versions_and_transaction_mode(tmp_path):
+    (tmp_path / "0003_second.sql").write_text("ALTER TABLE a ADD COLUMN y INT;", encoding="utf-8")
+    (tmp_path / "0002_first.sql").write_text("-- migrate:no-transaction\nCREATE INDEX CONCURRENTLY i ON a(x);",
+                                            encoding="utf-8")
+    migrations = load_migrations(tmp_path)
+
+    assert [m.title for m in migrations] == ["0001_baseline", "0002_first", "0003_second"]
+    assert [m.transactional for m in migrations] == [True, False, True]
+    assert migrations[0].apply is not None
+
+
+def test_load_migrations_rejects_bad_file_name(tmp_path):
+    (tmp_path / "add_column.sql").write_text("SELECT 1", encoding="utf-8")
+    with pytest.raises(ValueError, match="add_column.sql"):
+        load_migrations(tmp_path)
+
+
+def test_shipped_migrations_have_unique_versions():
+    runner = MigrationRunner(load_migrations(MIGRATIONS_DIR))
+
+    assert runner.latest_version == runner.migrations[-1].version
+
+
+def test_duplicate_versions_are_rejected():
+    with pytest.raises(ValueError):
+        MigrationRunner([Migration(2, "a", sql="SELECT 1"), Migration(2, "b", sql="SELECT 2")])
+
+
+class FakeConnection:
+    def __init__(self, applied):
+        self.applied = set(applied)
+        self.executed = []
+        self.in_transaction = False
+
+    async def fetchval(self, query, *args):
+        return max(self.applied, default=0)
+
+    async def fetch(self, query, *args):
+        return [{'version': version} for version in sorted(self.applied)]
+
+    async def execute(self, query, *args):
+        if query.startswith("INSERT INTO schema_migrations"):
+            self.applied.add(args[0])
+        self.executed.append((query, self.in_transaction))
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.in_transaction = True
+        try:
+            yield
+        finally:
+            self.in_transaction = False
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.connection
+
+
+def make_runner():
+    return MigrationRunner([
+        Migration(1, "baseline", sql="CREATE TABLE a (x INT)"),
+        Migration(2, "index", sql="CREATE INDEX CONCURRENTLY i ON a(x); CREATE INDEX CONCURRENTLY j ON a(x)",
+                  transactional=False),
+        Migration(3, "column", sql="ALTER TABLE a ADD COLUMN y INT")
+    ])
+
+
+def test_migrate_applies_only_missing_versions():
+    connection = FakeConnection(applied={1})
+    applied = asyncio.run(make_runner().migrate(FakePool(connection)))
+
+    assert applied == [2, 3]
+    statements = [(query, in_transaction) for query, in_transaction in connection.executed
+                  if query != SCHEMA_MIGRATIONS_DDL and not query.startswith("SELECT pg_advisory")]
+    assert statements == [
+        ("CREATE INDEX CONCURRENTLY i ON a(x)", False),
+        ("CREATE INDEX CONCURRENTLY j ON a(x)", False),
+        ("INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", False),
+        ("ALTER TABLE a ADD COLUMN y INT", True),
+        ("INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", True)
+    ]
+    assert connection.executed[0][0] == "SELECT pg_advisory_lock($1)"
+    assert connection.executed[-1][0] == "SELECT pg_advisory_unlock($1)"
+
+
+def test_up_to_date_schema_takes_one_query():
+    connection = FakeConnection(applied={1, 2, 3})
+
+    assert asyncio.run(make_runner().migrate(FakePool(connection))) == []
+    assert connection.executed == []
+
+
+class IndexCheckConnection:
+    """Соединение, на котором обязательный индекс появляется только после миграций"""
+
+    def __init__(self, state):
+        self.state = state
+
+    async def fetch(self, query, *args):
+        if "to_regclass" in query and not self.state['migrated']:
+            return [{'name': name} for name in args[0]]
+        return []
+
+
+class IndexCheckPool:
+    def __init__(self, state):
+        self.connection = IndexCheckConnection(state)
+
+    async def acquire(self):
+        return self.connection
+
+    async def release(self, connection):
+        pass
+
+    async def close(self):
+        pass
+
+
+def test_migrator_recovers_database_without_required_index(monkeypatch):
+    from telegram_bot.database import database, database_manager, migrator
+
+    state = {'migrated': False, 'passes': 0}
+
+    async def create_pool(*args, **kwargs):
+        return IndexCheckPool(state)
+
+    async def migrate(pool):
+        state['passes'] += 1
+        state['migrated'] = True
+        return [1]
+
+    monkeypatch.setattr(database, "pool", None)
+    monkeypatch.setattr(database, "use_api_client", False)
+    monkeypatch.setattr(database, "use_db_api", False)
+    monkeypatch.setattr(database, "use_supabase", False)
+    monkeypatch.setattr(database_manager, "DATABASE_URL", "postgresql://localhost/test")
+    monkeypatch.setattr(database_manager.asyncpg, "create_pool", create_pool)
+    monkeypatch.setattr(database_manager.migration_runner, "migrate", migrate)
+
+    # Без миграций бот не запускается: индекса нет
+    with pytest.raises(Exception, match="uq_referral_stats_user_id"):
+        asyncio.run(database.connect(migrate=False))
+
+    asyncio.run(migrator.main())
+    assert state == {'migrated': True, 'passes': 1}
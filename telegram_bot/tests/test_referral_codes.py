@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from telegram_bot.services.referral_codes import ReferralCodeIndex
+
+
+def make_index(refresh_interval: float = 0) -> ReferralCodeIndex:
+    return ReferralCodeIndex(
+        cache_size=100, cache_ttl=60, negative_ttl=60,
+        bloom_capacity=1000, bloom_error_rate=0.001, refresh_interval=refresh_interval
+    )
+
+
+def loader_of(rows):
+    async def loader(since):
+        return rows
+    return loader
+
+
+def test_warm_loads_all_codes_into_filter():
+    index = make_index()
+    asyncio.run(index.warm(loader_of([("ABC123", "2024-01-01"), ("xyz789", "2024-01-02")])))
+
+    assert index.warmed
+    assert "ABC123" in index.bloom and "XYZ789" in index.bloom
+    assert "NOPE00" not in index.bloom
+
+
+def test_empty_load_does_not_enable_filter():
+    index = make_index()
+    asyncio.run(index.warm(loader_of([])))
+
+    assert not index.warmed
+
+
+def test_failed_warm_leaves_filter_off_and_refresh_retries():
+    calls = []
+
+    async def loader(since):
+        calls.append(since)
+        if len(calls) == 1:
+            raise ConnectionError("db down")
+        return [("ABC123", "2024-01-01")]
+
+    async def scenario():
+        index = make_index(refresh_interval=0.01)
+        with pytest.raises(ConnectionError):
+            await index.start(loader)
+        assert not index.warmed
+        await asyncio.sleep(0.05)
+        await index.stop()
+        return index
+
+    index = asyncio.run(scenario())
+    assert index.warmed
+    assert "ABC123" in index.bloom
+
+
+def test_confirmed_invalid_only_from_negative_cache():
+    index = make_index()
+    asyncio.run(index.warm(loader_of([("ABC123", "2024-01-01")])))
+
+    # Отсутствие в фильтре - не подтверждение: код мог появиться после последней загрузки
+    assert not index.is_confirmed_invalid("NEW001")
+    index.remember_invalid("new001")
+    assert index.is_confirmed_invalid("NEW001")
+    assert index.is_confirmed_invalid("  ")
+
+
+def test_code_found_by_source_is_added_to_filter():
+    index = make_index()
+    asyncio.run(index.warm(loader_of([("ABC123", "2024-01-01")])))
+    index.remember_invalid("NEW001")
+    index.remember_valid("new001", {"id": "owner"})
+
+    assert "NEW001" in index.bloom
+    assert not index.is_confirmed_invalid("NEW001")
+    assert index.get_owner("NEW001") == {"id": "owner"}
+    assert index.stats()["bloom_misses"] == 1
+
+
+def test_database_looks_up_code_missing_from_filter(monkeypatch):
+    import os
+    os.environ.setdefault("DB_API_KEY", "test-key")
+    from telegram_bot.database.database_manager import Database
+    from telegram_bot.db_api_client import db_api_client
+
+    lookups = []
+
+    async def get_user_by_referral_code(referral_code):
+        lookups.append(referral_code)
+        return {"id": "owner", "referral_code": referral_code}
+
+    monkeypatch.setattr(db_api_client, "get_user_by_referral_code", get_user_by_referral_code)
+    database = Database()
+    database.use_api_client = False
+    database.use_supabase = False
+    database.use_db_api = True
+    database.referral_codes = make_index()
+    asyncio.run(database.referral_codes.warm(loader_of([("ABC123", "2024-01-01")])))
+
+    # Код создан другим процессом после обновления фильтра
+    owner = asyncio.run(database.get_user_by_referral_code("NEW001"))
+
+    assert owner == {"id": "owner", "referral_code": "NEW001"}
+    assert lookups == ["NEW001"]
+    assert "NEW001" in database.referral_codes.bloom
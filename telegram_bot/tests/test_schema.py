@@ -0,0 +1,103 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from telegram_bot.database.schema import (
+    REFERRAL_STATS_MERGE_DUPLICATES, TABLES, Index, Table, plan_schema_changes, sync_schema
+)
+
+
+class FakeConnection:
+    """Каталог: все таблицы и индексы схемы, кроме перечисленных в missing_indexes"""
+
+    def __init__(self, missing_indexes=()):
+        self.rows = []
+        for table in TABLES:
+            for column in table.columns:
+                self.rows.append({'table_name': table.name, 'column_name': column, 'index_name': None})
+            for index in table.indexes:
+                if index.name not in missing_indexes:
+                    self.rows.append({'table_name': table.name, 'column_name': None, 'index_name': index.name})
+        self.executed = []
+
+    async def fetch(self, query, *args):
+        return self.rows
+
+    async def execute(self, query, *args):
+        self.executed.append(query)
+        return "DELETE 0"
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+USERS = Table(
+    name='users',
+    columns={'id': 'UUID PRIMARY KEY', 'email': 'TEXT'},
+    indexes=[
+        Index('idx_users_email', 'ON users(email)'),
+        Index('uq_users_email', 'ON users(email)', unique=True)
+    ]
+)
+
+
+def column(table, name):
+    return {'table_name': table, 'column_name': name, 'index_name': None}
+
+
+def index(table, name):
+    return {'table_name': table, 'column_name': None, 'index_name': name}
+
+
+def test_missing_table_is_created_with_indexes():
+    plan = plan_schema_changes([], [USERS])
+
+    assert plan.changes == ["таблица users"]
+    assert plan.statements == [
+        USERS.create_sql(),
+        "CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_users_email ON users(email)"
+    ]
+    # На новой таблице дубликатов нет - уникальный индекс создается вместе с ней
+    assert plan.unique_indexes == []
+
+
+def test_missing_columns_and_indexes_are_added():
+    plan = plan_schema_changes([column('users', 'id')], [USERS])
+
+    assert plan.changes == ["столбец users.email", "индекс idx_users_email", "индекс uq_users_email"]
+    assert plan.statements == [
+        "ALTER TABLE users ADD COLUMN email TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)"
+    ]
+    assert [i.name for i in plan.unique_indexes] == ['uq_users_email']
+
+
+def test_complete_schema_needs_no_changes():
+    rows = [column('users', 'id'), column('users', 'email'),
+            index('users', 'idx_users_email'), index('users', 'uq_users_email'),
+            # Объекты, которых нет в описании, не трогаются
+            column('users', 'legacy'), index('users', 'idx_legacy')]
+    plan = plan_schema_changes(rows, [USERS])
+
+    assert not plan
+    assert plan.changes == []
+
+
+def test_unique_index_is_created_after_dedupe():
+    connection = FakeConnection(missing_indexes={'uq_referral_stats_user_id'})
+    plan = asyncio.run(sync_schema(connection))
+
+    assert plan.changes == ["индекс uq_referral_stats_user_id"]
+    assert connection.executed == [
+        REFERRAL_STATS_MERGE_DUPLICATES,
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_referral_stats_user_id ON referral_stats(user_id)"
+    ]
+
+
+def test_up_to_date_schema_executes_nothing():
+    connection = FakeConnection()
+    plan = asyncio.run(sync_schema(connection))
+
+    assert not plan
+    assert connection.executed == []
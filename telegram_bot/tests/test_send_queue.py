@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from telegram_bot.services.send_queue import PRIORITY_BULK, SendScheduler, send_priority
+
+
+def make_scheduler() -> SendScheduler:
+    return SendScheduler(global_rate=100, private_chat_interval=0, group_chat_interval=0, max_retries=2)
+
+
+def test_interactive_sends_overtake_bulk():
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append(method.chat_id)
+
+    async def bulk(scheduler, chat_id):
+        with send_priority(PRIORITY_BULK):
+            await scheduler(make_request, None, SendMessage(chat_id=chat_id, text="news"))
+
+    async def main():
+        scheduler = make_scheduler()
+        # Токены израсходованы: все отправки ждут в очереди
+        scheduler._tokens = 0
+        tasks = [asyncio.create_task(bulk(scheduler, chat_id)) for chat_id in (1, 2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(scheduler(make_request, None, SendMessage(chat_id=3, text="reply"))))
+        await asyncio.gather(*tasks)
+        await scheduler.stop()
+
+    asyncio.run(main())
+    assert sent[0] == 3
+
+
+def test_flood_wait_pauses_sending_to_all_chats():
+    sent = []
+
+    async def make_request(bot, method):
+        sent.append((method.chat_id, time.monotonic()))
+        if len(sent) == 1:
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=1)
+
+    async def main():
+        scheduler = make_scheduler()
+        first = asyncio.create_task(scheduler(make_request, None, SendMessage(chat_id=1, text="a")))
+        await asyncio.sleep(0.05)
+        # Сообщение в другой чат ждет окончания flood wait, а не получает еще один 429
+        await scheduler(make_request, None, SendMessage(chat_id=2, text="b"))
+        await first
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return stats
+
+    stats = asyncio.run(main())
+    started = sent[0][1]
+    assert [chat_id for chat_id, _ in sent] == [1, 1, 2] or [chat_id for chat_id, _ in sent] == [1, 2, 1]
+    assert all(at - started >= 0.95 for _, at in sent[1:])
+    assert stats["retry_after_total"] == 1
+    assert stats["sent_total"] == 2
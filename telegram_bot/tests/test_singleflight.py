@@ -0,0 +1,113 @@
+import asyncio
+
+import pytest
+
+from telegram_bot.utils.deadline import DeadlineExceeded, deadline_scope
+from telegram_bot.utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_request():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    async def main():
+        flights = SingleFlight("test")
+        results = await asyncio.gather(*(flights.do(1, fetch) for _ in range(5)))
+        return flights, results
+
+    flights, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert flights.stats() == {'name': "test", 'in_flight': 0, 'calls_total': 1, 'saved_total': 4}
+
+
+def test_different_keys_and_later_calls_run_separately():
+    calls = []
+
+    async def fetch(key):
+        calls.append(key)
+        return key
+
+    async def main():
+        flights = SingleFlight()
+        await asyncio.gather(flights.do(1, lambda: fetch(1)), flights.do(2, lambda: fetch(2)))
+        await flights.do(1, lambda: fetch(1))
+
+    asyncio.run(main())
+    assert calls == [1, 2, 1]
+
+
+def test_exception_reaches_all_waiters():
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ConnectionError("backend down")
+
+    async def main():
+        flights = SingleFlight()
+        return await asyncio.gather(flights.do(1, fetch), flights.do(1, fetch), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [type(result) for result in results] == [ConnectionError, ConnectionError]
+
+
+def test_cancelled_waiter_does_not_cancel_request():
+    async def fetch():
+        await asyncio.sleep(0.02)
+        return "profile"
+
+    async def main():
+        flights = SingleFlight()
+        first = asyncio.create_task(flights.do(1, fetch))
+        second = asyncio.create_task(flights.do(1, fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "profile"
+
+
+def test_forget_starts_new_request():
+    calls = []
+
+    async def fetch(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    async def main():
+        flights = SingleFlight()
+        stale = asyncio.create_task(flights.do(1, lambda: fetch("old")))
+        await asyncio.sleep(0)
+        flights.forget(1)
+        fresh = await flights.do(1, lambda: fetch("new"))
+        return await stale, fresh
+
+    assert asyncio.run(main()) == ("old", "new")
+    assert calls == ["old", "new"]
+
+
+def test_first_callers_deadline_does_not_fail_joined_waiters():
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "profile"
+
+    async def short_budget(flights):
+        with deadline_scope(0.01):
+            return await flights.do(1, fetch)
+
+    async def main():
+        flights = SingleFlight()
+        first = asyncio.create_task(short_budget(flights))
+        await asyncio.sleep(0)
+        second = await flights.do(1, fetch)
+        with pytest.raises(DeadlineExceeded):
+            await first
+        return second
+
+    assert asyncio.run(main()) == "profile"
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+from aiogram.types import Chat, Message
+
+from telegram_bot.middlewares import throttling
+from telegram_bot.middlewares.throttling import RateLimit, ThrottlingMiddleware
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(throttling, "time", clock)
+    return clock
+
+
+def make_middleware(**limits) -> ThrottlingMiddleware:
+    return ThrottlingMiddleware(RateLimit(burst=2, period=10), limits, sweep_interval=60)
+
+
+def message(text: str) -> Message:
+    return Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"), text=text)
+
+
+def test_burst_then_wait_for_refill(clock):
+    middleware = make_middleware()
+
+    assert middleware.consume(1, "message") == 0
+    assert middleware.consume(1, "message") == 0
+    assert middleware.consume(1, "message") == pytest.approx(5)
+    # Другие пользователи и действия ограничиваются отдельно
+    assert middleware.consume(2, "message") == 0
+    assert middleware.consume(1, "callback") == 0
+
+    clock.now += 5
+    assert middleware.consume(1, "message") == 0
+    assert middleware.consume(1, "message") == pytest.approx(5)
+
+
+def test_command_with_own_limit(clock):
+    middleware = make_middleware(start=RateLimit(burst=1, period=30))
+
+    assert middleware.get_action(message("/start@vpn_bot REF123")) == "start"
+    assert middleware.get_action(message("/help")) == "command"
+    assert middleware.get_action(message("hello")) == "message"
+    assert middleware.consume(1, "start") == 0
+    assert middleware.consume(1, "start") == pytest.approx(30)
+
+
+def test_refilled_buckets_are_swept(clock):
+    middleware = make_middleware()
+    middleware.consume(1, "message")
+    middleware.consume(2, "message")
+    middleware.consume(2, "message")
+
+    clock.now += 60
+    middleware.consume(3, "message")
+
+    assert set(middleware._buckets) == {(3, "message")}
@@ -0,0 +1,111 @@
+import asyncio
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Chat, Message, Update, User
+
+from telegram_bot.middlewares import UpdateScheduler
+
+
+class Flow(StatesGroup):
+    waiting_for_code = State()
+
+
+def make_update(update_id: int, user_id: int, text: str) -> Update:
+    return Update(
+        update_id=update_id,
+        message=Message(
+            message_id=update_id,
+            date=datetime.now(),
+            chat=Chat(id=user_id, type="private"),
+            from_user=User(id=user_id, is_bot=False, first_name="Test"),
+            text=text
+        )
+    )
+
+
+def build_dispatcher(calls: list, max_concurrency: int = 10, max_queued: int = 10):
+    dp = Dispatcher()
+    scheduler = UpdateScheduler(dp, max_concurrency=max_concurrency, max_queued=max_queued)
+    dp.update.outer_middleware(scheduler)
+    router = Router(name="test")
+
+    @router.message(CommandStart())
+    async def start(message: Message, state: FSMContext):
+        # Имитация запроса к backend: следующее сообщение приходит раньше, чем меняется состояние
+        await asyncio.sleep(0.02)
+        await state.set_state(Flow.waiting_for_code)
+        calls.append(("start", message.from_user.id))
+
+    @router.message(Flow.waiting_for_code, F.text)
+    async def code(message: Message, state: FSMContext):
+        calls.append(("code", message.from_user.id))
+
+    @router.message()
+    async def fallback(message: Message):
+        calls.append(("fallback", message.from_user.id))
+
+    dp.include_router(router)
+    return dp, scheduler
+
+
+def test_queued_update_sees_state_set_by_previous_update():
+    async def scenario():
+        calls = []
+        dp, scheduler = build_dispatcher(calls)
+        bot = Bot("42:TEST")
+        try:
+            await dp.feed_update(bot, make_update(1, 7, "/start"))
+            await dp.feed_update(bot, make_update(2, 7, "ABC123"))
+            await scheduler.drain(timeout=1)
+        finally:
+            await bot.session.close()
+        return calls, scheduler.stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert calls == [("start", 7), ("code", 7)]
+    assert stats["processed_total"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_different_users_are_processed_concurrently():
+    async def scenario():
+        calls = []
+        dp, scheduler = build_dispatcher(calls)
+        bot = Bot("42:TEST")
+        try:
+            await dp.feed_update(bot, make_update(1, 1, "/start"))
+            await dp.feed_update(bot, make_update(2, 2, "hello"))
+            await scheduler.drain(timeout=1)
+        finally:
+            await bot.session.close()
+        return calls
+
+    # Сообщение второго пользователя не ждет медленный /start первого
+    assert asyncio.run(scenario()) == [("fallback", 2), ("start", 1)]
+
+
+def test_burst_of_one_user_does_not_hold_slots_of_others():
+    async def scenario():
+        calls = []
+        dp, scheduler = build_dispatcher(calls, max_concurrency=2, max_queued=3)
+        bot = Bot("42:TEST")
+        try:
+            await dp.feed_update(bot, make_update(1, 1, "/start"))
+            for update_id in range(2, 12):
+                # Прием не ждет: обновления за медленным /start стоят в очереди пользователя без слота
+                await asyncio.wait_for(dp.feed_update(bot, make_update(update_id, 1, "/start")), timeout=0.01)
+            await dp.feed_update(bot, make_update(20, 2, "hello"))
+            await scheduler.drain(timeout=1)
+        finally:
+            await bot.session.close()
+        return calls, scheduler.stats()
+
+    calls, stats = asyncio.run(scenario())
+    assert calls[0] == ("fallback", 2)
+    assert len(calls) == 1 + 11 - stats["dropped_total"]
+    assert stats["dropped_total"] >= 7
+    assert stats["in_flight"] == 0 and stats["active_keys"] == 0
@@ -1,3 +1,10 @@
 from .validators import is_valid_referral_code, is_valid_telegram_id, sanitize_referral_code, sanitize_telegram_id
+from .cache import TTLCache
+from .bloom import BloomFilter
+from .histogram import Histogram
+from .singleflight import SingleFlight
+from .deadline import DeadlineExceeded, deadline_scope, run_with_deadline, timeout_for
 
-__all__ = ["is_valid_referral_code", "is_valid_telegram_id", "sanitize_referral_code", "sanitize_telegram_id"]
\ No newline at end of file
+__all__ = ["is_valid_referral_code", "is_valid_telegram_id", "sanitize_referral_code", "sanitize_telegram_id",
+           "TTLCache", "BloomFilter", "Histogram", "SingleFlight",
+           "DeadlineExceeded", "deadline_scope", "run_with_deadline", "timeout_for"]
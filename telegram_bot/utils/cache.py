@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    LRU-кэш в памяти процесса с ограничением по размеру и времени жизни записей.
+    Предназначен для использования из одного event loop (без блокировок).
+    """
+
+    MISSING = object()
+
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Растет при каждом сбросе: загрузка, начатая до сброса, не сохраняет результат (см. set)
+        self.version = 0
+
+        # Статистика работы кэша
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Возвращает значение или default (по умолчанию TTLCache.MISSING)"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, version: Optional[int] = None):
+        """
+        Сохраняет значение, вытесняя самые давно использованные записи при переполнении.
+        version - значение self.version перед началом загрузки: если с тех пор кэш сбрасывался,
+        значение могло устареть и не сохраняется (сбрасываются записи редко, поэтому проверка общая
+        для всех ключей).
+        """
+        if self.maxsize <= 0 or (version is not None and version != self.version):
+            return
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Удаляет запись из кэша"""
+        self.version += 1
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self.version += 1
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
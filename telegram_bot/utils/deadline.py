@@ -0,0 +1,92 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import Context, ContextVar, copy_context
+from typing import Any, Awaitable, Optional
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Бюджет времени на обработку обновления исчерпан"""
+
+
+class Deadline:
+    __slots__ = ('expires_at', 'exceeded')
+
+    def __init__(self, timeout: float):
+        self.expires_at = time.monotonic() + timeout
+        # Хотя бы один вызов был прерван или не начат из-за исчерпанного бюджета
+        self.exceeded = False
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(timeout: float):
+    """Задает бюджет времени для всех вызовов внутри блока (в том числе в порожденных задачах)"""
+    deadline = Deadline(timeout)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def background_context() -> Context:
+    """
+    Копия текущего контекста без бюджета времени. Задача, созданная в обработчике
+    (create_task копирует контекст), иначе унаследует бюджет обновления и после его
+    истечения будет получать DeadlineExceeded на каждом вызове.
+    """
+    context = copy_context()
+    context.run(_current_deadline.set, None)
+    return context
+
+
+def deadline_expired() -> bool:
+    """Бюджет задан и исчерпан (отмечает это в Deadline.exceeded)"""
+    deadline = _current_deadline.get()
+    if deadline is not None and deadline.remaining() <= 0:
+        deadline.exceeded = True
+        return True
+    return False
+
+
+def timeout_for(default: Optional[float]) -> Optional[float]:
+    """
+    Таймаут очередного вызова: default, урезанный до оставшегося бюджета
+    (без бюджета - default). Если бюджет исчерпан, бросает DeadlineExceeded.
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        deadline.exceeded = True
+        raise DeadlineExceeded()
+    return remaining if default is None else min(default, remaining)
+
+
+async def run_with_deadline(awaitable: Awaitable, default_timeout: Optional[float] = None) -> Any:
+    """Выполняет вызов не дольше оставшегося бюджета; по его истечении вызов отменяется"""
+    try:
+        timeout = timeout_for(default_timeout)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        if deadline_expired():
+            raise DeadlineExceeded() from None
+        raise
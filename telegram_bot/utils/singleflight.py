@@ -0,0 +1,59 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from .deadline import DeadlineExceeded, background_context, deadline_expired, run_with_deadline
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых запросов: пока запрос по ключу выполняется,
+    повторные вызовы с тем же ключом не идут в backend, а ждут результат первого.
+    Результат (или исключение) получают все ожидающие; после завершения ключ освобождается.
+
+    Запрос выполняется отдельной задачей без бюджета времени обновления: отмена или
+    истечение бюджета одного из ожидающих не прерывает его для остальных, каждый
+    ожидающий ждет результат не дольше своего бюджета.
+    """
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+        # Статистика работы
+        self.calls_total = 0
+        self.saved_total = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            if deadline_expired():
+                raise DeadlineExceeded()
+            call = asyncio.create_task(fn(), context=background_context())
+            self._calls[key] = call
+            call.add_done_callback(lambda done, key=key: self._release(key, done))
+            self.calls_total += 1
+        else:
+            self.saved_total += 1
+        return await run_with_deadline(asyncio.shield(call))
+
+    def _release(self, key: Hashable, call: asyncio.Future):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # Исключение уже получили ожидающие; без этого asyncio пишет "never retrieved"
+            call.exception()
+
+    def forget(self, key: Hashable):
+        """
+        Следующий вызов с ключом выполнит новый запрос (данные изменились,
+        результат выполняющегося запроса может быть устаревшим)
+        """
+        self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'in_flight': len(self._calls),
+            'calls_total': self.calls_total,
+            'saved_total': self.saved_total
+        }
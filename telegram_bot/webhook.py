@@ -0,0 +1,81 @@
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from telegram_bot.config import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_SET_ON_STARTUP,
+    METRICS_ENABLED,
+    METRICS_PATH
+)
+from telegram_bot.metrics import metrics_handler
+
+logger = logging.getLogger(__name__)
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    """
+    Создает aiohttp приложение, принимающее обновления Telegram по webhook.
+    Запросы без верного X-Telegram-Bot-Api-Secret-Token отклоняются.
+    """
+    if not WEBHOOK_SECRET:
+        raise ValueError("Для BOT_MODE=webhook необходимо указать WEBHOOK_SECRET")
+
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET,
+        # Ответ Telegram задерживается, пока UpdateScheduler не примет обновление
+        handle_in_background=False
+    ).register(app, path=WEBHOOK_PATH)
+
+    async def health(request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    app.router.add_get("/health", health)
+    if METRICS_ENABLED:
+        app.router.add_get(METRICS_PATH, metrics_handler)
+
+    # Запуск/остановка приложения вызывают startup/shutdown диспетчера
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def set_webhook(bot: Bot, dp: Dispatcher):
+    """Регистрирует webhook в Telegram"""
+    if not WEBHOOK_BASE_URL:
+        raise ValueError("Для BOT_MODE=webhook необходимо указать WEBHOOK_BASE_URL")
+
+    url = f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}"
+    await bot.set_webhook(
+        url,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    logger.info(f"Webhook set: {url}")
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Запускает HTTP сервер webhook и работает до отмены"""
+    app = create_webhook_app(bot, dp)
+    if WEBHOOK_SET_ON_STARTUP:
+        await set_webhook(bot, dp)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook server listening on {WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()